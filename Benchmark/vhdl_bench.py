@@ -0,0 +1,331 @@
+"""
+----------------------------------------------------------------
+ VHDL Mode Benchmark Suite.
+
+ Times the beautify passes and the interface parser against a
+ generated corpus (see vhdl_corpus.py) outside of Sublime Text.
+ Each stage reports its throughput in lines per second and the
+ peak memory it allocated.  Results can be stored as baselines
+ and later runs compared against them so that regressions in
+ indent_vhdl, align_block_on_re or Interface.parse_block show
+ up before they reach a release.
+
+ Usage: python vhdl_bench.py [--sizes 1k,10k,100k] [--save]
+----------------------------------------------------------------
+"""
+import os
+import sys
+import gc
+import json
+import time
+import types
+import argparse
+import platform
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE_FILE = os.path.join(HERE, 'baselines.json')
+
+
+#-------------------------------------------------------------------------------
+def install_sublime_stub():
+    """
+    The engine modules do not need the Sublime Text API, however
+    anything that pulls in the plugin side will.  A bare module that
+    serves resources from the package directory is enough for that.
+    """
+    if 'sublime' in sys.modules:
+        return
+    try:
+        import sublime
+        return
+    except ImportError:
+        pass
+
+    def load_resource(name):
+        path = name.split('/', 2)[-1] if name.startswith('Packages/') else name
+        with open(os.path.join(ROOT, *path.split('/')), encoding='utf-8') as f:
+            return f.read()
+
+    stub = types.ModuleType('sublime')
+    stub.load_resource = load_resource
+    stub.version = lambda: '0'
+    sys.modules['sublime'] = stub
+
+
+install_sublime_stub()
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import vhdl_beautify as beautify
+import vhdl_lang
+import vhdl_corpus
+
+
+#-------------------------------------------------------------------------------
+def parse_size(text):
+    """Turns '10k' or '1M' into a line count."""
+    text = text.strip()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:].lower(), 1)
+    if scale > 1:
+        text = text[:-1]
+    return int(float(text) * scale)
+
+
+def size_label(num_lines):
+    if num_lines % 1000000 == 0:
+        return '{}M'.format(num_lines // 1000000)
+    if num_lines % 1000 == 0:
+        return '{}k'.format(num_lines // 1000)
+    return str(num_lines)
+
+
+#-------------------------------------------------------------------------------
+class Workload():
+    """
+    Holds the corpus in the form each stage expects.  Every stage
+    receives a fresh copy of its input so that stages and repeats
+    do not see each other's output.
+    """
+    def __init__(self, num_lines, seed=0):
+        units = vhdl_corpus.generate_units(num_lines, seed)
+        self.raw = []
+        for _, lines in units:
+            self.raw.extend(lines)
+        self.entities = ['\n'.join(lines) for kind, lines in units if kind == 'entity']
+        self.entity_lines = sum(len(lines) for kind, lines in units if kind == 'entity')
+
+        # Inputs for the individual passes are the outputs of the
+        # pass before it, exactly as in beautify_lines.
+        self.normalized = list(self.raw)
+        beautify.normalize_lines(self.normalized)
+        self.pre_aligned = list(self.normalized)
+        beautify.align_columns(self.pre_aligned, beautify.PRE_INDENT_COLUMNS)
+        self.indented = list(self.pre_aligned)
+        beautify.indent_vhdl(self.indented)
+        self.interfaces = [parse_interface(text) for text in self.entities]
+
+
+def parse_interface(text):
+    interface = vhdl_lang.Interface()
+    interface.if_string = text
+    interface.interface_start(text)
+    interface.parse_block()
+    return interface
+
+
+#-------------------------------------------------------------------------------
+# Each stage is (name, setup, run, line count).  Setup builds the
+# input outside of the timed region and run does the work.
+
+def _stage_normalize(w):
+    return (lambda: list(w.raw)), beautify.normalize_lines, len(w.raw)
+
+def _stage_align_pre(w):
+    return ((lambda: list(w.normalized)),
+            (lambda lines: beautify.align_columns(lines, beautify.PRE_INDENT_COLUMNS)),
+            len(w.raw))
+
+def _stage_indent(w):
+    return (lambda: list(w.pre_aligned)), beautify.indent_vhdl, len(w.raw)
+
+def _stage_align_post(w):
+    return ((lambda: list(w.indented)),
+            (lambda lines: beautify.align_columns(lines, beautify.POST_INDENT_COLUMNS)),
+            len(w.raw))
+
+def _stage_align_block(w):
+    return ((lambda: list(w.indented)),
+            (lambda lines: beautify.align_block_on_re(lines, r':')),
+            len(w.raw))
+
+def _stage_pipeline(w):
+    return (lambda: list(w.raw)), beautify.beautify_lines, len(w.raw)
+
+def _stage_interface_parse(w):
+    def run(texts):
+        for text in texts:
+            parse_interface(text)
+    return (lambda: w.entities), run, w.entity_lines
+
+def _stage_interface_print(w):
+    def run(interfaces):
+        for interface in interfaces:
+            interface.entity()
+            interface.component()
+            interface.instance()
+            interface.signals()
+    return (lambda: w.interfaces), run, w.entity_lines
+
+STAGES = [
+    ('normalize', _stage_normalize),
+    ('align_pre', _stage_align_pre),
+    ('indent_vhdl', _stage_indent),
+    ('align_post', _stage_align_post),
+    ('align_block_on_re', _stage_align_block),
+    ('beautify_lines', _stage_pipeline),
+    ('interface_parse', _stage_interface_parse),
+    ('interface_print', _stage_interface_print),
+]
+
+
+#-------------------------------------------------------------------------------
+def measure(setup, run, repeat, memory):
+    """
+    Returns (best seconds, peak KiB).  Timing runs are done with
+    tracemalloc off as it slows allocation down considerably, and
+    the peak is taken from one further traced run.
+    """
+    best = None
+    for _ in range(repeat):
+        data = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(data)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    peak = None
+    if memory:
+        data = setup()
+        gc.collect()
+        tracemalloc.start()
+        run(data)
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(sizes, stages=None, repeat=3, memory=True, seed=0, out=sys.stdout):
+    """
+    Runs the selected stages for each corpus size and returns a
+    dictionary of {size label: {stage: result}}.
+    """
+    # The rules are parsed once up front so the first stage does
+    # not pay for reading the YAML file.
+    beautify.load_rules()
+    results = {}
+    for num_lines in sizes:
+        label = size_label(num_lines)
+        workload = Workload(num_lines, seed)
+        out.write('{} corpus: {} lines, {} entities\n'.format(
+            label, len(workload.raw), len(workload.entities)))
+        results[label] = {}
+        for name, stage in STAGES:
+            if stages and name not in stages:
+                continue
+            setup, run, count = stage(workload)
+            # Large corpora take long enough that one run is a
+            # stable measurement.
+            reps = 1 if num_lines >= 1000000 else repeat
+            seconds, peak = measure(setup, run, reps, memory)
+            result = {
+                'seconds': round(seconds, 4),
+                'lines_per_sec': int(count / seconds) if seconds else 0,
+            }
+            if peak is not None:
+                result['peak_kib'] = peak
+            results[label][name] = result
+            out.write('  {:<18} {:>9.3f}s {:>12,} lines/s{}\n'.format(
+                name, seconds, result['lines_per_sec'],
+                '' if peak is None else ' {:>10,} KiB peak'.format(peak)))
+        del workload
+    return results
+
+
+#-------------------------------------------------------------------------------
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    """Merges the results into the stored baselines."""
+    data = load_baselines(path)
+    data['machine'] = {
+        'python': platform.python_version(),
+        'system': platform.system(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+    stored = data.setdefault('results', {})
+    for label, stages in results.items():
+        stored.setdefault(label, {}).update(stages)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baselines, tolerance):
+    """
+    Returns a list of regression messages for stages whose
+    throughput dropped, or whose peak memory grew, by more than
+    the tolerance relative to the stored baseline.
+    """
+    regressions = []
+    stored = baselines.get('results', {})
+    for label, stages in sorted(results.items()):
+        for name, result in sorted(stages.items()):
+            base = stored.get(label, {}).get(name)
+            if not base:
+                continue
+            speed = result['lines_per_sec']
+            if speed < base['lines_per_sec'] * (1.0 - tolerance):
+                regressions.append('{} {}: {:,} lines/s vs {:,} baseline'.format(
+                    label, name, speed, base['lines_per_sec']))
+            if 'peak_kib' in result and 'peak_kib' in base:
+                if result['peak_kib'] > base['peak_kib'] * (1.0 + tolerance):
+                    regressions.append('{} {}: {:,} KiB peak vs {:,} baseline'.format(
+                        label, name, result['peak_kib'], base['peak_kib']))
+    return regressions
+
+
+#-------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the VHDL Mode beautify and parsing stages.')
+    parser.add_argument('--sizes', default='1k,10k,100k',
+                        help='comma separated corpus sizes (default: 1k,10k,100k)')
+    parser.add_argument('--stages', default=None,
+                        help='comma separated stages to run (default: all of {})'.format(
+                            ', '.join(name for name, _ in STAGES)))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per stage, best is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='corpus generator seed (default: 0)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced run used to measure peak memory')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slow down or memory growth (default: 0.25)')
+    parser.add_argument('--baselines', default=BASELINE_FILE,
+                        help='baseline file (default: Benchmark/baselines.json)')
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    stages = [s.strip() for s in args.stages.split(',')] if args.stages else None
+    results = run_benchmarks(sizes, stages, args.repeat, not args.no_memory, args.seed)
+
+    if args.save:
+        save_baselines(results, args.baselines)
+        print('vhdl-mode: Baselines written to {}'.format(args.baselines))
+        return 0
+
+    baselines = load_baselines(args.baselines)
+    if not baselines:
+        print('vhdl-mode: No baselines to compare against, use --save to store them.')
+        return 0
+    regressions = compare(results, baselines, args.tolerance)
+    for message in regressions:
+        print('vhdl-mode: Regression: {}'.format(message))
+    if not regressions:
+        print('vhdl-mode: No regressions against the baselines.')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+----------------------------------------------------------------
+ VHDL Mode Benchmark Corpus Generator.
+
+ Produces deterministic, syntactically plausible VHDL for the
+ benchmark suite.  The code is deliberately untidy (random
+ indentation, missing spaces around operators, mixed keyword
+ case) so that every beautify pass has real work to do, and it
+ leans on the structures that have been slow in the past: wide
+ entities, deep generate nesting, large case statements and long
+ port maps.
+
+ Usage: python vhdl_corpus.py LINES [SEED] > out.vhd
+----------------------------------------------------------------
+"""
+import sys
+import random
+
+TYPES = [
+    'std_logic',
+    'std_logic_vector({} downto 0)',
+    'unsigned({} downto 0)',
+    'signed({} downto 0)',
+    'integer range 0 to {}',
+    'natural',
+    'boolean',
+]
+MODES = ['in', 'out', 'inout', 'buffer']
+
+# Designs drawn that would run past the requested size before the
+# corpus is made up with packages instead.
+FIT_ATTEMPTS = 20
+
+
+#-------------------------------------------------------------------------------
+class CorpusGenerator():
+    """
+    Builds design units from a seeded random source.  Every unit
+    is returned as a (kind, lines) pair so that callers can pick out
+    entity declarations for the interface parser benchmarks.
+    """
+    def __init__(self, seed=0):
+        self.rand = random.Random(seed)
+        self.count = 0
+
+    def name(self, prefix):
+        self.count += 1
+        return '{}_{}'.format(prefix, self.count)
+
+    def kw(self, word):
+        """Returns a keyword in upper case now and then."""
+        if self.rand.random() < 0.1:
+            return word.upper()
+        return word
+
+    def pad(self):
+        """Random, and wrong, indentation."""
+        return ' ' * self.rand.choice([0, 0, 1, 2, 4, 7, 8])
+
+    def sp(self):
+        """Sometimes a space, sometimes not."""
+        return self.rand.choice(['', ' ', '  '])
+
+    def vtype(self):
+        return self.rand.choice(TYPES).format(self.rand.randint(1, 63))
+
+    def value(self, vtype):
+        if vtype.startswith('std_logic_vector') or vtype.startswith(('unsigned', 'signed')):
+            return "(others => '0')"
+        if vtype == 'std_logic':
+            return "'0'"
+        if vtype == 'boolean':
+            return 'false'
+        return str(self.rand.randint(0, 255))
+
+    #---------------------------------------------------------------------------
+    def interface_list(self, keyword, items, with_modes):
+        lines = [self.pad() + self.kw(keyword) + self.sp() + '(']
+        for i, (name, vtype) in enumerate(items):
+            line = self.pad() + name + self.sp() + ':' + self.sp()
+            if with_modes:
+                line += self.rand.choice(MODES) + ' '
+            line += vtype
+            if self.rand.random() < 0.2:
+                line += self.sp() + ':=' + self.sp() + self.value(vtype)
+            if i < len(items) - 1:
+                line += ';'
+            if self.rand.random() < 0.1:
+                line += ' -- {} description'.format(name)
+            lines.append(line)
+        lines.append(self.pad() + ');')
+        return lines
+
+    def entity(self, name, generics, ports):
+        lines = [self.kw('entity') + ' ' + name + ' ' + self.kw('is')]
+        lines.extend(self.interface_list('generic', generics, False))
+        lines.extend(self.interface_list('port', ports, True))
+        lines.append(self.kw('end') + ' ' + self.kw('entity') + ' ' + name + ';')
+        return lines
+
+    def component(self, name, generics, ports):
+        lines = [self.pad() + self.kw('component') + ' ' + name + ' ' + self.kw('is')]
+        lines.extend(self.interface_list('generic', generics, False))
+        lines.extend(self.interface_list('port', ports, True))
+        lines.append(self.pad() + self.kw('end') + ' ' + self.kw('component') + ' ' + name + ';')
+        return lines
+
+    def instance(self, name, generics, ports, signals):
+        lines = [self.pad() + self.name('u') + self.sp() + ':' + self.sp() +
+                 'entity work.' + name]
+        lines.append(self.pad() + self.kw('generic map') + self.sp() + '(')
+        for i, (gname, vtype) in enumerate(generics):
+            sep = ',' if i < len(generics) - 1 else ''
+            lines.append(self.pad() + gname + self.sp() + '=>' + self.sp() +
+                         self.value(vtype) + sep)
+        lines.append(self.pad() + ')')
+        lines.append(self.pad() + self.kw('port map') + self.sp() + '(')
+        for i, (pname, vtype) in enumerate(ports):
+            sep = ',' if i < len(ports) - 1 else ''
+            lines.append(self.pad() + pname + self.sp() + '=>' + self.sp() +
+                         self.rand.choice(signals) + sep)
+        lines.append(self.pad() + ');')
+        return lines
+
+    def case_statement(self, signal, whens):
+        lines = [self.pad() + self.kw('case') + ' ' + signal + ' ' + self.kw('is')]
+        for i in range(whens):
+            lines.append(self.pad() + self.kw('when') + ' ' + str(i) + self.sp() + '=>')
+            for _ in range(self.rand.randint(1, 3)):
+                lines.append(self.pad() + self.name('r') + self.sp() + '<=' + self.sp() +
+                             self.name('s') + self.sp() + '+' + self.sp() + '1;')
+        lines.append(self.pad() + self.kw('when') + ' ' + self.kw('others') + self.sp() + '=>')
+        lines.append(self.pad() + self.kw('null') + ';')
+        lines.append(self.pad() + self.kw('end') + ' ' + self.kw('case') + ';')
+        return lines
+
+    def process(self, whens):
+        label = self.name('proc')
+        lines = [self.pad() + label + self.sp() + ':' + self.sp() +
+                 self.kw('process') + self.sp() + '(clk)']
+        lines.append(self.pad() + self.kw('begin'))
+        lines.append(self.pad() + self.kw('if') + ' rising_edge(clk) ' + self.kw('then'))
+        lines.append(self.pad() + self.kw('if') + ' rst' + self.sp() + '=' + self.sp() +
+                     "'1' " + self.kw('then'))
+        lines.append(self.pad() + 'state' + self.sp() + '<=' + self.sp() + '0;')
+        lines.append(self.pad() + self.kw('else'))
+        lines.extend(self.case_statement('state', whens))
+        lines.append(self.pad() + self.kw('end') + ' ' + self.kw('if') + ';')
+        lines.append(self.pad() + self.kw('end') + ' ' + self.kw('if') + ';')
+        lines.append(self.pad() + self.kw('end') + ' ' + self.kw('process') + ' ' + label + ';')
+        return lines
+
+    def generate(self, depth, body):
+        """Nested for/if generate statements wrapped around body."""
+        if depth == 0:
+            return body
+        label = self.name('gen')
+        if self.rand.random() < 0.5:
+            head = '{} : {} i{} {} 0 {} {} {}'.format(
+                label, self.kw('for'), depth, self.kw('in'), self.kw('to'),
+                self.rand.randint(1, 15), self.kw('generate'))
+        else:
+            head = '{} : {} G_{} {}'.format(
+                label, self.kw('if'), depth, self.kw('generate'))
+        lines = [self.pad() + head]
+        lines.extend(self.generate(depth - 1, body))
+        lines.append(self.pad() + self.kw('end') + ' ' + self.kw('generate') + ' ' + label + ';')
+        return lines
+
+    #---------------------------------------------------------------------------
+    def constants(self, count):
+        lines = []
+        for _ in range(count):
+            vtype = self.vtype()
+            lines.append(self.pad() + self.kw('constant') + ' ' + self.name('C') + self.sp() +
+                         ':' + self.sp() + vtype + self.sp() + ':=' + self.sp() +
+                         self.value(vtype) + ';')
+        return lines
+
+    def constant_package(self, count):
+        """A package of count constants, count + 3 lines."""
+        name = self.name('pkg')
+        lines = [self.kw('package') + ' ' + name + ' ' + self.kw('is')]
+        lines.extend(self.constants(count))
+        lines.append(self.kw('end') + ' ' + self.kw('package') + ' ' + name + ';')
+        lines.append('')
+        return lines
+
+    def package(self):
+        name = self.name('pkg')
+        lines = [self.kw('package') + ' ' + name + ' ' + self.kw('is')]
+        lines.extend(self.constants(self.rand.randint(5, 20)))
+        lines.append(self.kw('end') + ' ' + self.kw('package') + ' ' + name + ';')
+        lines.append('')
+        lines.append(self.kw('package body') + ' ' + name + ' ' + self.kw('is'))
+        for _ in range(self.rand.randint(2, 6)):
+            fname = self.name('f')
+            lines.append(self.pad() + self.kw('function') + ' ' + fname + self.sp() +
+                         '(a' + self.sp() + ':' + self.sp() + 'integer;' + self.sp() +
+                         'b' + self.sp() + ':' + self.sp() + 'integer)' + ' ' +
+                         self.kw('return') + ' integer ' + self.kw('is'))
+            lines.append(self.pad() + self.kw('variable') + ' v' + self.sp() + ':' +
+                         self.sp() + 'integer' + self.sp() + ':=' + self.sp() + '0;')
+            lines.append(self.pad() + self.kw('begin'))
+            lines.append(self.pad() + self.kw('for') + ' i ' + self.kw('in') + ' 0 ' +
+                         self.kw('to') + ' b ' + self.kw('loop'))
+            lines.append(self.pad() + 'v' + self.sp() + ':=' + self.sp() + 'v' +
+                         self.sp() + '+' + self.sp() + 'a*i;')
+            lines.append(self.pad() + self.kw('end') + ' ' + self.kw('loop') + ';')
+            lines.append(self.pad() + self.kw('return') + ' v;')
+            lines.append(self.pad() + self.kw('end') + ' ' + self.kw('function') + ' ' + fname + ';')
+        lines.append(self.kw('end') + ' ' + self.kw('package body') + ' ' + name + ';')
+        lines.append('')
+        return lines
+
+    def design(self):
+        """
+        Returns a list of (kind, lines) units making up one
+        entity/architecture pair with a sub-component.
+        """
+        rand = self.rand
+        sub = self.name('sub')
+        sub_generics = [(self.name('G'), 'integer') for _ in range(rand.randint(2, 10))]
+        sub_ports = [(self.name('p'), self.vtype()) for _ in range(rand.randint(10, 80))]
+        top = self.name('top')
+        generics = [(self.name('G'), self.vtype()) for _ in range(rand.randint(4, 20))]
+        ports = [(self.name('p'), self.vtype()) for _ in range(rand.randint(20, 200))]
+        signals = [self.name('s') for _ in range(rand.randint(10, 60))]
+
+        units = []
+        units.append(('library', ['library ieee;', 'use ieee.std_logic_1164.all;',
+                                  'use ieee.numeric_std.all;', '']))
+        units.append(('entity', self.entity(top, generics, ports)))
+
+        arch = ['', self.kw('architecture') + ' rtl ' + self.kw('of') + ' ' + top + ' ' + self.kw('is')]
+        for signal in signals:
+            vtype = self.vtype()
+            arch.append(self.pad() + self.kw('signal') + ' ' + signal + self.sp() + ':' +
+                        self.sp() + vtype + self.sp() + ':=' + self.sp() + self.value(vtype) + ';')
+        arch.append(self.pad() + self.kw('signal') + ' state' + self.sp() + ':' + self.sp() +
+                    'integer' + self.sp() + ':=' + self.sp() + '0;')
+        arch.extend(self.component(sub, sub_generics, sub_ports))
+        arch.append(self.kw('begin'))
+        for _ in range(rand.randint(5, 30)):
+            arch.append(self.pad() + rand.choice(signals) + self.sp() + '<=' + self.sp() +
+                        rand.choice(signals) + ' ' + self.kw('when') + ' ' + rand.choice(signals) +
+                        self.sp() + '=' + self.sp() + "'1' " + self.kw('else') + ' ' +
+                        rand.choice(signals) + ';')
+        body = self.instance(sub, sub_generics, sub_ports, signals)
+        arch.extend(self.generate(rand.randint(1, 6), body))
+        arch.extend(self.process(rand.randint(20, 300)))
+        arch.append(self.kw('end') + ' ' + self.kw('architecture') + ' rtl;')
+        arch.append('')
+        units.append(('architecture', arch))
+        return units
+
+    def units(self, num_lines):
+        """
+        Yields (kind, lines) units making up num_lines lines, or up
+        to three fewer for sizes a package cannot fill.  Units are
+        never cut short: one that would run past the size is drawn
+        again, and the last few lines are a package of constants.
+        """
+        total = 0
+        misses = 0
+        while num_lines - total > 3:
+            left = num_lines - total
+            if misses >= FIT_ATTEMPTS:
+                batch = [('package', self.constant_package(left - 3))]
+            elif self.rand.random() < 0.2:
+                batch = [('package', self.package())]
+            else:
+                batch = self.design()
+            size = sum(len(lines) for _, lines in batch)
+            if size > left:
+                misses += 1
+                continue
+            for unit in batch:
+                total += len(unit[1])
+                yield unit
+
+
+#-------------------------------------------------------------------------------
+def generate(num_lines, seed=0):
+    """Returns a list of num_lines lines of VHDL, see units."""
+    lines = []
+    for _, unit in CorpusGenerator(seed).units(num_lines):
+        lines.extend(unit)
+    return lines
+
+
+def generate_units(num_lines, seed=0):
+    """Returns the (kind, lines) design units of the corpus."""
+    return list(CorpusGenerator(seed).units(num_lines))
+
+
+if __name__ == '__main__':
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    sys.stdout.write('\n'.join(generate(int(sys.argv[1]), seed)) + '\n')
@@ -0,0 +1,97 @@
+"""
+Tests of the beautify engine: the tokenizer cases the passes rely
+on to leave literals and comments alone, and the whole pipeline on
+beautify_test.vhd against its expected output.
+
+Run from the package folder with: python -m unittest discover Test
+"""
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import vhdl_beautify as beautify
+
+
+def kinds(line):
+    return [(kind, line[start:end]) for kind, start, end in beautify.tokenize(line)
+            if kind != beautify.SPACE]
+
+
+def beautified(*lines):
+    lines = list(lines)
+    beautify.beautify_lines(lines)
+    return lines
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_string_with_assignment(self):
+        self.assertEqual(kinds('x <= "a:=b";'), [
+            ('identifier', 'x'), ('delimiter', '<='), ('string', '"a:=b"'),
+            ('delimiter', ';')])
+
+    def test_character_literal_then_comment(self):
+        self.assertEqual(kinds("y <= '-'-- don't care"), [
+            ('identifier', 'y'), ('delimiter', '<='), ('char', "'-'"),
+            ('comment', "-- don't care")])
+
+    def test_qualified_expression(self):
+        self.assertEqual(kinds('y <= slv\'("01");'), [
+            ('identifier', 'y'), ('delimiter', '<='), ('identifier', 'slv'),
+            ('delimiter', "'"), ('delimiter', '('), ('string', '"01"'),
+            ('delimiter', ')'), ('delimiter', ';')])
+
+    def test_attribute_after_parenthesis(self):
+        self.assertEqual(kinds("n := a(i)'length;"), [
+            ('identifier', 'n'), ('delimiter', ':='), ('identifier', 'a'),
+            ('delimiter', '('), ('identifier', 'i'), ('delimiter', ')'),
+            ('delimiter', "'"), ('identifier', 'length'), ('delimiter', ';')])
+
+    def test_comment_with_association(self):
+        self.assertEqual(kinds('a => b, -- c=>d'), [
+            ('identifier', 'a'), ('delimiter', '=>'), ('identifier', 'b'),
+            ('delimiter', ','), ('comment', '-- c=>d')])
+
+
+class BeautifyTest(unittest.TestCase):
+
+    def test_string_is_not_padded(self):
+        self.assertEqual(beautified('x<="a:=b";'), ['x <= "a:=b";'])
+
+    def test_string_does_not_set_a_column(self):
+        self.assertEqual(beautified('check : assert ok', 'report "error : too wide";'),
+                         ['check : assert ok', 'report "error : too wide";'])
+        self.assertEqual(beautified('check : assert ok', 'report "a : b";', 'not_so_short : x;'),
+                         ['check : assert ok', 'report "a : b";', 'not_so_short : x;'])
+
+    def test_character_literal_then_comment(self):
+        self.assertEqual(beautified("y<='-'-- don't care"), ["y <= '-'-- don't care"])
+
+    def test_qualified_expression(self):
+        self.assertEqual(beautified('y<=slv\'("01");'), ['y <= slv\'("01");'])
+
+    def test_attribute_after_parenthesis(self):
+        self.assertEqual(beautified("n:=a(i)'length;"), ["n := a(i)'length;"])
+
+    def test_comment_with_association(self):
+        self.assertEqual(beautified('s <= b; -- x=>y', 'c => d,'),
+                         ['s <= b; -- x=>y', 'c => d,'])
+        self.assertEqual(beautified('a => b, -- c=>d', 'long_name => e,'),
+                         ['a         => b, -- c=>d', 'long_name => e,'])
+
+    def test_test_file(self):
+        # The expected output is the one from before the tokenizer,
+        # except that a colon in a string no longer sets a column.
+        def read(name):
+            with open(os.path.join(HERE, name), newline='') as f:
+                return f.read().replace('\r\n', '\n').split('\n')
+        lines = read('beautify_test.vhd')
+        beautify.beautify_lines(lines)
+        self.assertEqual(lines, read('beautify_test_expected.vhd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Tests of scan_definitions, which feeds the definitions database used
+by Goto Definition, over the entity layouts of beautify_test.vhd.
+
+Run from the package folder with: python -m unittest discover Test
+"""
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import vhdl_lang
+
+GENERICS = ['item_1', 'item_12', 'item_123']
+PORTS = ['item_1', 'item_12', 'item_123', 'item_1234', 'item_12345']
+
+
+class ScanDefinitionsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(HERE, 'beautify_test.vhd'), newline='') as f:
+            text = f.read().replace('\r\n', '\n')
+        cls.lines = text.split('\n')
+        cls.found = vhdl_lang.scan_definitions(text)
+
+    def clause(self, entity, kind):
+        unit = 'entity ' + entity
+        names = []
+        for row, col, found_kind, name, found_unit in self.found:
+            if found_unit == unit and found_kind == kind:
+                self.assertEqual(self.lines[row][col:col+len(name)], name)
+                names.append(name)
+        return names
+
+    def check_entity(self, entity):
+        self.assertEqual(self.clause(entity, 'generic'), GENERICS)
+        self.assertEqual(self.clause(entity, 'port'), PORTS)
+
+    def test_kr_style(self):
+        self.check_entity('kr_style_entity')
+
+    def test_allman_style(self):
+        self.check_entity('allman_style_entity')
+
+    def test_lisp_style(self):
+        self.check_entity('lisp_style_entity')
+
+    def test_keyword_alone_without_clause(self):
+        found = vhdl_lang.scan_definitions(
+            'entity e is\n    port\nend entity e;\nconstant c : integer := 1;')
+        self.assertEqual([(kind, name) for row, col, kind, name, unit in found],
+                         [('entity', 'e'), ('constant', 'c')])
+
+
+if __name__ == '__main__':
+    unittest.main()
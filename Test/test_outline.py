@@ -0,0 +1,104 @@
+"""
+Tests of the structural outline kept in step with change reports
+that arrive after the buffer was scanned.
+
+Run from the package folder with: python -m unittest discover Test
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vhdl_lang
+
+TEXT = '''library ieee;
+use ieee.std_logic_1164.all;
+
+entity top is
+  port (a : in std_logic);
+end entity top;
+
+architecture rtl of top is
+begin
+  u_sub : entity work.sub
+    port map (a => a);
+end architecture rtl;'''
+
+
+class Buffer():
+    """Lines with a change count, edited the way a view is."""
+    def __init__(self, text):
+        self.lines = text.split('\n')
+        self.change_count = 0
+
+    def edit(self, first, last, new_lines):
+        """Replaces rows first to last and returns the report edit."""
+        self.lines[first:last+1] = new_lines
+        self.change_count += 1
+        return (first, last, len(new_lines))
+
+    def update(self, outline):
+        return outline.update(lambda first, end: self.lines[first:end],
+                              len(self.lines), self.change_count)
+
+    def scan(self):
+        outline = vhdl_lang.Outline()
+        self.update(outline)
+        return outline
+
+
+class LateReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = Buffer(TEXT)
+        self.outline = self.buffer.scan()
+
+    def assertInStep(self):
+        self.buffer.update(self.outline)
+        fresh = self.buffer.scan()
+        self.assertEqual(self.outline.marks, fresh.marks)
+        self.assertEqual(self.outline.units(), fresh.units())
+        self.assertEqual(self.outline.instance_labels(), fresh.instance_labels())
+
+    def test_reports_after_refresh(self):
+        # Two edits, a scan, then the two reports of edits it holds.
+        first = self.buffer.edit(1, 1, ['use ieee.numeric_std.all;'])
+        second = self.buffer.edit(2, 2, ['', ''])
+        self.buffer.update(self.outline)
+        self.outline.report([first], self.buffer.change_count)
+        self.outline.report([second], self.buffer.change_count)
+        self.assertEqual(self.buffer.update(self.outline), 0)
+        self.assertEqual(self.outline.instance_labels(), {'sub': ['u_sub']})
+        self.assertIn('architecture', [unit[2] for unit in self.outline.units()])
+        self.assertInStep()
+
+    def test_report_after_refresh_then_edit(self):
+        # A late report, then an edit reported in time, which is the
+        # only one that should be rescanned.
+        late = self.buffer.edit(0, 0, ['library ieee, std;'])
+        self.buffer.update(self.outline)
+        self.outline.report([late], self.buffer.change_count)
+        edit = self.buffer.edit(10, 10, ['    port map (a => b);'])
+        self.outline.report([edit], self.buffer.change_count)
+        self.assertLess(self.buffer.update(self.outline), len(self.buffer.lines))
+        self.assertInStep()
+
+    def test_refresh_ahead_of_mixed_report(self):
+        # The scan holds the first edit only, and one report covers
+        # both, so the outline has to start over.
+        first = self.buffer.edit(0, 0, ['library ieee, std;'])
+        self.buffer.update(self.outline)
+        second = self.buffer.edit(9, 9, ['  u_other : entity work.other'])
+        self.outline.report([first, second], self.buffer.change_count)
+        self.assertInStep()
+        self.assertEqual(self.outline.instance_labels(), {'other': ['u_other']})
+
+    def test_unreported_edit(self):
+        self.buffer.edit(9, 9, ['  u_other : entity work.other'])
+        self.assertEqual(self.buffer.update(self.outline), len(self.buffer.lines))
+        self.assertInStep()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,1617 @@
+"""
+----------------------------------------------------------------
+ VHDL Beautify Engine.
+
+ Contains the text processing passes used by the beautifier.
+ This module has no dependency on the Sublime Text API so that
+ it may be imported by the editor commands and by the command
+ line formatter (vhdl_cli.py) alike.  The same holds for the
+ modules it shares that role with: vhdl_lang, vhdl_index,
+ vhdl_settings and vhdl_stats.
+----------------------------------------------------------------
+"""
+import os
+import re
+import array
+import bisect
+import shutil
+import hashlib
+import tempfile
+import collections
+import ruamel.yaml
+
+if __package__:
+    from .vhdl_stats import NULL_STATS
+else:
+    from vhdl_stats import NULL_STATS
+
+# The regular expression parser is used to find the keywords an open
+# rule cannot match without.  It moved in Python 3.11.
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Location of the indent rules relative to the package root.  When
+# running inside Sublime Text the package may be zipped, so the editor
+# side installs its own loader through set_rules_loader().
+RULES_RESOURCE = 'Syntax/beautify_rules.yaml'
+
+
+# ---------------------------------------------------------------------------
+def _rules_path():
+    """Path to the rules file next to this module."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        *RULES_RESOURCE.split('/'))
+
+
+# ---------------------------------------------------------------------------
+def _read_rules_file():
+    """
+    Default rules loader.  Reads the rules file from disk next to this
+    module.
+    """
+    with open(_rules_path(), encoding='utf-8') as f:
+        return f.read()
+
+
+# ---------------------------------------------------------------------------
+def _stat_rules_file():
+    """
+    Default rules stamp.  The modification time and size of the rules
+    file, so that an edited file is picked up on the next call.
+    """
+    try:
+        st = os.stat(_rules_path())
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+_rules_loader = _read_rules_file
+_rules_stamp = _stat_rules_file
+_rules_cache = None
+_rules_cache_stamp = None
+
+
+# ---------------------------------------------------------------------------
+def set_rules_loader(loader, stamp=None):
+    """
+    Replaces the function used to obtain the text of the beautify rules.
+    The loader takes no arguments and returns the YAML text.  The
+    optional stamp function returns a value that changes whenever the
+    resource changes.  Without one, the compiled rules are kept until
+    invalidate_rules() is called.
+    """
+    global _rules_loader, _rules_stamp
+    _rules_loader = loader
+    _rules_stamp = stamp
+    invalidate_rules()
+
+
+# ---------------------------------------------------------------------------
+def invalidate_rules():
+    """
+    Drops the compiled rules so the next request reloads the resource.
+    """
+    global _rules_cache, _rules_cache_stamp
+    _rules_cache = None
+    _rules_cache_stamp = None
+
+
+# ---------------------------------------------------------------------------
+def _plain(node):
+    """
+    Converts the ruamel containers into builtin dicts and lists, which
+    are quicker to index in the hot loops.
+    """
+    if isinstance(node, dict):
+        return {key: _plain(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_plain(value) for value in node]
+    return node
+
+
+# ---------------------------------------------------------------------------
+_word_re = re.compile(r'\w+')
+
+
+def required_words(pattern):
+    """
+    Returns the lowercase whole words that any line matching the
+    pattern must contain, found among the literal runs at the top level
+    of the pattern.  A word only counts when the pattern bounds it on
+    both sides, by \\b, ^, $ or a non-word literal.  The list may be
+    empty, in which case nothing can be assumed about the line.
+    """
+    try:
+        items = list(sre_parse.parse(pattern, re.IGNORECASE))
+    except Exception:
+        return []
+    words = []
+    run = []
+    left = False
+    prev = None
+    for op, av in items + [(None, None)]:
+        if op is sre_parse.LITERAL:
+            if not run:
+                left = bool(prev is not None and prev[0] is sre_parse.AT and
+                            prev[1] in (sre_parse.AT_BEGINNING, sre_parse.AT_BOUNDARY))
+            run.append(chr(av))
+        else:
+            if run:
+                right = bool(op is sre_parse.AT and
+                             av in (sre_parse.AT_END, sre_parse.AT_BOUNDARY))
+                # Pad an unbounded edge with a word character so that a
+                # word touching it merges with the pad and is dropped.
+                text = ('' if left else 'x') + ''.join(run) + ('' if right else 'x')
+                for m in _word_re.finditer(text):
+                    if (m.start() == 0 and not left) or (m.end() == len(text) and not right):
+                        continue
+                    words.append(m.group().lower())
+                run = []
+        prev = (op, av)
+    return words
+
+
+# ---------------------------------------------------------------------------
+class BeautifyRules():
+    """
+    The indent rules from beautify_rules.yaml with every pattern
+    compiled once, case insensitive.
+
+    key_list, open_rules and close_rules mirror the YAML sections.
+    open_patterns is the ordered list of (key, compiled pattern) pairs
+    for the opening keywords, close_patterns maps each close rule key to
+    its compiled pattern, and solo_patterns holds the variation that
+    only matches when the closing symbol begins the line.
+    close_sequences maps each open key to its close rule list as
+    (close key, continuation, close pattern, solo pattern) tuples.
+
+    The open rules are indexed by a keyword each must contain (see
+    required_words) so that classify() only tries the rules whose
+    keywords appear on the line, in key_list order.  searches counts
+    the patterns classify() has tried, for instrumentation.
+    """
+    def __init__(self, blob):
+        blob = _plain(blob)
+        self.key_list = blob['key_list']
+        self.open_rules = blob['open_rules']
+        self.close_rules = blob['close_rules']
+        self.open_patterns = []
+        for key in self.key_list:
+            pattern = self.open_rules[key]['pattern']
+            self.open_patterns.append((key, re.compile(pattern, re.IGNORECASE)))
+        self.close_patterns = {}
+        self.solo_patterns = {}
+        for key, pattern in self.close_rules.items():
+            self.close_patterns[key] = re.compile(pattern, re.IGNORECASE)
+            self.solo_patterns[key] = re.compile(r'^\)?\s?' + pattern, re.IGNORECASE)
+        self.close_sequences = {}
+        for key, rule in self.open_rules.items():
+            if rule.get('close_rule') is not None:
+                self.close_sequences[key] = [
+                    (close_key, result, self.close_patterns[close_key],
+                     self.solo_patterns[close_key])
+                    for close_key, result in rule['close_rule']]
+
+        # Keyword index.  Index each rule under its longest required
+        # word; rules without one are tried on every line.
+        self.open_index = {}
+        self.open_always = []
+        self.searches = 0
+        for n, key in enumerate(self.key_list):
+            words = required_words(self.open_rules[key]['pattern'])
+            if words:
+                self.open_index.setdefault(max(words, key=len), []).append(n)
+            else:
+                self.open_always.append(n)
+
+    def classify(self, line):
+        """
+        Returns the key of the first open rule, in key_list order, that
+        matches the line, or None.
+        """
+        candidates = None
+        index = self.open_index
+        for word in _word_re.findall(line.lower()):
+            found = index.get(word)
+            if found:
+                if candidates is None:
+                    candidates = set(self.open_always)
+                candidates.update(found)
+        if candidates is None:
+            candidates = self.open_always
+        else:
+            candidates = sorted(candidates)
+        open_patterns = self.open_patterns
+        tried = 0
+        for n in candidates:
+            tried += 1
+            key, pattern = open_patterns[n]
+            if pattern.search(line):
+                self.searches += tried
+                return key
+        self.searches += tried
+        return None
+
+    @classmethod
+    def from_text(cls, text):
+        """Parses the YAML text of a rules file."""
+        yaml = ruamel.yaml.YAML()
+        yaml.version = (1, 2)
+        return cls(yaml.load(text))
+
+
+# ---------------------------------------------------------------------------
+def load_rules():
+    """
+    Returns the compiled BeautifyRules, parsing the resource only the
+    first time or after it changes.
+    """
+    global _rules_cache, _rules_cache_stamp
+    stamp = _rules_stamp() if _rules_stamp is not None else None
+    if _rules_cache is None or stamp != _rules_cache_stamp:
+        _rules_cache = BeautifyRules.from_text(_rules_loader())
+        _rules_cache_stamp = stamp
+    return _rules_cache
+
+
+# ---------------------------------------------------------------------------
+def rules_digest():
+    """
+    Hash of the text of the beautify rules, so that saved results can
+    be dropped when the rules change.
+    """
+    return hashlib.sha1(_rules_loader().encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+def left_justify(lines):
+    """
+    Method removes all whitespace at the beginning of a line.
+    """
+    for i in range(len(lines)):
+        lines[i] = re.sub(r"^\s*", '', lines[i])
+
+
+# ---------------------------------------------------------------
+# Token kinds produced by tokenize().
+SPACE = 'space'
+COMMENT = 'comment'
+STRING = 'string'
+BITSTRING = 'bitstring'
+BASED = 'based'
+NUMBER = 'number'
+IDENTIFIER = 'identifier'
+CHAR = 'char'
+DELIMITER = 'delimiter'
+
+# One alternative per token kind, tried in order at each position.
+# Every character falls into some alternative, so a scan with
+# finditer covers the whole line.  A tick directly after a name, a
+# closing paren or bracket is an attribute or qualified expression
+# rather than the start of a character literal.  An unterminated
+# string runs to the end of the line.
+_token_re = re.compile(r"""
+      (?P<space>\s+)
+    | (?P<comment>--.*)
+    | (?P<string>"(?:[^"]|"")*"?)
+    | (?P<bitstring>\d*(?:[uUsS]?[bBoOxX]|[dD])"[^"]*"?)
+    | (?P<based>\d[\d_]*\#[0-9a-zA-Z_.]*\#(?:[eE][+-]?\d+)?)
+    | (?P<number>\d[\d_]*(?:\.[\d_]+)?(?:[eE][+-]?[\d_]+)?)
+    | (?P<identifier>[^\W\d_]\w*|\\(?:[^\\]|\\\\)*\\?)
+    | (?P<char>(?<![\w)\]])'.')
+    | (?P<delimiter>=>|\*\*|:=|/=|>=|<=|<>|\?\?|\?/=|\?<=|\?>=|\?=|\?<|\?>|<<|>>|.)
+    """, re.VERBOSE)
+
+
+# ---------------------------------------------------------------
+def tokenize(line):
+    """
+    Splits a single line into a list of (kind, start, end) tuples in
+    one linear scan.  Kinds are the module constants SPACE, COMMENT,
+    STRING, BITSTRING, BASED, NUMBER, IDENTIFIER, CHAR and DELIMITER.
+    Block comments spanning lines are not tracked.
+    """
+    return [(m.lastgroup, m.start(), m.end()) for m in _token_re.finditer(line)]
+
+
+# ---------------------------------------------------------------
+def comment_start(line, tokens=None):
+    """
+    Returns the position of the comment in the line, or the line
+    length if there is none.
+    """
+    if '--' not in line:
+        return len(line)
+    if tokens is None:
+        tokens = tokenize(line)
+    for kind, start, end in tokens:
+        if kind == COMMENT:
+            return start
+    return len(line)
+
+
+# ---------------------------------------------------------------
+def check_for_comment(line):
+    """
+    Simple method that will return False if a line does not
+    begin with a comment, otherwise True.  Mainly used for
+    disabling alignment.
+    """
+    return bool(_comment_line_re.match(line))
+
+_comment_line_re = re.compile(r'\s*--')
+
+
+# ---------------------------------------------------------------
+def strip_comments(line, tokens=None):
+    """
+    Removes any inline comment from the line, accounting for
+    comment symbols inside of text strings and character literals.
+    Does not account for multiline commenting.
+    """
+    return line[:comment_start(line, tokens)]
+
+
+# ---------------------------------------------------------------------------
+# The symbols padded with a space on either side by pad_vhdl_symbols.
+_padded_symbols = {
+    ':'  : ' : ',
+    ':=' : ' := ',
+    '<=' : ' <= ',
+    '=>' : ' => ',
+}
+
+
+# ---------------------------------------------------------------------------
+def normalize_line(line, tokens=None, pad=True, compress=True):
+    """
+    Rebuilds a line from its tokens, removing leading whitespace,
+    optionally padding the alignment symbols and optionally compressing
+    each run of whitespace in the code to a single space.  Comments,
+    strings and character literals are copied untouched.
+    """
+    if tokens is None:
+        tokens = tokenize(line)
+    parts = []
+    space = False
+    for kind, start, end in tokens:
+        if kind == SPACE:
+            # Leading space is dropped, other runs are kept or
+            # collapsed.
+            if parts:
+                if compress:
+                    space = True
+                else:
+                    parts.append(line[start:end])
+            continue
+        if kind == COMMENT and not parts:
+            # Full line comments are only left justified.
+            return line[start:]
+        text = line[start:end]
+        if pad and kind == DELIMITER and text in _padded_symbols:
+            if compress:
+                # The padding merges with any neighboring space.
+                parts.append(' ' + text)
+                space = True
+                continue
+            text = _padded_symbols[text]
+        if space:
+            parts.append(' ')
+            space = False
+        parts.append(text)
+    if space:
+        parts.append(' ')
+    return ''.join(parts)
+
+
+# ---------------------------------------------------------------------------
+def pad_vhdl_symbols(lines):
+    """
+    Ensuring that special symbols that later we'll align on have a minimum
+    leading and trailing space.  Aids correct alignment.  Leaving it at
+    assignment and languaage delimeters for now.  Symbols inside strings,
+    character literals and comments are left alone.
+    """
+    for i in range(len(lines)):
+        if not check_for_comment(lines[i]):
+            lines[i] = normalize_line(lines[i], compress=False)
+
+
+# ---------------------------------------------------------------------------
+def remove_extra_space(lines):
+    """
+    Method that takes out extra whitespace in a line.  Avoids
+    full line comments, in-line comments and string literals.
+    """
+    for i in range(len(lines)):
+        if not check_for_comment(lines[i]):
+            lines[i] = normalize_line(lines[i], pad=False)
+
+
+# ---------------------------------------------------------------------------
+def normalize_lines(lines):
+    """
+    Performs left_justify, pad_vhdl_symbols and remove_extra_space in a
+    single pass, tokenizing each line once.
+    """
+    for i in range(len(lines)):
+        lines[i] = normalize_line(lines[i])
+
+
+# ---------------------------------------------------------------
+class Parentheses():
+    '''
+    An object whose purpose is to keep track of parenthesis counts
+    and provide helper functions while traversing a text file.
+
+    May be initialized with a two element list indicating the starting
+    counts if needed.
+
+    open_cnt and close_cnt represent the current number of unmatched
+    open and closing parentheses.
+
+    open_pos and close_pos represent the character position of the UNMATCHED
+    open and closing parentheses in the last scanned string.
+    '''
+    def __init__(self, counts=[0, 0]):
+        self.open_cnt = counts[0]
+        self.close_cnt = counts[1]
+        self.open_pos = []
+        self.close_pos = []
+
+    @property
+    def delta(self):
+        return self.open_cnt - self.close_cnt
+
+    @property
+    def balanced(self):
+        return bool(self.open_cnt == self.close_cnt)
+
+    def reset(self):
+        self.__init__()
+
+    def scan(self, line, tokens=None):
+        # Only parenthesis delimiter tokens count, so parens in strings,
+        # character literals and comments are ignored.  The tokens of
+        # the line may be passed in if already known.
+        if tokens is None:
+            tokens = tokenize(line)
+        # Reset the position lists.
+        self.open_pos = []
+        self.close_pos = []
+        for kind, i, end in tokens:
+            if kind != DELIMITER:
+                continue
+            if line[i] == '(':
+                # If we find a ( then increment the count and append the
+                # position.
+                self.open_cnt += 1
+                self.open_pos.append(i)
+            elif line[i] == ')':
+                # If we find a ) there are several options.
+                # If open_pos has members, pop off the mate.  Also decrement
+                # the count.
+                # If open_cnt > 0 then decrement the count of the prior
+                # unmatched open.
+                # If open_cnt = 0 then increment the closing count and
+                # append the position.
+                if self.open_pos:
+                    self.open_cnt -= 1
+                    self.open_pos.pop()
+                elif self.open_cnt > 0:
+                    self.open_cnt -= 1
+                else:
+                    self.close_pos.append(i)
+                    self.close_cnt += 1
+
+    def stats(self):
+        return '#(={}, #)={}, OPos={}, CPos={}'.format(self.open_cnt,
+            self.close_cnt, self.open_pos, self.close_pos)
+
+    def extract(self, line):
+        '''Given a string, extracts the contents of the next parenthetical
+        grouping (including interior parenthetical groups.)'''
+        start = 0
+        end = 0
+        pcount = 0
+        for i in range(len(line)):
+            if line[i] == '(' and pcount == 0:
+                pcount += 1
+                start = i + 1
+            elif line[i] == '(':
+                pcount += 1
+
+            if line[i] == ')' and pcount > 1:
+                pcount -= 1
+            elif line[i] == ')' and pcount == 1:
+                end = i - 1
+                pcount -= 1
+                break
+        if start >= end:
+            return None
+        else:
+            return line[start:end]
+
+# ---------------------------------------------------------------
+def paren_delta(line, tokens=None):
+    """
+    The change in parenthesis depth over a line, the open less the
+    closing parentheses.  Those in strings, character literals,
+    extended identifiers and comments do not count.  The tokens of
+    the line may be passed in if already known, and are only walked
+    when the line has something that could hide a parenthesis.
+    """
+    opens = line.count('(')
+    closes = line.count(')')
+    if not (opens or closes):
+        return 0
+    if '"' not in line and "'" not in line and '\\' not in line and '--' not in line:
+        return opens - closes
+    if tokens is None:
+        tokens = tokenize(line)
+    delta = 0
+    for kind, start, end in tokens:
+        if kind == DELIMITER:
+            if line[start] == '(':
+                delta += 1
+            elif line[start] == ')':
+                delta -= 1
+    return delta
+
+
+# ---------------------------------------------------------------
+# Lines matching any of these are never aligned, otherwise you can get
+# some matching between conditionals and assignments and other nonsense.
+_ban_re = re.compile(r':\s+process\b|\bif\b|\bthen\b|\bwhen\b(?=.*?=>)', re.IGNORECASE)
+
+# The columns aligned by the buffer beautify before and after indenting,
+# as (regexp, padside) pairs.
+PRE_INDENT_COLUMNS = [
+    (r':(?!=)', 'pre'),
+    (r':(?!=)\s?(?:in\b|out\b|inout\b|buffer\b)?\s*', 'post'),
+    (r'<|:(?==)', 'pre'),
+    (r'=>', 'pre'),
+]
+POST_INDENT_COLUMNS = [
+    (r'\bwhen\b', 'pre'),
+    (r'--', 'pre'),
+]
+
+# The columns used for generated interface declarations.
+INTERFACE_COLUMNS = [
+    (r':', 'pre'),
+    (r':\s?(?:in\b|out\b|inout\b|buffer\b)?\s*', 'post'),
+    (r':=', 'pre'),
+]
+
+
+# ---------------------------------------------------------------
+_LITERALS = (STRING, BITSTRING, CHAR, COMMENT)
+
+# The first quote or comment marker of a line.  Matches before it are
+# always in code, and so is one of a comment marker found here.
+_literal_start_re = re.compile(r'["\']|--')
+
+
+def _code_search(pattern, line, tokens, s):
+    """
+    Returns the first match of the pattern, from the match s on, that
+    starts in code rather than inside a literal or a comment.  The
+    first character of a comment counts as code so that comments can
+    be aligned.
+    """
+    t = 0
+    while s is not None:
+        pos = s.start()
+        while t < len(tokens) and tokens[t][2] <= pos:
+            t += 1
+        if t == len(tokens):
+            return s
+        kind, start, end = tokens[t]
+        if kind not in _LITERALS or (kind == COMMENT and pos == start):
+            return s
+        if kind == COMMENT:
+            return None
+        s = pattern.search(line, end)
+    return None
+
+
+# ---------------------------------------------------------------
+def _pad_shift(pads, pos):
+    """Number of pad spaces inserted at or before pos."""
+    shift = 0
+    for at, count in pads.items():
+        if at <= pos:
+            shift += count
+    return shift
+
+
+# ---------------------------------------------------------------
+def _padded_char(line, pads, index):
+    """
+    Character at index of the line as it would read with the pads
+    inserted.  Negative indexes count from the end like a string.
+    """
+    if index < 0:
+        index += len(line) + sum(pads.values())
+    offset = 0
+    for at in sorted(pads):
+        if index < at + offset:
+            break
+        if index < at + offset + pads[at]:
+            return ' '
+        offset += pads[at]
+    return line[index - offset]
+
+
+# ---------------------------------------------------------------
+def align_columns(lines, columns, ignore_comment_lines=True, scope_data=None,
+                  stats=None, pads=None, prefixes=None):
+    """
+    Receives a list of individual lines and an ordered list of
+    (regexp, padside) alignment columns.  For each column, scans each
+    line looking for the lexical pattern that should align on
+    adjoining lines.  Runs of consecutive lines with the pattern form a
+    block, which ends at a line without the pattern, at a change of
+    scope, at a banned line or at the end of the list.  Within a block,
+    the line with the rightmost symbol sets the column and the other
+    lines are padded on the side declared (anything that is not 'post'
+    is prepend because that's most common.)
+
+    The result is the same as aligning each column in turn, however
+    all the blocks are found in a single traversal.  The pads for each
+    column are then worked out in order, taking into account the
+    spaces earlier columns insert, and each line is rebuilt once.
+    Patterns are matched against the unpadded line, which agrees with
+    the column by column result as the padding only widens the space
+    in front of an aligned symbol.  Matches inside strings, character
+    literals and trailing comments are skipped, except for one at the
+    start of a comment.  Comment lines are never aligned, but one with
+    the pattern anywhere does not end a block.
+
+    Alignment should happen when the strings are left justified
+    so that it doesn't need to know about the spacing.  If stats is a
+    Stats object, the pattern searches, blocks and padded lines are
+    counted into it.
+
+    If pads is a dictionary, the lines are left alone and the pads are
+    added to it instead, on top of those already there, as {line
+    index: (position, spaces, position, spaces, ...)} in order.
+    prefixes may then give a string per line that is taken to stand
+    in front of it, such as its indent.  This is how LineBuffer
+    defers building the lines.
+    """
+    patterns = []
+    for regexp, padside in columns:
+        patterns.append((re.compile(regexp), padside == 'post'))
+    num_cols = len(patterns)
+    last = len(lines) - 1
+
+    # Find the blocks.  Each block is a flat array of line index and
+    # match position pairs, which takes a fraction of the memory of a
+    # list of tuples on large files.
+    blocks = [[] for k in range(num_cols)]
+    match_data = [array.array('l') for k in range(num_cols)]
+    prior_scope = ""
+    for i in range(len(lines)):
+        line = lines[i]
+
+        # Check for banned lines we don't even want to think about.
+        banned = bool(_ban_re.search(line))
+
+        # Adding a hook here for better comment handling.  Check to see if this
+        # is a commented line and if we should pay attention to it.
+        # ignore_comment_lines is True by default and until this routine is
+        # more sophisticated should probably remain true.
+        comment_check = False
+        if ignore_comment_lines:
+            comment_check = check_for_comment(line)
+        guard = _literal_start_re.search(line)
+        guard = guard.start() if guard else len(line)
+        tokens = None
+
+        # First decide if based on lack of pattern, scope change, or
+        # a banned line or end of file whether we should process any
+        # currently existing match list.
+        scope_switch = False
+        if scope_data is not None:
+            scope_switch = bool(scope_data[i] != prior_scope)
+
+        for k in range(num_cols):
+            pattern, post = patterns[k]
+            data = match_data[k]
+
+            # Scan for the aligning pattern
+            s = pattern.search(line)
+            if (s is not None and s.start() >= guard and not comment_check and
+                    not (s.start() == guard and line[guard] == '-')):
+                if tokens is None:
+                    tokens = tokenize(line)
+                s = _code_search(pattern, line, tokens, s)
+
+            # A special check for the last line to add to the group, otherwise
+            # we process before we can evaluate that line.
+            if s and (i == last) and not comment_check and not banned:
+                data.extend((i, s.end() if post else s.start()))
+
+            # If this line breaks the sequence of lines that had the
+            # pattern, or if it's the last line, or if it was a line that
+            # was skipped due to banning, or if the whole line scope
+            # changed (e.g. comment line broke the block) then the block
+            # is complete.
+            if not s or scope_switch or (i == last) or banned:
+                if len(data) > 2:
+                    blocks[k].append(data)
+                    data = match_data[k] = array.array('l')
+                elif data:
+                    del data[:]
+
+            # Finally, if this line has an alignment symbol in it (and not
+            # banned) start adding data again.
+            if s and not comment_check and not banned:
+                data.extend((i, s.end() if post else s.start()))
+
+        # Make sure we save the current scope off before looping
+        if scope_data is not None:
+            prior_scope = scope_data[i]
+
+    # Work out the pads column by column.  pads maps a line index to
+    # a dictionary of {position in the unpadded line: spaces}.
+    # Pads kept from an earlier pass, as flat tuples of position and
+    # spaces, are turned back into dictionaries as they are needed.
+    deferred = pads is not None
+    if not deferred:
+        pads = {}
+    no_pads = {}
+    padded = set()
+    touched = set()
+    width = 0
+    for k in range(num_cols):
+        for block in blocks[k]:
+            # Scan for max value and check to see if extra space needed
+            # due to lack of preceding space.  Positions are as they
+            # read after the earlier columns were padded.
+            maxpos = 0
+            shifted = []
+            for j in range(0, len(block), 2):
+                i = block[j]
+                pos = block[j+1]
+                line_pads = pads.get(i, no_pads)
+                if type(line_pads) is tuple:
+                    line_pads = pads[i] = dict(zip(line_pads[::2], line_pads[1::2]))
+                    touched.add(i)
+                if prefixes is not None:
+                    width = len(prefixes[i])
+                now = width + pos + _pad_shift(line_pads, pos)
+                shifted.append((i, pos, now))
+                if now > maxpos:
+                    maxpos = now
+                    if now <= width:
+                        char = prefixes[i][now-1]
+                    else:
+                        char = _padded_char(lines[i], line_pads, now-1-width)
+                    if char != ' ':
+                        maxpos = maxpos + 1
+            # Now pad each line (max-current) to make up the space.
+            for i, pos, now in shifted:
+                if maxpos > now:
+                    line_pads = pads.setdefault(i, {})
+                    line_pads[pos] = line_pads.get(pos, 0) + maxpos - now
+                    padded.add(i)
+
+    # Rebuild the padded lines, or keep the pads in the compact form.
+    if deferred:
+        for i in padded | touched:
+            pads[i] = _flat_pads(pads[i])
+    else:
+        for i, line_pads in pads.items():
+            lines[i] = padded_line(lines[i], _flat_pads(line_pads))
+
+    if stats is not None:
+        # One ban search, one comment check and one search per column
+        # for every line.
+        per_line = num_cols + (2 if ignore_comment_lines else 1)
+        stats.count('regex_evals', per_line * len(lines))
+        stats.count('align_groups', sum(len(b) for b in blocks))
+        stats.count('aligned_lines', len(padded))
+
+
+# ---------------------------------------------------------------
+def _flat_pads(pads):
+    """A {position: spaces} dictionary as a flat tuple in order."""
+    flat = []
+    for at in sorted(pads):
+        flat.append(at)
+        flat.append(pads[at])
+    return tuple(flat)
+
+
+def padded_line(line, pads, prefix=''):
+    """
+    The line with the pads inserted, given as a flat tuple of
+    position and spaces in order of position.
+    """
+    parts = [prefix]
+    prev = 0
+    for j in range(0, len(pads), 2):
+        at = pads[j]
+        parts.append(line[prev:at])
+        parts.append(' '*pads[j+1])
+        prev = at
+    parts.append(line[prev:])
+    return ''.join(parts)
+
+
+# ---------------------------------------------------------------
+def align_block_on_re(lines, regexp, padside='pre', ignore_comment_lines=True, scope_data=None):
+    """
+    Aligns a single column, see align_columns.  This is intended to
+    be run in several passes on several patterns which is why it takes
+    the regexp as a parameter, however aligning several columns at once
+    with align_columns is quicker.
+    """
+    align_columns(lines, [(regexp, padside)], ignore_comment_lines, scope_data)
+
+
+# ---------------------------------------------------------------
+class IndentState():
+    """
+    The state indent_vhdl carries from one line to the next, so that
+    indentation may resume partway through a file.
+
+    depth is the number of parentheses open, a running sum of
+    paren_delta over the lines so far.  The lines after one that
+    leaves it other than zero are indented one extra level.
+
+    closing_stack is a deque and each element is:
+    0. The key name matched.
+    1. The current indent level.
+    2. The parenthesis depth.
+    Since it's a stack, we're always referencing element 0 (top).
+    """
+    def __init__(self, initial=0):
+        self.current_indent = initial
+        self.next_indent = initial
+        self.depth = 0
+        self.closing_stack = collections.deque()
+
+    def copy(self):
+        """
+        Returns an independent snapshot.  The stack entries are
+        replaced rather than altered, so a shallow copy of the stack
+        is enough.
+        """
+        new = IndentState()
+        new.current_indent = self.current_indent
+        new.next_indent = self.next_indent
+        new.depth = self.depth
+        new.closing_stack = collections.deque(self.closing_stack)
+        return new
+
+    def at_rest(self):
+        """True if the state is the same as at the start of a file."""
+        return bool(self.current_indent == 0 and self.next_indent == 0 and
+                    self.depth == 0 and not self.closing_stack)
+
+
+# ---------------------------------------------------------------
+class IndentCheckpoints():
+    """
+    Snapshots of IndentState taken every interval rows while
+    indenting.  The snapshot for a row is the state before that row
+    was processed, so it only depends on the rows above it.
+    """
+    def __init__(self, interval=256):
+        self.interval = interval
+        self.rows = []
+        self.states = {}
+
+    def add(self, row, state):
+        if row not in self.states:
+            bisect.insort(self.rows, row)
+        self.states[row] = state.copy()
+
+    def nearest(self, row):
+        """
+        Returns (row, state) for the closest snapshot at or before the
+        row, the state being a copy safe to advance.  Returns (0, None)
+        if there is none.
+        """
+        index = bisect.bisect_right(self.rows, row)
+        if index == 0:
+            return (0, None)
+        found = self.rows[index-1]
+        return (found, self.states[found].copy())
+
+    def invalidate(self, row):
+        """
+        Drops every snapshot that depends on the row, i.e. all those
+        after it.
+        """
+        index = bisect.bisect_right(self.rows, row)
+        for dropped in self.rows[index:]:
+            del self.states[dropped]
+        del self.rows[index:]
+
+    def clear(self):
+        self.rows = []
+        self.states = {}
+
+
+# ---------------------------------------------------------------
+# Trace events recorded by indent_vhdl, with the format of their
+# arguments.
+TRACE_FORMATS = {
+    'line'    : 'ci={} ni={} depth={} stack={}',
+    'open'    : 'open rule {} indent {:+d}/{:+d}',
+    'push'    : 'push {} (indent {})',
+    'parens'  : 'unbalanced parenthesis, current indent +1',
+    'match'   : 'close rule {} matches {}',
+    'continue': 'continue {} as {}',
+    'solo'    : 'solo {}, current indent {:+d}',
+    'close'   : 'close {} ({}), pop',
+    'result'  : 'ci={} ni={}',
+}
+
+
+class IndentTrace():
+    """
+    A bounded ring buffer of the decisions indent_vhdl makes.  Each
+    record is a (row, event, args) tuple where event is a key of
+    TRACE_FORMATS.  Nothing is recorded, or formatted, unless a trace
+    is passed to indent_vhdl.  Only the newest maxlen records are
+    kept.
+    """
+    def __init__(self, maxlen=4096):
+        self.records = collections.deque(maxlen=maxlen)
+
+    def add(self, row, event, *args):
+        self.records.append((row, event, args))
+
+    def clear(self):
+        self.records.clear()
+
+    def for_row(self, row):
+        return [record for record in self.records if record[0] == row]
+
+    def format(self, records=None):
+        """Returns the records (all of them by default) as text lines."""
+        if records is None:
+            records = self.records
+        return ['{}: {}'.format(row+1, TRACE_FORMATS[event].format(*args))
+                for row, event, args in records]
+
+
+# ---------------------------------------------------------------
+def indent_vhdl(lines, initial=0, tab_size=4, use_spaces=True, rules=None,
+                state=None, checkpoints=None, first_row=0, stats=None, trace=None,
+                prefixes=None):
+    """
+    This method takes a list of lines of source code, that have
+    been left justified, and attempts impose indentation rules
+    upon it for beautification.  rules may be a BeautifyRules
+    object, otherwise the cached package rules are used.
+
+    To resume partway through a file, pass the IndentState in effect
+    before the first line as state (initial is then ignored).  It is
+    updated to the state after the last line.  If checkpoints is an
+    IndentCheckpoints object, snapshots are recorded into it, with
+    first_row giving the row number of the first line.  If stats is a
+    Stats object, the pattern searches and the deepest closing stack
+    are counted into it.  If trace is an IndentTrace, the decisions
+    made on each line are recorded into it.  If prefixes is a list,
+    the lines are left alone and the indent of each is appended to it
+    instead, one string per level shared by all the lines at it.
+    """
+    # 4th iteration of the ruleset.  Frankly I was getting tired of
+    # scrolling past it every time I worked on this file.  I abstracted the
+    # structures out into a YAML formatted file.  All the rules are there.
+    if rules is None:
+        rules = load_rules()
+
+    open_rules = rules.open_rules
+    close_sequences = rules.close_sequences
+    classify = rules.classify
+    searches = rules.searches
+    close_searches = 0
+    max_depth = 0
+
+    # Initialize the indent indexes, held in locals for speed and
+    # written back to the state at the end.
+    if state is None:
+        state = IndentState(initial)
+    current_indent = state.current_indent
+    next_indent = state.next_indent
+    depth = state.depth
+    closing_stack = state.closing_stack
+    # Set the indent to tabs or spaces here
+    if use_spaces:
+        indent_char = ' '*tab_size
+    else:
+        indent_char = '\t'
+    level_prefixes = {}
+
+    # Scan the lines.
+    for i in range(len(lines)):
+        if checkpoints is not None and (first_row + i) % checkpoints.interval == 0:
+            state.current_indent = current_indent
+            state.next_indent = next_indent
+            state.depth = depth
+            state.closing_stack = closing_stack
+            checkpoints.add(first_row + i, state)
+
+        # Strip any comment from the line before analysis.
+        tokens = tokenize(lines[i])
+        line = strip_comments(lines[i], tokens)
+        if trace is not None:
+            row = first_row + i
+            trace.add(row, 'line', current_indent, next_indent, depth, len(closing_stack))
+
+        ############################################################
+        # Modification Rules
+        # Priority 1: Keywords
+        key = classify(line)
+        if key is not None:
+            rule = open_rules[key]
+            if trace is not None:
+                trace.add(row, 'open', key, rule['indent_rule'][0], rule['indent_rule'][1])
+            # If an ending type is noted, push the key onto the
+            # stack.  Save the current indent, and the current parenthetical
+            # state as well.
+            if rule['close_rule'] is not None:
+                closing_stack.appendleft([key, current_indent, depth])
+                if trace is not None:
+                    trace.add(row, 'push', key, current_indent)
+            # Apply the current and next indent values to
+            # the current values.
+            current_indent += rule['indent_rule'][0]
+            next_indent += rule['indent_rule'][1]
+
+        # Priority 2: Unbalanced Parenthesis
+        # Unbalanced parenthesis rules.  The line where an unbalanced paren
+        # begins is not modified, however for every line after that while we are
+        # unbalanced, indent one additional level to the current line (but not the
+        # next because we don't want to keep incrementing outwards.)  When balance
+        # is restored, stop.
+        if depth:
+            if trace is not None:
+                trace.add(row, 'parens')
+            current_indent += 1
+        depth += paren_delta(lines[i], tokens)
+
+        # Special: Closing Item Reset
+        # Scan the line for ending key if one exists. If
+        # parentheses are balanced and then ending key has been found
+        # then reset the current and next indent level to this state.
+        # The evaluate flag is used because a branching lexical
+        # structure was discovered and the line needs to be rescanned.
+        if len(closing_stack):
+            if len(closing_stack) > max_depth:
+                max_depth = len(closing_stack)
+            eval_line = True
+            while eval_line:
+                # Assume that we will traverse only once, and set the flag
+                # to false.  If we need to rescan, the flag will be set
+                # true.
+                eval_line = False
+
+                # Since the closing rule pattern could be multiple patterns, we have to scan
+                # through that item, referencing into the close_rules dictionary for the
+                # pattern.  Assigning the rule list to another name to stop the madness
+                # of indirection.
+                stack_key, stack_indent, stack_depth = closing_stack[0]
+                stack_rules = close_sequences[stack_key]
+
+                # Step through and search for the end pattern.
+                for close_key, result, close_pattern, solo_pattern in stack_rules:
+                    close_search = close_pattern.search(line)
+                    close_searches += 1
+                    if close_search and depth == stack_depth:
+                        # We've found a match and are in a balanced state.
+                        if trace is not None:
+                            trace.add(row, 'match', close_key, stack_key)
+                        if result is not None:
+                            # We have found a continuation of the structure.
+                            # Pop off the top of the stack, then append the new
+                            # key to the top of the stack and re-evaluate.
+                            if trace is not None:
+                                trace.add(row, 'continue', stack_key, result)
+                            closing_stack.popleft()
+                            closing_stack.appendleft([result, stack_indent, stack_depth])
+                            # Need to do a solo line check, mainly for those is clauses.
+                            if open_rules[result]['solo_flag']:
+                                solo_search = solo_pattern.search(line)
+                                close_searches += 1
+                                if solo_search:
+                                    # Unindent this line most likely
+                                    if trace is not None:
+                                        trace.add(row, 'solo', result, open_rules[result]['start_offset'])
+                                    current_indent += open_rules[result]['start_offset']
+                            eval_line = True
+                        else:
+                            # This is the endpoint of the structure.
+                            # Behavior changes based on the solo flag
+                            if open_rules[stack_key]['solo_flag']:
+                                # Solo flag rules means we only apply the closing
+                                # rule to the current line if the symbol is alone
+                                # on a line, otherwise we apply the closing rule
+                                # to the following line.
+                                # Scan the line again to check for the beginning
+                                # of the line variation.  (Small alteration to
+                                # check for an paren in the case of endclauses
+                                # that might not have the built-in paren)
+                                solo_search = solo_pattern.search(line)
+                                close_searches += 1
+                                if solo_search:
+                                    # Revert on this line
+                                    if trace is not None:
+                                        trace.add(row, 'close', stack_key, 'solo, this line')
+                                    current_indent = stack_indent + open_rules[stack_key]['close_offset']
+                                    next_indent = stack_indent
+                                else:
+                                    if trace is not None:
+                                        trace.add(row, 'close', stack_key, 'not alone, next line')
+                                    # Revert on the next line
+                                    next_indent = stack_indent
+                            else:
+                                if trace is not None:
+                                    trace.add(row, 'close', stack_key, 'this line')
+                                # No special rule handling.  Revert on this line.
+                                current_indent = next_indent = stack_indent
+                            # Pop the top of the stack and we're done with evaluating
+                            # closing strings.
+                            closing_stack.popleft()
+
+        # Modify the line here.
+        if prefixes is None:
+            lines[i] = indent_char*current_indent+lines[i]
+        else:
+            prefix = level_prefixes.get(current_indent)
+            if prefix is None:
+                prefix = level_prefixes[current_indent] = indent_char*current_indent
+            prefixes.append(prefix)
+        if trace is not None:
+            trace.add(row, 'result', current_indent, next_indent)
+        # Set current for next line.
+        current_indent = next_indent
+
+    state.current_indent = current_indent
+    state.next_indent = next_indent
+    state.depth = depth
+    state.closing_stack = closing_stack
+
+    if stats is not None:
+        # Each line is tokenized and split into words once, then the
+        # candidate open rules and the close rules are searched.
+        stats.count('regex_evals', 2 * len(lines) + rules.searches - searches +
+                    close_searches)
+        stats.peak('max_stack_depth', max_depth)
+
+
+# ---------------------------------------------------------------
+def advance_indent(lines, state, rules=None, checkpoints=None, first_row=0,
+                   trace=None):
+    """
+    Moves an IndentState forward over lines without changing them,
+    e.g. the already formatted lines above a region being beautified.
+    """
+    lines = list(lines)
+    normalize_lines(lines)
+    indent_vhdl(lines, rules=rules, state=state, checkpoints=checkpoints,
+                first_row=first_row, trace=trace)
+
+
+# ---------------------------------------------------------------
+class LineBuffer():
+    """
+    The lines of a file on their way through the beautify passes,
+    with the changes recorded rather than made.  It keeps the
+    normalized text of each line, the indent in front of it and the
+    spaces the alignment passes insert, by position.  Each line is
+    built just once, by build(), instead of after every pass.
+    Patterns are matched against the unpadded text, as align_columns
+    already does within a pass, and the indent rules only look past
+    runs of spaces, which is all the padding widens.
+
+    The list of lines given is normalized and later built in place,
+    so that no more than one copy of the text is held at a time.
+    """
+    def __init__(self, lines):
+        normalize_lines(lines)
+        self.bodies = lines
+        self.prefixes = None
+        self.pads = {}
+
+    def align(self, columns, scope_data=None, stats=None):
+        align_columns(self.bodies, columns, ignore_comment_lines=True,
+                      scope_data=scope_data, stats=stats, pads=self.pads,
+                      prefixes=self.prefixes)
+
+    def indent(self, **kwargs):
+        """Runs indent_vhdl, which takes the same keyword arguments."""
+        self.prefixes = []
+        indent_vhdl(self.bodies, prefixes=self.prefixes, **kwargs)
+
+    def build(self):
+        """Builds the finished lines in the list and returns it."""
+        bodies = self.bodies
+        prefixes = self.prefixes
+        pads = self.pads
+        for i in range(len(bodies)):
+            prefix = prefixes[i] if prefixes is not None else ''
+            if i in pads:
+                bodies[i] = padded_line(bodies[i], pads[i], prefix)
+            elif prefix:
+                bodies[i] = prefix + bodies[i]
+        self.prefixes = None
+        self.pads = {}
+        return bodies
+
+
+# ---------------------------------------------------------------
+def beautify_lines(lines, tab_size=4, use_spaces=True, scope_data=None,
+                   state=None, checkpoints=None, first_row=0, stats=None):
+    """
+    Runs the complete beautify pipeline over a list of lines in
+    place.  scope_data is the optional list of column zero scope names
+    per line supplied by the editor.  Without it, alignment blocks are
+    only broken by the patterns themselves.  state, checkpoints and
+    first_row are handed to indent_vhdl for formatting a region.
+    stats may be a Stats object to time the passes in.
+    """
+    if stats is None:
+        stats = NULL_STATS
+    stats.count('lines', len(lines))
+
+    # Left justify, then because there are some really terrible typists
+    # out there I end up having to MAKE SURE that symbols like : := <= and
+    # => have spaces to either side of them, and finally remove extra
+    # blank space and convert tabs to spaces.  All three happen in one
+    # pass over the tokens of each line.
+    with stats.stage('normalize'):
+        buffer = LineBuffer(lines)
+    stats.count('regex_evals', len(lines))
+
+    # Align
+    with stats.stage('align_pre'):
+        buffer.align(PRE_INDENT_COLUMNS, scope_data=scope_data, stats=stats)
+
+    # Indent!
+    with stats.stage('indent'):
+        buffer.indent(tab_size=tab_size, use_spaces=use_spaces, state=state,
+                      checkpoints=checkpoints, first_row=first_row, stats=stats)
+
+    # Post indent alignment
+    # TBD -- There's a hook for more sophisticated handling of comment
+    # lines which would be required for perfect alignment of inline comment
+    # blocks, however it's not working, so leave that parameter as True for
+    # now.
+    with stats.stage('align_post'):
+        buffer.align(POST_INDENT_COLUMNS, scope_data=scope_data, stats=stats)
+
+    # Every pass above only took notes, so this is where the lines
+    # are built.
+    with stats.stage('build'):
+        buffer.build()
+
+
+# ---------------------------------------------------------------
+# A line that starts a design unit or its context clause.  When
+# nothing is open above such a line, it begins an independent piece
+# of formatting work.
+_unit_start_re = re.compile(r'\s*(?:library|entity|architecture|package|configuration|context)\b',
+                            re.IGNORECASE)
+
+# Any of the aligned columns.  Normalizing only adds spaces, so a raw
+# line that does not match cannot join an alignment block.
+_any_column_re = re.compile('|'.join('(?:{})'.format(regexp) for regexp, padside
+                                     in PRE_INDENT_COLUMNS + POST_INDENT_COLUMNS))
+
+# Lines per chunk of a file beautified in parallel.
+SPLIT_CHUNK_LINES = 5000
+
+
+def unit_chunks(lines, chunk_lines=SPLIT_CHUNK_LINES):
+    """
+    Splits the raw lines of a file into (start, end) ranges of about
+    chunk_lines each.  Each range after the first starts at a design
+    unit, below a line that no alignment block can run through.
+    """
+    ranges = []
+    start = 0
+    for i in range(chunk_lines, len(lines)):
+        if (i - start >= chunk_lines and _unit_start_re.match(lines[i]) and
+                not _any_column_re.search(lines[i-1])):
+            ranges.append((start, i))
+            start = i
+    ranges.append((start, len(lines)))
+    return ranges
+
+
+def _beautify_chunk(job):
+    """Worker entry point.  Returns the lines and the final IndentState."""
+    lines, tab_size, use_spaces = job
+    state = IndentState()
+    beautify_lines(lines, tab_size=tab_size, use_spaces=use_spaces, state=state)
+    return (lines, state)
+
+
+def beautify_lines_parallel(lines, map_func, tab_size=4, use_spaces=True,
+                            chunk_lines=SPLIT_CHUNK_LINES, stats=None):
+    """
+    Like beautify_lines, with the file split into chunks at design
+    unit boundaries and the chunks formatted through map_func, e.g.
+    the map of a multiprocessing pool.  Each chunk is indented from
+    the start of a file, which only holds if nothing was left open
+    at the end of the chunk above.  Where something was, the chunk
+    is formatted again here from the real state, so the result is
+    always the same as the serial run.
+    """
+    if stats is None:
+        stats = NULL_STATS
+    ranges = unit_chunks(lines, chunk_lines)
+    stats.count('chunks', len(ranges))
+    with stats.stage('parallel'):
+        results = map_func(_beautify_chunk, [(lines[start:end], tab_size, use_spaces)
+                                             for start, end in ranges])
+    with stats.stage('rerun'):
+        state = IndentState()
+        for (start, end), (chunk, chunk_state) in zip(ranges, results):
+            if not state.at_rest():
+                chunk = lines[start:end]
+                beautify_lines(chunk, tab_size=tab_size, use_spaces=use_spaces, state=state)
+                chunk_state = state
+                stats.count('rerun_chunks')
+            lines[start:end] = chunk
+            state = chunk_state
+
+
+# ---------------------------------------------------------------
+def line_hunks(old_lines, new_lines):
+    """
+    Returns the list of (start, end) line ranges where the two lists of
+    lines differ, merging adjacent changed lines.  Beautifying never
+    adds or removes lines, so when the lengths differ a single range
+    covering everything is returned.
+    """
+    if len(old_lines) != len(new_lines):
+        return [(0, len(old_lines))]
+    hunks = []
+    start = None
+    for i in range(len(old_lines)):
+        if old_lines[i] != new_lines[i]:
+            if start is None:
+                start = i
+        elif start is not None:
+            hunks.append((start, i))
+            start = None
+    if start is not None:
+        hunks.append((start, len(old_lines)))
+    return hunks
+
+
+# ---------------------------------------------------------------
+def beautify_text(text, tab_size=4, use_spaces=True, map_func=None):
+    """
+    Beautifies a block of text with newline line endings and returns
+    the result.  A trailing newline is left alone, matching the
+    behavior of the buffer command.  With a map_func the design units
+    are formatted through it, see beautify_lines_parallel.
+    """
+    trailing = text.endswith('\n')
+    if trailing:
+        text = text[:-1]
+    lines = text.split('\n')
+    if map_func is None:
+        beautify_lines(lines, tab_size=tab_size, use_spaces=use_spaces)
+    else:
+        beautify_lines_parallel(lines, map_func, tab_size=tab_size, use_spaces=use_spaces)
+    text = '\n'.join(lines)
+    if trailing:
+        text = text + '\n'
+    return text
+
+
+# ---------------------------------------------------------------
+def beautify_file_contents(path, tab_size=4, use_spaces=True, map_func=None):
+    """
+    Returns the text of a file on disk and the beautified text, with
+    its line endings preserved.  map_func is passed on to
+    beautify_text.
+    """
+    # surrogateescape lets non-UTF-8 comments pass through untouched.
+    with open(path, encoding='utf-8', errors='surrogateescape', newline='') as f:
+        original = f.read()
+    eol = '\r\n' if '\r\n' in original else '\n'
+    text = beautify_text(original.replace('\r\n', '\n'), tab_size=tab_size,
+                         use_spaces=use_spaces, map_func=map_func)
+    if eol != '\n':
+        text = text.replace('\n', eol)
+    return (original, text)
+
+
+def write_file(path, text):
+    """Writes text read by beautify_file_contents back out."""
+    with open(path, 'w', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        f.write(text)
+
+
+def beautify_file(path, tab_size=4, use_spaces=True, write=True, map_func=None):
+    """
+    Beautifies a file on disk, preserving its line endings.  Returns
+    True if the contents changed.  The file is only rewritten when
+    write is set and something changed.
+    """
+    original, text = beautify_file_contents(path, tab_size=tab_size, use_spaces=use_spaces,
+                                            map_func=map_func)
+    changed = bool(text != original)
+    if changed and write:
+        write_file(path, text)
+    return changed
+
+
+# ---------------------------------------------------------------
+# Streaming.  At most STREAM_LOOKAHEAD lines are held back while an
+# alignment block is open, lines are indented STREAM_BATCH at a
+# time, and files are read STREAM_CHUNK characters at a time.
+STREAM_LOOKAHEAD = 4096
+STREAM_BATCH = 1024
+STREAM_CHUNK = 1 << 20
+
+
+class LineReader():
+    """
+    Iterates over the lines of a text file opened with newline='',
+    without their terminators, reading chunk_size characters at a
+    time so that only a chunk and the line being split are held.
+    Afterwards eol is the terminator of the first line, trailing is
+    True if the last line had one and mixed is True if not every
+    line ended the same way.
+    """
+    def __init__(self, f, chunk_size=STREAM_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.eol = None
+        self.trailing = False
+        self.mixed = False
+
+    def __iter__(self):
+        rest = ''
+        while True:
+            chunk = self.f.read(self.chunk_size)
+            if not chunk:
+                break
+            lines = (rest + chunk).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                eol = '\r\n' if line.endswith('\r') else '\n'
+                if self.eol is None:
+                    self.eol = eol
+                elif eol != self.eol:
+                    self.mixed = True
+                yield line[:-1] if eol == '\r\n' else line
+                self.trailing = True
+        if rest:
+            self.trailing = False
+            yield rest
+        if self.eol is None:
+            self.eol = '\n'
+
+
+def _align_stream(lines, columns, lookahead):
+    """
+    Aligns a stream of lines, holding lines back only while a block
+    may still grow.  No block of any column runs past a banned line
+    or a line with none of the patterns, so the lines up to one of
+    those align the same on their own as in the whole file.  A block
+    longer than lookahead is cut short.
+    """
+    any_column = re.compile('|'.join('(?:{})'.format(regexp) for regexp, padside in columns))
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= lookahead or _ban_re.search(line) or not any_column.search(line):
+            if len(block) > 1:
+                align_columns(block, columns)
+            for done in block:
+                yield done
+            block = []
+    if len(block) > 1:
+        align_columns(block, columns)
+    for done in block:
+        yield done
+
+
+def _indent_stream(lines, tab_size, use_spaces, batch):
+    """Indents a stream of lines, batch lines at a time."""
+    rules = load_rules()
+    state = IndentState()
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= batch:
+            indent_vhdl(chunk, tab_size=tab_size, use_spaces=use_spaces,
+                        rules=rules, state=state)
+            for done in chunk:
+                yield done
+            chunk = []
+    indent_vhdl(chunk, tab_size=tab_size, use_spaces=use_spaces, rules=rules, state=state)
+    for done in chunk:
+        yield done
+
+
+def beautify_stream(lines, tab_size=4, use_spaces=True, lookahead=STREAM_LOOKAHEAD,
+                    batch=STREAM_BATCH):
+    """
+    The beautify pipeline as a chain of generators.  Takes any
+    iterable of lines and yields the beautified lines, holding no more
+    than about two lookaheads and a batch of lines at once.  The
+    result is the same as beautify_lines without scope data, unless
+    an alignment block is longer than lookahead.
+    """
+    lines = (normalize_line(line) for line in lines)
+    lines = _align_stream(lines, PRE_INDENT_COLUMNS, lookahead)
+    lines = _indent_stream(lines, tab_size, use_spaces, batch)
+    return _align_stream(lines, POST_INDENT_COLUMNS, lookahead)
+
+
+def beautify_file_stream(path, tab_size=4, use_spaces=True, write=True,
+                         lookahead=STREAM_LOOKAHEAD):
+    """
+    Like beautify_file but for files too large to hold in memory.
+    The file is read in chunks and the output written out as it is
+    produced to a new temporary file beside it, which takes the mode
+    of the original and replaces it at the end if anything changed,
+    and is removed if anything fails.  Line endings follow the first
+    line.  Returns True if the contents changed.
+    """
+    temp = None
+    changed = False
+    with open(path, encoding='utf-8', errors='surrogateescape', newline='') as f:
+        reader = LineReader(f)
+        # The input lines waiting for their output, for the comparison.
+        pending = collections.deque()
+
+        def source():
+            for line in reader:
+                pending.append(line)
+                yield line
+
+        out = None
+        if write:
+            fd, temp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+            out = open(fd, 'w', encoding='utf-8', errors='surrogateescape', newline='')
+        try:
+            first = True
+            for line in beautify_stream(source(), tab_size=tab_size,
+                                        use_spaces=use_spaces, lookahead=lookahead):
+                if line != pending.popleft():
+                    changed = True
+                if out is not None:
+                    if not first:
+                        out.write(reader.eol)
+                    out.write(line)
+                first = False
+            if out is not None and reader.trailing:
+                out.write(reader.eol)
+        except BaseException:
+            if out is not None:
+                out.close()
+                os.remove(temp)
+            raise
+        if out is not None:
+            out.close()
+    changed = changed or reader.mixed
+    if write:
+        if changed:
+            try:
+                shutil.copymode(path, temp)
+                os.replace(temp, path)
+            except OSError:
+                os.remove(temp)
+                raise
+        else:
+            os.remove(temp)
+    return changed
@@ -0,0 +1,365 @@
+"""
+----------------------------------------------------------------
+ VHDL Mode Command Line Formatter.
+
+ Runs the beautify engine over files and directory trees
+ outside of Sublime Text, for use in CI or pre-commit hooks.
+ Files are distributed across a process pool sized to the
+ number of cores.  In check mode nothing is written; the diffs
+ are printed and the exit status is non-zero if any file would
+ change.  Files already known to be clean are skipped by way of
+ a cache of content hashes.
+
+ Usage: python vhdl_cli.py [options] PATH [PATH ...]
+----------------------------------------------------------------
+"""
+import os
+import sys
+import json
+import time
+import difflib
+import hashlib
+import argparse
+import tempfile
+import collections
+import multiprocessing
+
+if __package__:
+    from . import vhdl_beautify as beautify
+    from . import vhdl_settings
+    from .vhdl_index import collect_files
+else:
+    import vhdl_beautify as beautify
+    import vhdl_settings
+    from vhdl_index import collect_files
+
+# Files larger than this many megabytes are streamed through the
+# beautifier rather than read into memory whole.
+STREAM_ABOVE_MB = 64
+
+# Files larger than this many megabytes are split at design units and
+# the pieces spread over the worker processes.
+SPLIT_ABOVE_MB = 1
+
+# Default file for the hashes of clean files, kept in the user cache
+# folder, the format version of that file, and the number of hashes
+# it keeps.
+CACHE_FILE = 'cli-cache.json'
+CACHE_VERSION = 1
+CACHE_LIMIT = 100000
+
+
+# ---------------------------------------------------------------
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def user_cache_dir():
+    """The folder the platform keeps per user caches in."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'VHDL Mode')
+
+
+def file_hash(path):
+    """Hash of the raw bytes of a file, read a megabyte at a time."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    """Hash of text as beautify_file_contents writes it."""
+    return hashlib.sha1(text.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def unified_diff(old_lines, new_lines, path):
+    """
+    The unified diff of the lines of a file before and after, with the
+    marker diff and patch expect after a line that has no terminator.
+    """
+    out = []
+    for line in difflib.unified_diff(old_lines, new_lines,
+                                     path + ' (original)', path + ' (beautified)'):
+        out.append(line)
+        if not line.endswith('\n'):
+            out.append('\n\\ No newline at end of file\n')
+    return ''.join(out)
+
+
+# ---------------------------------------------------------------
+class ResultCache():
+    """
+    The files known to be clean, kept in a JSON file between runs.
+    Each entry is a hash of the content hash of a file together with
+    config, a hash of the rules, the engine and the settings, so runs
+    with other settings or rules share the file without mixing.  The
+    newest CACHE_LIMIT entries are kept.
+    """
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+        self.clean = []
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self.clean = data['clean']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        self.known = set(self.clean)
+        # Used as an ordered set, a key is kept once however many
+        # files share it.
+        self.found = collections.OrderedDict()
+
+    def key(self, digest):
+        return hashlib.sha1((self.config + digest).encode('ascii')).hexdigest()
+
+    def is_clean(self, digest):
+        return self.key(digest) in self.known
+
+    def add(self, digest):
+        """Records the content hash of a file found clean in this run."""
+        self.found[self.key(digest)] = None
+
+    def save(self):
+        found = self.found
+        clean = list(found) + [d for d in self.clean if d not in found]
+        data = {'version': CACHE_VERSION, 'clean': clean[:CACHE_LIMIT]}
+        try:
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            fd, temp = tempfile.mkstemp(suffix='.tmp', dir=folder)
+            try:
+                with open(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(temp, self.path)
+            except BaseException:
+                os.remove(temp)
+                raise
+        except OSError as e:
+            print('vhdl-mode: Could not save the cache {}: {}'.format(self.path, e),
+                  file=sys.stderr)
+
+
+def cache_config(tab_size, use_spaces):
+    """
+    A hash of everything besides the file that decides the result:
+    the rules, the engine source and the indent settings.
+    """
+    digest = hashlib.sha1()
+    digest.update(beautify.rules_digest().encode('utf-8'))
+    with open(beautify.__file__, 'rb') as f:
+        digest.update(f.read())
+    digest.update('{}:{}'.format(tab_size, use_spaces).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------
+def _format_one(job, map_func=None):
+    """
+    Worker entry point.  Returns the result for the file and the hash
+    of its contents if it is now clean, otherwise None.  The result is
+    a dictionary of the path, whether it changed, the number of lines
+    changed, the time taken, any error message and, in check mode,
+    the unified diff.  map_func is passed on to beautify_file_contents.
+    """
+    path, tab_size, use_spaces, write, stream_above, diff = job
+    result = collections.OrderedDict([
+        ('path', path), ('changed', False), ('changed_lines', 0),
+        ('time_ms', 0.0), ('cached', False), ('error', None)])
+    digest = None
+    started = time.perf_counter()
+    try:
+        if _file_size(path) > stream_above:
+            # Streamed files are not held in memory to count or diff.
+            changed = beautify.beautify_file_stream(path, tab_size=tab_size,
+                                                    use_spaces=use_spaces, write=write)
+            result['changed_lines'] = None
+            if write or not changed:
+                digest = file_hash(path)
+        else:
+            original, text = beautify.beautify_file_contents(
+                path, tab_size=tab_size, use_spaces=use_spaces, map_func=map_func)
+            changed = text != original
+            if changed:
+                old_lines = original.splitlines(True)
+                new_lines = text.splitlines(True)
+                result['changed_lines'] = sum(end - start for start, end
+                                              in beautify.line_hunks(old_lines, new_lines))
+                if diff:
+                    result['diff'] = unified_diff(old_lines, new_lines, path)
+                if write:
+                    beautify.write_file(path, text)
+            if write or not changed:
+                digest = text_hash(text)
+        result['changed'] = changed
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['time_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return (result, digest)
+
+
+# ---------------------------------------------------------------
+def format_files(files, tab_size=4, use_spaces=True, write=True, jobs=None,
+                 stream_above_mb=STREAM_ABOVE_MB, split_above_mb=SPLIT_ABOVE_MB,
+                 diff=False, cache=None):
+    """
+    Formats the list of files, in parallel when there is more than
+    one worker.  Files over split_above_mb megabytes are formatted one
+    at a time with their design units spread over the workers, and
+    files over stream_above_mb megabytes are streamed.  With diff set
+    the results carry unified diffs.  If cache is a ResultCache, files
+    it knows to be clean are skipped and the clean files are added to
+    it.  Returns the results of _format_one in the order of the files.
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    stream_above = int(stream_above_mb * 1024 * 1024)
+    split_above = int(split_above_mb * 1024 * 1024)
+
+    results = [None] * len(files)
+    todo = []
+    for i, path in enumerate(files):
+        if cache is not None:
+            try:
+                digest = file_hash(path)
+            except OSError:
+                digest = None
+            if digest is not None and cache.is_clean(digest):
+                cache.add(digest)
+                results[i] = collections.OrderedDict([
+                    ('path', path), ('changed', False), ('changed_lines', 0),
+                    ('time_ms', 0.0), ('cached', True), ('error', None)])
+                continue
+        todo.append(i)
+
+    work = [(files[i], tab_size, use_spaces, write, stream_above, diff) for i in todo]
+    split = [split_above < _file_size(job[0]) <= stream_above for job in work]
+    if jobs <= 1 or (len(work) <= 1 and not any(split)):
+        done = [_format_one(job) for job in work]
+    else:
+        done = [None] * len(work)
+        pool = multiprocessing.Pool(processes=jobs)
+        try:
+            whole = []
+            for k in range(len(work)):
+                if split[k]:
+                    done[k] = _format_one(work[k], pool.map)
+                else:
+                    whole.append(k)
+            # Chunking keeps the inter-process traffic down on large trees.
+            chunksize = max(1, len(whole) // (jobs * 4))
+            for k, item in zip(whole, pool.map(_format_one, [work[k] for k in whole], chunksize)):
+                done[k] = item
+        finally:
+            pool.close()
+            pool.join()
+
+    for i, (result, digest) in zip(todo, done):
+        results[i] = result
+        if cache is not None and digest is not None:
+            cache.add(digest)
+    return results
+
+
+# ---------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Beautify VHDL files using the VHDL Mode rules.')
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='files or directories to format')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: core count)')
+    parser.add_argument('--settings', metavar='FILE', action='append', default=[],
+                        help='sublime-settings file to take tab_size and translate_tabs_to_spaces '
+                             'from, may be given more than once with later files overriding')
+    parser.add_argument('--tab-size', type=int, default=None,
+                        help='indent width in spaces (default: from the settings, or 4)')
+    parser.add_argument('--use-tabs', action='store_true',
+                        help='indent with tab characters instead of spaces')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='report files that would change without writing them')
+    parser.add_argument('--check', action='store_true',
+                        help='print the diffs of files that would change, write nothing '
+                             'and exit with status 1 if any would')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write a JSON summary of the files, changed lines and times')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='hashes of files known to be clean '
+                             '(default: {} in the user cache folder)'.format(CACHE_FILE))
+    parser.add_argument('--no-cache', action='store_true',
+                        help='format every file, ignoring and not saving the cache')
+    parser.add_argument('--stream-above', type=float, default=STREAM_ABOVE_MB, metavar='MB',
+                        help='stream files larger than this through the beautifier '
+                             'in bounded memory (default: {}, 0 streams all)'.format(STREAM_ABOVE_MB))
+    parser.add_argument('--split-above', type=float, default=SPLIT_ABOVE_MB, metavar='MB',
+                        help='split files larger than this at design units and format the '
+                             'pieces in parallel (default: {})'.format(SPLIT_ABOVE_MB))
+    args = parser.parse_args(argv)
+
+    try:
+        settings = vhdl_settings.load(args.settings)
+    except (OSError, ValueError) as err:
+        parser.error('cannot read settings: {}'.format(err))
+    for problem in settings.problems:
+        print('vhdl-mode: Setting {}, using the default.'.format(problem), file=sys.stderr)
+    if args.tab_size is None:
+        args.tab_size = settings['tab_size']
+    use_spaces = settings['translate_tabs_to_spaces'] and not args.use_tabs
+    write = not (args.dry_run or args.check)
+    cache = None
+    if not args.no_cache:
+        path = args.cache or os.path.join(user_cache_dir(), CACHE_FILE)
+        cache = ResultCache(path, cache_config(args.tab_size, use_spaces))
+
+    started = time.perf_counter()
+    files = collect_files(args.paths)
+    results = format_files(files, tab_size=args.tab_size, use_spaces=use_spaces,
+                           write=write, jobs=args.jobs,
+                           stream_above_mb=args.stream_above,
+                           split_above_mb=args.split_above,
+                           diff=args.check, cache=cache)
+    if cache is not None:
+        cache.save()
+
+    num_changed = 0
+    num_errors = 0
+    for result in results:
+        path = result['path']
+        if result['error']:
+            num_errors += 1
+            print('vhdl-mode: Error: {}: {}'.format(path, result['error']), file=sys.stderr)
+        elif result['changed']:
+            num_changed += 1
+            sys.stdout.write(result.pop('diff', ''))
+            print('vhdl-mode: {}: {}'.format('Reformatted' if write else 'Would reformat', path))
+    num_cached = sum(1 for result in results if result['cached'])
+    print('vhdl-mode: {} file(s) checked, {} changed, {} error(s), {} cached.'.format(
+        len(results), num_changed, num_errors, num_cached))
+
+    if args.report:
+        summary = collections.OrderedDict([
+            ('files', len(results)), ('changed', num_changed), ('errors', num_errors),
+            ('cached', num_cached),
+            ('time_ms', round((time.perf_counter() - started) * 1000, 3))])
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(collections.OrderedDict([('summary', summary), ('files', results)]),
+                      f, indent=4)
+
+    if num_errors or (args.check and num_changed):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
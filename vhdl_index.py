@@ -0,0 +1,604 @@
+"""
+----------------------------------------------------------------
+ VHDL Mode Project Index.
+
+ Keeps the structure of the VHDL files of a project (entity and
+ component interfaces, subprograms and instantiations) so that
+ it may be used without opening the file that declares it.  The
+ parsed records are stored on disk as JSON, keyed by path,
+ modification time and content hash, and the most recently used
+ interfaces are kept in memory as Interface objects.  The
+ definitions of each file (design units, types, objects and
+ subprograms) go to an SQLite database instead, where a name can
+ be looked up without loading the rest.  Indexer brings the index
+ up to date on a pool of worker threads, and collect_files finds
+ the VHDL files under a set of folders for it and the command line
+ formatter.
+----------------------------------------------------------------
+"""
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+import collections
+
+# The Python of some Sublime Text 3 builds was shipped without
+# sqlite3, in which case there is no definitions database.
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+if __package__:
+    from . import vhdl_lang as vhdl
+else:
+    import vhdl_lang as vhdl
+
+VHDL_EXTENSIONS = ('.vhd', '.vhdl')
+
+# Bumped whenever the stored layout changes so that old cache files
+# are discarded rather than misread.
+CACHE_VERSION = 2
+
+# The same for the schema of the definitions database.
+DATABASE_VERSION = 1
+
+
+# ---------------------------------------------------------------
+def content_hash(data):
+    """Hash of the raw bytes of a file."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def cache_name(folders):
+    """A cache file name unique to the set of project folders."""
+    key = '\n'.join(sorted(os.path.abspath(f) for f in folders))
+    return 'index-{}.json'.format(hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+
+def collect_files(paths, extensions=VHDL_EXTENSIONS):
+    """
+    Expands the list of paths into a sorted list of VHDL files.
+    Directories are walked recursively, files are taken as given.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                # Skip hidden directories such as .git
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in names:
+                    if name.lower().endswith(extensions):
+                        files.append(os.path.join(root, name))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+
+def is_vhdl_path(path):
+    return bool(path) and path.lower().endswith(VHDL_EXTENSIONS)
+
+
+# ---------------------------------------------------------------
+def parse_text(text):
+    """
+    Returns the index record fields for the text of one file:
+    interfaces as [row, Interface.to_dict()], subprograms as
+    [row, type, name] and instances as [row, label, unit].
+    """
+    text = text.replace('\r\n', '\n')
+    return {
+        'interfaces': [[row, interface.to_dict()]
+                       for row, interface in vhdl.scan_interfaces(text)],
+        'subprograms': [[row, sub.type.lower(), sub.name]
+                        for row, sub in vhdl.scan_subprograms(text)],
+        'instances': [[row, label, unit]
+                      for row, label, unit in vhdl.scan_instances(text)],
+    }
+
+
+# ---------------------------------------------------------------
+class DefinitionDatabase():
+    """
+    The definitions of every file of a project, as found by
+    vhdl_lang.scan_definitions, in an SQLite database on disk.
+    Names are indexed without regard to case, so a lookup only
+    touches the rows it returns however large the project.
+
+    Each thread gets a connection of its own.  Writes are serialised
+    by a lock and every file is replaced in a single transaction, so
+    a lookup never sees half a file.
+    """
+    SCHEMA = [
+        'CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, '
+        'hash TEXT NOT NULL)',
+        'CREATE TABLE definitions (name TEXT NOT NULL COLLATE NOCASE, kind TEXT NOT NULL, '
+        'file_id INTEGER NOT NULL, row INTEGER NOT NULL, col INTEGER NOT NULL, unit TEXT)',
+        'CREATE INDEX definitions_name ON definitions (name COLLATE NOCASE)',
+        'CREATE INDEX definitions_file ON definitions (file_id)',
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self.lock:
+            conn = self.connection()
+            if conn.execute('PRAGMA user_version').fetchone()[0] != DATABASE_VERSION:
+                with conn:
+                    conn.execute('DROP TABLE IF EXISTS definitions')
+                    conn.execute('DROP TABLE IF EXISTS files')
+                    for statement in self.SCHEMA:
+                        conn.execute(statement)
+                    conn.execute('PRAGMA user_version = {}'.format(DATABASE_VERSION))
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            # Readers then do not wait for the indexer's writes.
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def hashes(self):
+        """Returns the content hash of every file, by path."""
+        return dict(self.connection().execute('SELECT path, hash FROM files'))
+
+    def has(self, path, digest):
+        """True if the definitions of this content of the file are held."""
+        row = self.connection().execute(
+            'SELECT hash FROM files WHERE path = ?', (path,)).fetchone()
+        return row is not None and row[0] == digest
+
+    def update(self, path, digest, definitions):
+        """Replaces the definitions of one file."""
+        with self.lock:
+            conn = self.connection()
+            with conn:
+                row = conn.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+                if row is None:
+                    file_id = conn.execute('INSERT INTO files (path, hash) VALUES (?, ?)',
+                                           (path, digest)).lastrowid
+                else:
+                    file_id = row[0]
+                    conn.execute('UPDATE files SET hash = ? WHERE id = ?', (digest, file_id))
+                    conn.execute('DELETE FROM definitions WHERE file_id = ?', (file_id,))
+                conn.executemany(
+                    'INSERT INTO definitions (name, kind, file_id, row, col, unit) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(name, kind, file_id, row, col, unit)
+                     for row, col, kind, name, unit in definitions])
+
+    def remove(self, path):
+        with self.lock:
+            conn = self.connection()
+            with conn:
+                conn.execute('DELETE FROM definitions WHERE file_id IN '
+                             '(SELECT id FROM files WHERE path = ?)', (path,))
+                conn.execute('DELETE FROM files WHERE path = ?', (path,))
+
+    def lookup(self, name, kind=None):
+        """
+        Returns the definitions of a name, in any case, as a list of
+        (name, kind, path, row, col, unit) tuples.
+        """
+        query = ('SELECT d.name, d.kind, f.path, d.row, d.col, d.unit '
+                 'FROM definitions d JOIN files f ON f.id = d.file_id WHERE d.name = ?')
+        args = [name]
+        if kind:
+            query += ' AND d.kind = ?'
+            args.append(kind)
+        query += ' ORDER BY f.path, d.row'
+        return self.connection().execute(query, args).fetchall()
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def open_database(path):
+    """
+    Returns the DefinitionDatabase at path, or None if sqlite3 is
+    missing or the file cannot be opened.
+    """
+    if sqlite3 is None:
+        return None
+    try:
+        return DefinitionDatabase(path)
+    except (sqlite3.Error, OSError) as e:
+        print('vhdl-mode: Could not open the definitions database: {}'.format(e))
+        return None
+
+
+# ---------------------------------------------------------------
+class ProjectIndex():
+    """
+    The structure of every VHDL file below a set of folders.
+
+    files maps each path to a record of its mtime, size, content
+    hash and the fields from parse_text.  A file whose mtime and size
+    are unchanged is trusted without reading it.  Otherwise it is
+    read and hashed, and only parsed again if the hash changed.
+    Interface objects are built from the stored data on demand and
+    the last max_objects of them are kept.  If a DefinitionDatabase
+    is given, a file is also parsed again when the database does not
+    hold the definitions of its current content.
+
+    The methods may be called from several threads; the lock is held
+    only while records are read or replaced, never while parsing.
+    """
+    def __init__(self, folders, path=None, max_objects=256, db=None):
+        self.folders = list(folders)
+        self.path = path
+        self.db = db
+        self.max_objects = max_objects
+        self.files = {}
+        self.objects = collections.OrderedDict()
+        self.dirty = False
+        self.lock = threading.RLock()
+        self.save_lock = threading.Lock()
+        if path:
+            self.load()
+
+    def load(self):
+        """Reads the cache file, discarding it if unreadable or stale."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') == CACHE_VERSION:
+            with self.lock:
+                self.files = data.get('files', {})
+
+    def save(self):
+        """Writes the cache file if anything changed."""
+        with self.save_lock:
+            with self.lock:
+                if not self.path or not self.dirty:
+                    return
+                text = json.dumps({'version': CACHE_VERSION, 'files': self.files})
+                self.dirty = False
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            # Write alongside and then swap in so that a reader never
+            # sees a partial file.
+            temp = self.path + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp, self.path)
+
+    # -----------------------------------------------------------
+    def is_stale(self, path):
+        """True if the stat of the file no longer matches its record."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path in self.files
+        record = self.files.get(path)
+        return not (record and record['mtime'] == st.st_mtime and
+                    record['size'] == st.st_size)
+
+    def update_file(self, path, text=None):
+        """
+        Brings the record for one file up to date.  text may be given
+        for a file open in the editor, in which case it is used in
+        place of the file on disk.  Returns True if the file was
+        parsed again.
+        """
+        record = self.files.get(path)
+        if text is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.remove_file(path)
+                return False
+            if record and record['mtime'] == st.st_mtime and record['size'] == st.st_size \
+                    and self._has_definitions(path, record['hash']):
+                return False
+            with open(path, 'rb') as f:
+                data = f.read()
+            mtime, size = st.st_mtime, st.st_size
+        else:
+            data = text.encode('utf-8', 'surrogateescape')
+            mtime, size = None, len(data)
+        digest = content_hash(data)
+
+        if record and record['hash'] == digest and self._has_definitions(path, digest):
+            with self.lock:
+                record['mtime'], record['size'] = mtime, size
+                self.dirty = True
+            return False
+        if text is None:
+            text = data.decode('utf-8', 'surrogateescape')
+        text = text.replace('\r\n', '\n')
+        record = parse_text(text)
+        record.update({'mtime': mtime, 'size': size, 'hash': digest})
+        if self.db is not None:
+            self.db.update(path, digest, vhdl.scan_definitions(text))
+        with self.lock:
+            self.files[path] = record
+            self._forget(path)
+            self.dirty = True
+        return True
+
+    def remove_file(self, path):
+        with self.lock:
+            if path in self.files:
+                del self.files[path]
+                self._forget(path)
+                self.dirty = True
+        if self.db is not None:
+            self.db.remove(path)
+
+    def stale_files(self):
+        """
+        Scans the folders, dropping the records of files that no
+        longer exist, and returns the paths that need updating.
+        """
+        paths = collect_files(self.folders)
+        known = self.db.hashes() if self.db is not None else None
+        with self.lock:
+            for path in set(self.files) - set(paths):
+                self.remove_file(path)
+        if known is not None:
+            for path in set(known) - set(paths):
+                self.db.remove(path)
+        stale = []
+        for path in paths:
+            if self.is_stale(path):
+                stale.append(path)
+            elif known is not None and known.get(path) != self.files[path]['hash']:
+                stale.append(path)
+        return stale
+
+    def refresh(self):
+        """
+        Brings every file up to date on the calling thread.  Returns
+        the number of files parsed.
+        """
+        parsed = 0
+        for path in self.stale_files():
+            if self.update_file(path):
+                parsed += 1
+        return parsed
+
+    # -----------------------------------------------------------
+    def entries(self):
+        """
+        Returns a sorted list of (name, type, path, row) for every
+        entity, and every component with no matching entity, such as
+        vendor primitives.
+        """
+        entities = set()
+        found = []
+        with self.lock:
+            for path, record in self.files.items():
+                for row, data in record['interfaces']:
+                    found.append((data['name'], data['type'].lower(), path, row))
+                    if data['type'].lower() == 'entity':
+                        entities.add(data['name'].lower())
+        found = [e for e in found
+                 if e[1] == 'entity' or e[0].lower() not in entities]
+        found.sort(key=lambda e: (e[0].lower(), e[2]))
+        return found
+
+    def get(self, path, name):
+        """Returns the Interface object for the named declaration."""
+        key = (path, name)
+        with self.lock:
+            interface = self.objects.get(key)
+            if interface is not None:
+                self.objects.move_to_end(key)
+                return interface
+            record = self.files.get(path)
+            if record is None:
+                return None
+            for row, data in record['interfaces']:
+                if data['name'] == name:
+                    interface = vhdl.Interface.from_dict(data)
+                    self.objects[key] = interface
+                    if len(self.objects) > self.max_objects:
+                        self.objects.popitem(last=False)
+                    return interface
+        return None
+
+    def lookup(self, name, kind=None):
+        """
+        Returns the definitions of a name from the database, or an
+        empty list if there is none.
+        """
+        if self.db is None:
+            return []
+        return self.db.lookup(name, kind)
+
+    def _has_definitions(self, path, digest):
+        return self.db is None or self.db.has(path, digest)
+
+    def _forget(self, path):
+        for key in [k for k in self.objects if k[0] == path]:
+            del self.objects[key]
+
+
+# ---------------------------------------------------------------
+class Indexer():
+    """
+    Keeps a ProjectIndex up to date on background threads.
+
+    scan() walks the folders on a thread of its own and queues every
+    file whose stat changed.  submit() queues a single file, e.g.
+    after it was saved, and never blocks: the queue is bounded and a
+    file that does not fit is held in a set which the workers take
+    from once the queue runs dry.  cancel() drops the queued work and
+    stops the running scan; nothing is queued again until the next
+    scan() is asked for.
+
+    on_progress(done, total) is called from the worker threads after
+    each file, and on_idle() once all queued work is finished, after
+    the index was saved.
+    """
+    def __init__(self, index, workers=2, queue_size=256,
+                 on_progress=None, on_idle=None):
+        self.index = index
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflow = set()
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.stopped = threading.Event()
+        self.on_progress = on_progress
+        self.on_idle = on_idle
+        self.done = 0
+        self.total = 0
+        self.active = 0
+        self.scanning = False
+        self.threads = []
+        for n in range(max(1, workers)):
+            thread = threading.Thread(target=self._work, name='vhdl-index-{}'.format(n))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    @property
+    def busy(self):
+        with self.lock:
+            return self.scanning or self.active > 0 or self.total > self.done
+
+    # -----------------------------------------------------------
+    def scan(self):
+        """Starts a full scan unless one is already running."""
+        with self.lock:
+            if self.scanning:
+                return
+            self.scanning = True
+        self.cancelled.clear()
+        thread = threading.Thread(target=self._scan, name='vhdl-index-scan')
+        thread.daemon = True
+        thread.start()
+
+    def _scan(self):
+        try:
+            for path in self.index.stale_files():
+                if self.cancelled.is_set() or self.stopped.is_set():
+                    break
+                self._count()
+                # Blocking here is fine, this is not the editor thread.
+                while not (self.cancelled.is_set() or self.stopped.is_set()):
+                    try:
+                        self.queue.put((path, None), timeout=0.2)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            with self.lock:
+                self.scanning = False
+            self._check_idle()
+
+    def submit(self, path, text=None):
+        """
+        Queues one file without blocking the caller.  Ignored after
+        cancel() until the next scan().
+        """
+        if self.cancelled.is_set():
+            return
+        self._count()
+        try:
+            self.queue.put_nowait((path, text))
+        except queue.Full:
+            with self.lock:
+                self.overflow.add(path)
+
+    def cancel(self):
+        """Drops the queued work and stops the scan."""
+        self.cancelled.set()
+        with self.lock:
+            self.overflow.clear()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        with self.lock:
+            self.done = self.total = 0
+
+    def stop(self):
+        """Cancels everything and ends the worker threads."""
+        self.stopped.set()
+        self.cancel()
+        # Wake the idle workers.  A busy one sees the stopped flag
+        # when it comes back for more.
+        for thread in self.threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    # -----------------------------------------------------------
+    def _count(self):
+        with self.lock:
+            self.total += 1
+
+    def _next(self):
+        """
+        Returns the next job, from the queue or else the overflow,
+        and otherwise waits for one.  None is the signal to stop.
+        """
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.overflow:
+                return (self.overflow.pop(), None)
+        # Files only overflow while the queue is full, so waiting on
+        # the queue alone is enough.
+        return self.queue.get()
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None or self.stopped.is_set():
+                break
+            if self.cancelled.is_set():
+                continue
+            with self.lock:
+                self.active += 1
+            path, text = job
+            try:
+                self.index.update_file(path, text)
+            except Exception as e:
+                print('vhdl-mode: Could not index {}: {}'.format(path, e))
+            finally:
+                with self.lock:
+                    self.active -= 1
+                    self.done += 1
+                    done, total = self.done, self.total
+            if self.on_progress:
+                self.on_progress(done, total)
+            self._check_idle()
+            # Let the editor's own plugin callbacks have the interpreter
+            # between files.
+            time.sleep(0)
+
+    def _check_idle(self):
+        with self.lock:
+            idle = (not self.scanning and self.active == 0 and
+                    self.queue.empty() and not self.overflow)
+            if idle:
+                self.done = self.total = 0
+        if idle and not self.cancelled.is_set():
+            try:
+                self.index.save()
+            except (IOError, OSError) as e:
+                print('vhdl-mode: Could not save the project index: {}'.format(e))
+            if self.on_idle:
+                self.on_idle()
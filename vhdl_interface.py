@@ -9,6 +9,8 @@ import sublime_plugin
 
 from . import vhdl_lang as vhdl
 from . import vhdl_util as util
+from . import vhdl_stats
+from . import vhdl_project
 
 _interface = vhdl.Interface()
 
@@ -17,44 +19,38 @@ class vhdlModeCopyPortsCommand(sublime_plugin.TextCommand):
     """
     The copy ports command requires the user to have placed the
     point somewhere in the interface to be extracted.  The
-    routine then scans upwards to find a known interface beginning
+    routine then searches upwards to find a known interface beginning
     and then down to find the end point.  If a good interface
     can be determined, then it uses the VHDL language classes to
     parse the text from the editor and store the structural
-    elements for later pasting in other forms.
-    """
-    def find_start(self, point, interface):
-        # Abstracting the loop for finding the beginning
-        # of the declaration.
-        # Moving point to beginning of line which avoids
-        # checking a line twice due to line lengths.
-        next_point = util.move_to_bol(self, point)
-        while True:
-            check = interface.interface_start(util.line_at_point(self, next_point))
-            if check is None:
-                if util.is_top_line(self, next_point):
-                    print('vhdl-mode: Interface not found.')
-                    return None
-                else:
-                    next_point = util.move_up(self, next_point)
-            else:
-                print('vhdl-mode: Interface beginning found.')
-                return self.view.text_point(self.view.rowcol(next_point)[0], check)
-
-    def find_end(self, point, interface):
-        # Stepping forward to find the end of the interface.
-        next_point = util.move_to_bol(self, point)
-        while True:
-            check = interface.interface_end(util.line_at_point(self, next_point))
-            if check is None:
-                if util.is_end_line(self, next_point):
-                    print('vhdl-mode: End of interface not found.')
-                    return None
-                else:
-                    next_point = util.move_down(self, next_point)
-            else:
-                print('vhdl-mode: Interface end found.')
-                return self.view.text_point(self.view.rowcol(next_point)[0], check)
+    elements for later pasting in other forms.  The beginning comes
+    from the structural outline of the buffer, and only the text
+    from there to the next structure is searched for the end.
+    """
+    def find_start(self, point, interface, outline):
+        # The closest entity or component above the point.
+        entry = outline.last_before('interface', self.view.rowcol(point)[0])
+        if entry is None:
+            print('vhdl-mode: Interface not found.')
+            return None
+        row, column = entry[0], entry[1]
+        interface.interface_start(util.line_at_point(self, self.view.text_point(row, 0)))
+        print('vhdl-mode: Interface beginning found.')
+        return self.view.text_point(row, column)
+
+    def find_end(self, point, interface, outline):
+        # Stepping forward from the beginning to find the end, in the
+        # rest of the buffer if it is not before the next structure.
+        begin, text = util.read_declaration(self, self.view.rowcol(point)[0], outline)
+        end = util.search_lines_down(self, point - begin, interface.interface_end, text)
+        if end is None and begin + len(text) < self.view.size():
+            text = self.view.substr(sublime.Region(begin, self.view.size()))
+            end = util.search_lines_down(self, point - begin, interface.interface_end, text)
+        if end is None:
+            print('vhdl-mode: End of interface not found.')
+            return None
+        print('vhdl-mode: Interface end found.')
+        return begin + end
 
     def run(self, edit):
         global _interface
@@ -65,17 +61,24 @@ class vhdlModeCopyPortsCommand(sublime_plugin.TextCommand):
         # selection.
         region = self.view.sel()[0]
         original_point = region.begin()
+        stats = vhdl_stats.Stats('copy_ports')
+        with stats.stage('outline'):
+            outline = util.get_outline(self)
 
         # Search for the starting entity string.
-        startpoint = self.find_start(original_point, _interface)
+        with stats.stage('find_start'):
+            startpoint = self.find_start(original_point, _interface, outline)
         if startpoint is None:
             util.set_cursor(self, original_point)
+            util.record_stats(self, stats)
             return
 
         # Search for the endpoint based on the start point.
-        endpoint = self.find_end(startpoint, _interface)
+        with stats.stage('find_end'):
+            endpoint = self.find_end(startpoint, _interface, outline)
         if endpoint is None:
             util.set_cursor(self, original_point)
+            util.record_stats(self, stats)
             return
 
         # At this point, we should have a start and end point.  Extract
@@ -83,12 +86,17 @@ class vhdlModeCopyPortsCommand(sublime_plugin.TextCommand):
         # with the points.  At this point, all the processing should be
         # in the interface class.
         block = sublime.Region(startpoint, endpoint)
-        _interface.if_string = self.view.substr(block)
-        _interface.parse_block()
+        with stats.stage('parse'):
+            _interface.if_string = self.view.substr(block)
+            _interface.parse_block()
+        stats.count('lines', _interface.if_string.count('\n') + 1)
+        stats.count('ports', len(_interface.if_ports))
+        stats.count('generics', len(_interface.if_generics))
 
         # At the very end, move the point back to where we
         # started
         util.set_cursor(self, original_point)
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsSignalCommand(sublime_plugin.TextCommand):
@@ -107,15 +115,20 @@ class vhdlModePasteAsSignalCommand(sublime_plugin.TextCommand):
 
         lines = []
         # Construct structure and insert
-        block_str = _interface.signals()
+        stats = vhdl_stats.Stats('paste_as_signal')
+        with stats.stage('build'):
+            block_str = _interface.signals()
         if block_str is not None:
-            num_chars = self.view.insert(edit, next_point, block_str)
+            with stats.stage('insert'):
+                num_chars = self.view.insert(edit, next_point, block_str)
+            stats.count('lines', block_str.count('\n') + 1)
             print('vhdl-mode: Inserted interface as signal(s).')
             util.set_cursor(self, next_point+num_chars)
         else:
             print('vhdl-mode: No valid ports in interface for signal(s).')
             # Set the point to original location
             util.set_cursor(self, original_point)
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsComponentCommand(sublime_plugin.TextCommand):
@@ -130,12 +143,17 @@ class vhdlModePasteAsComponentCommand(sublime_plugin.TextCommand):
         # Move to the beginning of the line the point is on.
         next_point = util.move_to_bol(self, original_point)
 
-        block_str = _interface.component()
-        num_chars = self.view.insert(edit, next_point, block_str)
+        stats = vhdl_stats.Stats('paste_as_component')
+        with stats.stage('build'):
+            block_str = _interface.component()
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
         print('vhdl-mode: Inserted interface as component.')
 
         # Set point to the end of insertion.
         util.set_cursor(self, next_point+num_chars)
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsEntityCommand(sublime_plugin.TextCommand):
@@ -150,12 +168,17 @@ class vhdlModePasteAsEntityCommand(sublime_plugin.TextCommand):
         # Move to the beginning of the line the point is on.
         next_point = util.move_to_bol(self, original_point)
 
-        block_str = _interface.entity()
-        num_chars = self.view.insert(edit, next_point, block_str)
+        stats = vhdl_stats.Stats('paste_as_entity')
+        with stats.stage('build'):
+            block_str = _interface.entity()
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
         print('vhdl-mode: Inserted interface as entity.')
 
         # Set the point to end of insertion
         util.set_cursor(self, next_point+num_chars)
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsInstanceCommand(sublime_plugin.TextCommand):
@@ -173,10 +196,15 @@ class vhdlModePasteAsInstanceCommand(sublime_plugin.TextCommand):
         next_point = util.move_to_bol(self, original_point)
 
         # Construct structure.  Get the file structure.
-        instances = util.scan_instantiations(self)
-        block_str = _interface.instance(instances=instances)
-        num_chars = self.view.insert(edit, next_point, block_str)
+        stats = vhdl_stats.Stats('paste_as_instance')
+        with stats.stage('build'):
+            instances = util.scan_instantiations(self)
+            block_str = _interface.instance(instances=instances)
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
         print('vhdl-mode: Inserted interface as instance.')
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsTestbenchCommand(sublime_plugin.WindowCommand):
@@ -236,3 +264,74 @@ class vhdlModeReversePortsCommand(sublime_plugin.TextCommand):
         global _interface
         _interface.reverse()
         print('vhdl-mode: Reversing ports for next paste.')
+
+#----------------------------------------------------------------
+class vhdlModePasteInterfaceOfCommand(sublime_plugin.TextCommand):
+    """
+    Offers every entity declared in the project folders in a quick
+    panel and pastes the chosen one as an instance, component or
+    signals, without the declaring file being opened.  form selects
+    the variation.
+    """
+    def run(self, edit, form='instance'):
+        window = self.view.window()
+        project = vhdl_project.get_project(window)
+        if project is None:
+            print('vhdl-mode: No project folders to search for interfaces.')
+            return
+
+        # The list comes from the index as it stands, the background
+        # indexer may still be filling it in.
+        entries = project.index.entries()
+        if project.indexer.busy:
+            sublime.status_message('VHDL Mode: Still indexing, the list may be incomplete.')
+        if not entries:
+            print('vhdl-mode: No interfaces found in the project folders.')
+            return
+
+        items = []
+        for name, kind, path, row in entries:
+            items.append([name, '{} in {}:{}'.format(kind, project.relative(path), row+1)])
+
+        def on_done(index):
+            if index < 0:
+                return
+            name, kind, path, row = entries[index]
+            self.view.run_command('vhdl_mode_insert_interface',
+                                  {'path': path, 'name': name, 'form': form})
+
+        window.show_quick_panel(items, on_done)
+
+#----------------------------------------------------------------
+class vhdlModeInsertInterfaceCommand(sublime_plugin.TextCommand):
+    """
+    Inserts an interface from the project cache at the line of the
+    point.  Used by the Paste ... of quick panel.
+    """
+    def run(self, edit, path, name, form='instance'):
+        project = vhdl_project.get_project(self.view.window())
+        interface = project.index.get(path, name) if project else None
+        if interface is None:
+            print('vhdl-mode: Interface {} is no longer in the index.'.format(name))
+            return
+
+        region = self.view.sel()[0]
+        next_point = util.move_to_bol(self, region.begin())
+        stats = vhdl_stats.Stats('insert_interface')
+        with stats.stage('build'):
+            if form == 'component':
+                block_str = interface.component()
+            elif form == 'signals':
+                block_str = interface.signals()
+            else:
+                instances = util.scan_instantiations(self)
+                block_str = interface.instance(instances=instances)
+        if block_str is None:
+            print('vhdl-mode: No valid ports in interface for signal(s).')
+            return
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
+        print('vhdl-mode: Inserted {} as {}.'.format(name, form))
+        util.set_cursor(self, next_point+num_chars)
+        util.record_stats(self, stats)
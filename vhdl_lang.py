@@ -8,477 +8,18 @@
 ----------------------------------------------------------------
 """
 import re
-import collections
 import copy
-import sublime
-import ruamel.yaml
+import bisect
 
-_debug = False
-
-
-# ---------------------------------------------------------------------------
-def debug(string):
-    """
-    Some of these functions ended up with a lot of debug output for analyzing
-    processing.  I needed a way to turn it on and off.
-    """
-    if _debug:
-        print(string)
-
-
-# ---------------------------------------------------------------------------
-def left_justify(lines):
-    """
-    Method removes all whitespace at the beginning of a line.
-    """
-    for i in range(len(lines)):
-        lines[i] = re.sub(r"^\s*", '', lines[i])
-
-
-# ---------------------------------------------------------------
-def check_for_comment(line):
-    """
-    Simple method that will return False if a line does not
-    begin with a comment, otherwise True.  Mainly used for
-    disabling alignment.
-    """
-    pattern = r'^\s*--'
-    p = re.compile(pattern, re.IGNORECASE)
-    s = re.search(p, line)
-    return bool(s)
-
-
-# ---------------------------------------------------------------
-def strip_comments(line):
-    """
-    Removes any inline comment from the line, accounting for
-    comment symbols inside of a text string.  Does not account
-    for multiline commenting.
-    """
-    str_p = r'".*?"'
-    comment_p = r'--.*$'
-    # First check for an inline string.  Will only handle one.
-    str_s = re.search(str_p, line)
-    # If a string exists, then we break up into searching the
-    # beginning and end separately.  Otherwise, just a basic
-    # whole line search is fine.
-    if str_s:
-        comment_s = re.search(comment_p, line[:str_s.start()])
-        if comment_s:
-            return line[:comment_s.start()]
-        else:
-            comment_s = re.search(comment_p, line[str_s.end():])
-            if comment_s:
-                return line[:str_s.end()+comment_s.start()]
-            else:
-                return line
-    else:
-        comment_s = re.search(comment_p, line)
-        if comment_s:
-            return line[:comment_s.start()]
-        else:
-            return line
-
-# ---------------------------------------------------------------------------
-def pad_vhdl_symbols(lines):
-    """
-    Ensuring that special symbols that later we'll align on have a minimum
-    leading and trailing space.  Aids correct alignment.  Leaving it at
-    assignment and languaage delimeters for now.
-    """
-    for i in range(len(lines)):
-        if not check_for_comment(lines[i]):
-            lines[i] = re.sub(':(?!=)', ' : ',  lines[i])
-            lines[i] = re.sub(':=',     ' := ', lines[i])
-            lines[i] = re.sub('<=',     ' <= ', lines[i])
-            lines[i] = re.sub('=>',     ' => ', lines[i])
-
-
-# ---------------------------------------------------------------------------
-def remove_extra_space(lines):
-    """
-    Method that takes out extra whitespace in a line.  Avoids
-    full line comments and attempts to avoid in-line comments.
-    """
-    for i in range(len(lines)):
-        if not check_for_comment(lines[i]):
-            # Check and save off inline comments.
-            cs = re.search(r'--.*$', lines[i])
-            if cs:
-                comment = lines[i][cs.start():]
-                code = lines[i][0:cs.start()]
-            else:
-                comment = ''
-                code = lines[i]
-            # Compress space in code portion of the line.
-            code = re.sub(r'\s+', ' ', code)
-            code = re.sub(r'\t', ' ', code)
-            lines[i] = code + comment
-
-
-# ---------------------------------------------------------------
-class Parentheses():
-    '''
-    An object whose purpose is to keep track of parenthesis counts
-    and provide helper functions while traversing a text file.
-
-    May be initialized with a two element list indicating the starting
-    counts if needed.
-
-    open_cnt and close_cnt represent the current number of unmatched
-    open and closing parentheses.
-
-    open_pos and close_pos represent the character position of the UNMATCHED
-    open and closing parentheses in the last scanned string.
-    '''
-    def __init__(self, counts=[0, 0]):
-        self.open_cnt = counts[0]
-        self.close_cnt = counts[1]
-        self.open_pos = []
-        self.close_pos = []
-
-    @property
-    def delta(self):
-        return self.open_cnt - self.close_cnt
-
-    @property
-    def balanced(self):
-        return bool(self.open_cnt == self.close_cnt)
-
-    def reset(self):
-        self.__init__()
-
-    def scan(self, line):
-        # Reset the position lists.
-        self.open_pos = []
-        self.close_pos = []
-        for i in range(len(line)):
-            if line[i] == '(':
-                # If we find a ( then increment the count and append the
-                # position.
-                self.open_cnt += 1
-                self.open_pos.append(i)
-            elif line[i] == ')':
-                # If we find a ) there are several options.
-                # If open_pos has members, pop off the mate.  Also decrement
-                # the count.
-                # If open_cnt > 0 then decrement the count of the prior
-                # unmatched open.
-                # If open_cnt = 0 then increment the closing count and
-                # append the position.
-                if self.open_pos:
-                    self.open_cnt -= 1
-                    self.open_pos.pop()
-                elif self.open_cnt > 0:
-                    self.open_cnt -= 1
-                else:
-                    self.close_pos.append(i)
-                    self.close_cnt += 1
-
-    def stats(self):
-        return '#(={}, #)={}, OPos={}, CPos={}'.format(self.open_cnt,
-            self.close_cnt, self.open_pos, self.close_pos)
-
-    def extract(self, line):
-        '''Given a string, extracts the contents of the next parenthetical
-        grouping (including interior parenthetical groups.)'''
-        start = 0
-        end = 0
-        pcount = 0
-        for i in range(len(line)):
-            if line[i] == '(' and pcount == 0:
-                pcount += 1
-                start = i + 1
-            elif line[i] == '(':
-                pcount += 1
-
-            if line[i] == ')' and pcount > 1:
-                pcount -= 1
-            elif line[i] == ')' and pcount == 1:
-                end = i - 1
-                pcount -= 1
-                break
-        if start >= end:
-            return None
-        else:
-            return line[start:end]
-
-# ---------------------------------------------------------------
-def align_block_on_re(lines, regexp, padside='pre', ignore_comment_lines=True, scope_data=None):
-    """
-    Receives a list of individual lines.  Scans each line looking
-    for the provided lexical pattern that should align on
-    adjoining lines. Once a pattern is found, record the line index
-    and pattern location.  For each subsequent line that also
-    identifies the pattern, add the line index and pattern location.
-    When a line is identified that does not have the pattern, find
-    the line in the list with the most leftmost symbol, and then
-    iterate through the list of affected lines and pad on the side
-    declared (anything that is not 'post' is prepend because that's
-    most common.)
-
-    Alignment should happen when the strings are left justified
-    so that it doesn't need to know about the spacing.
-
-    This is intended to be run in several passes on several patterns
-    which is why it takes the regexp as a parameter.
-
-    Added some blacklist words, otherwise you can get some matching
-    between conditionals and assignments and other nonsense.
-
-    TODO: Add scope checking for alignment instead of ban list
-    when provided.
-    """
-    ban_raw = [
-        r':\s+process\b',
-        r'\bif\b',
-        r'\bthen\b',
-        r'\bwhen\b(?=.*?=>)'
-    ]
-    ban_list = []
-    for pattern in ban_raw:
-        ban_list.append(re.compile(pattern, re.IGNORECASE))
-
-    prior_scope = ""
-    match_data = []
-    for i in range(len(lines)):
-
-        # Check for banned lines we don't even want to think about.
-        banned = False
-        for pattern in ban_list:
-            ban_search = re.search(pattern, lines[i])
-            if ban_search:
-                banned = True
-                break
-
-        # Adding a hook here for better comment handling.  Check to see if this
-        # is a commented line and if we should pay attention to it.
-        # ignore_comment_lines is True by default and until this routine is
-        # more sophisticated should probably remain true.
-        comment_check = False
-        if ignore_comment_lines:
-            comment_check = check_for_comment(lines[i])
-
-        # Scan for the aligning pattern
-        s = re.search(regexp, lines[i])
-
-        # First decide if based on lack of pattern, scope change, or
-        # a banned line or end of file whether we should process any
-        # currently existing match list.
-        scope_switch = False
-        if scope_data is not None:
-            if scope_data[i] != prior_scope:
-                scope_switch = True
-            else:
-                scope_switch = False
-
-        # A special check for the last line to add to the group, otherwise
-        # we process before we can evaluate that line.
-        if s and (i == len(lines)-1) and not comment_check and not banned:
-            if padside == 'post':
-                match_data.append((i, s.end()))
-            else:
-                match_data.append((i, s.start()))
-
-        # This is where the actual lines are adjusted.  If this line breaks the
-        # sequence of lines that had the pattern, or if it's the last line, or
-        # if it was a line that was skipped due to banning, or if the whole
-        # line scope changed (e.g. comment line broke the block) then process
-        # the block for alignment.
-        if not s or scope_switch or (i == len(lines)-1) or banned:
-            if len(match_data) > 1:
-                # Scan for max value and check to see if extra space needed
-                # due to lack of preceding space.
-                maxpos = 0
-                for pair in match_data:
-                    if pair[1] > maxpos:
-                        maxpos = pair[1]
-                        if lines[pair[0]][pair[1]-1] != ' ':
-                            maxpos = maxpos + 1
-                # Now insert spaces on each line (max-current+1)
-                # to make up the space.
-                for pair in match_data:
-                    lines[pair[0]] = lines[pair[0]][0:pair[1]] + \
-                                     ' '*(maxpos-pair[1]) + \
-                                     lines[pair[0]][pair[1]:]
-            # No match for more than one line so erase match
-            # data
-            match_data = []
-
-        # Finally, if this line has an alignment symbol in it (and not banned)
-        # start adding data again.
-        if s and not comment_check and not banned:
-            # If we find a match, record the line and
-            # location but do nothing else.
-            #print("Match on Line: {} Start:'{}' Stop:'{}'".\
-            #       format(line_num, lines[line_num][0:s.start()],\
-            #              lines[line_num][s.start():]))
-            if padside == 'post':
-                match_data.append((i, s.end()))
-            else:
-                match_data.append((i, s.start()))
-
-        # Make sure we save the current scope off before looping
-        if scope_data is not None:
-            prior_scope = scope_data[i]
-
-
-# ---------------------------------------------------------------
-def indent_vhdl(lines, initial=0, tab_size=4, use_spaces=True):
-    """
-    This method takes a list of lines of source code, that have
-    been left justified, and attempts impose indentation rules
-    upon it for beautification.
-    """
-    # 4th iteration of the ruleset.  Frankly I was getting tired of
-    # scrolling past it every time I worked on this file.  I abstracted the
-    # structures out into a YAML formatted file.  All the rules are there.
-    yaml = ruamel.yaml.YAML()
-    yaml.version = (1, 2)
-
-    rules_str = sublime.load_resource('Packages/VHDL Mode/Syntax/beautify_rules.yaml')
-    rules_blob = yaml.load(rules_str)
-
-    key_list = rules_blob['key_list']
-    open_rules = rules_blob['open_rules']
-    close_rules = rules_blob['close_rules']
-
-    # Initialize the indent indexes.
-    # closing_stack is using deque() and each element is:
-    # 0. The key name matched.
-    # 1. The current indent level.
-    # Since it's a stack, we're always referencing element 0 (top).
-    current_indent = next_indent = initial
-    parens = Parentheses()
-    closing_stack = collections.deque()
-    unbalance_flag = False
-    # Set the indent to tabs or spaces here
-    if use_spaces:
-        indent_char = ' '*tab_size
-    else:
-        indent_char = '\t'
-
-    # Scan the lines.
-    for i in range(len(lines)):
-        # Strip any comment from the line before analysis.
-        line = strip_comments(lines[i])
-        debug('{}: ci={} ni={} : {}'.format(i, current_indent, next_indent, lines[i]))
-
-        ############################################################
-        # Modification Rules
-        # Priority 1: Keywords
-        for key in key_list:
-            rule = open_rules[key]
-            key_search = re.search(rule['pattern'], line, re.IGNORECASE)
-            if key_search:
-                debug('{}: Evaluation line: {}'.format(i, line))
-                debug('{}: Evaluation pattern: {}'.format(i, rule['pattern']))
-                debug('{}: Type: {}'.format(i, key))
-                # If an ending type is noted, push the key onto the
-                # stack.  Save the current indent, and the current parenthetical
-                # state as well.
-                if rule['close_rule'] is not None:
-                    closing_stack.appendleft([key, current_indent, copy.copy(parens)])
-                # Apply the current and next indent values to
-                # the current values.
-                current_indent += rule['indent_rule'][0]
-                next_indent += rule['indent_rule'][1]
-                break
-
-        # Priority 2: Unbalanced Parenthesis
-        # Unbalanced parenthesis rules.  The line where an unbalanced paren
-        # begins is not modified, however for every line after that while we are
-        # unbalanced, indent one additional level to the current line (but not the
-        # next because we don't want to keep incrementing outwards.)  When balance
-        # is restored, reset the flag.
-        parens.scan(line)
-        debug('{}: {}'.format(i, parens.stats()))
-        if unbalance_flag:
-            debug('{}: Unbalanced parenthesis indenting.'.format(i))
-            current_indent += 1
-        unbalance_flag = not parens.balanced
-
-        # Special: Closing Item Reset
-        # Scan the line for ending key if one exists. If
-        # parentheses are balanced and then ending key has been found
-        # then reset the current and next indent level to this state.
-        # The evaluate flag is used because a branching lexical
-        # structure was discovered and the line needs to be rescanned.
-        if len(closing_stack):
-            eval_line = True
-            while eval_line:
-                debug('{}: Closing stack depth={} top={} indent={} parens={}'.format(i, len(closing_stack), closing_stack[0][0], closing_stack[0][1], closing_stack[0][2].stats()))
-                # Assume that we will traverse only once, and set the flag
-                # to false.  If we need to rescan, the flag will be set
-                # true.
-                eval_line = False
-
-                # Since the closing rule pattern could be multiple patterns, we have to scan
-                # through that item, referencing into the close_rules dictionary for the
-                # pattern.  Assigning the rule list to another name to stop the madness
-                # of indirection.
-                stack_key, stack_indent, stack_parens = closing_stack[0]
-                rules = open_rules[stack_key]['close_rule']
-
-                # Step through and search for the end pattern.
-                for close_key, result in rules:
-                    debug('{}: Evaluation line: {}'.format(i, line))
-                    debug('{}: Evaluation pattern: {}'.format(i, close_rules[close_key]))
-                    close_search = re.search(close_rules[close_key], line, re.IGNORECASE)
-                    if close_search and parens.delta == stack_parens.delta:
-                        # We've found a match and are in a balanced state.
-                        debug('{}: Found closing match to {}'.format(i, stack_key))
-                        if result is not None:
-                            # We have found a continuation of the structure.
-                            # Pop off the top of the stack, then append the new
-                            # key to the top of the stack and re-evaluate.
-                            debug('{}: Continuation found.  Re-evaluating for {}'.format(i, result))
-                            closing_stack.popleft()
-                            closing_stack.appendleft([result, stack_indent, stack_parens])
-                            # Need to do a solo line check, mainly for those is clauses.
-                            if open_rules[result]['solo_flag']:
-                                solo_search = re.search(r'^\)?\s?'+close_rules[close_key], line, re.IGNORECASE)
-                                if solo_search:
-                                    # Unindent this line most likely
-                                    debug('{}: Solo intermediate found.'.format(i))
-                                    current_indent += open_rules[result]['start_offset']
-                            eval_line = True
-                        else:
-                            # This is the endpoint of the structure.
-                            # Behavior changes based on the solo flag
-                            if open_rules[stack_key]['solo_flag']:
-                                # Solo flag rules means we only apply the closing
-                                # rule to the current line if the symbol is alone
-                                # on a line, otherwise we apply the closing rule
-                                # to the following line.
-                                # Scan the line again to check for the beginning
-                                # of the line variation.  (Small alteration to
-                                # check for an paren in the case of endclauses
-                                # that might not have the built-in paren)
-                                debug('{}: Using solo line rule.'.format(i))
-                                solo_search = re.search(r'^\)?\s?'+close_rules[close_key], line, re.IGNORECASE)
-                                if solo_search:
-                                    # Revert on this line
-                                    debug('{}: Solo closing found here.'.format(i))
-                                    current_indent = stack_indent + open_rules[stack_key]['close_offset']
-                                    next_indent = stack_indent
-                                else:
-                                    debug('{}: Close is not alone on this line.'.format(i))
-                                    # Revert on the next line
-                                    next_indent = stack_indent
-                            else:
-                                debug('{}: Regular ending rule.'.format(i))
-                                # No special rule handling.  Revert on this line.
-                                current_indent = next_indent = stack_indent
-                            # Pop the top of the stack and we're done with evaluating
-                            # closing strings.
-                            closing_stack.popleft()
-
-        # Modify the line here.
-        lines[i] = indent_char*current_indent+lines[i]
-        debug('{}: ci={} ni={} : {} \n'.format(i, current_indent, next_indent, lines[i]))
-        # Set current for next line.
-        current_indent = next_indent
+# The beautify passes live in a module free of the Sublime Text API.
+# Importing relative to the package when loaded as a plugin, and
+# directly when loaded by a standalone tool.
+if __package__:
+    from .vhdl_beautify import (Parentheses, align_block_on_re, align_columns,
+                                INTERFACE_COLUMNS, indent_vhdl, strip_comments)
+else:
+    from vhdl_beautify import (Parentheses, align_block_on_re, align_columns,
+                               INTERFACE_COLUMNS, indent_vhdl, strip_comments)
 
 
 # ---------------------------------------------------------------
@@ -486,14 +27,16 @@ class Port():
     """
     This is the class of ports and ways to manipulate ports.
     A port consists of a name (string), a mode (optional) (string),
-    and a type (string).
+    and a type (string).  Passing no string leaves the fields
+    empty for the caller to fill in.
     """
-    def __init__(self, port_str):
+    def __init__(self, port_str=None):
         self.name = ""
         self.mode = ""
         self.type = ""
         self.success = False
-        self.parse_str(port_str)
+        if port_str is not None:
+            self.parse_str(port_str)
 
     def parse_str(self, port_str):
         """Searches a string for the port fields."""
@@ -545,13 +88,15 @@ class Generic():
     """
     This is the class of generics and ways to manipulate them.
     A generic consists of a name (string), a type (string),
-    and a default value (string).
+    and a default value (string).  Passing no string leaves the
+    fields empty for the caller to fill in.
     """
-    def __init__(self, gen_str):
+    def __init__(self, gen_str=None):
         self.name = ""
         self.type = ""
         self.success = False
-        self.parse_str(gen_str)
+        if gen_str is not None:
+            self.parse_str(gen_str)
 
     def parse_str(self, gen_str):
         """Attempts to extract the information from a generic interface."""
@@ -718,9 +263,10 @@ class Interface():
         self.if_string = re.sub(p, " ", self.if_string)
 
 
-    def parse_generic_port(self):
+    def parse_generic_port(self, verbose=True):
         """Attempts to break the interface into known generic and
-        port sections and then calls individual parsing routines."""
+        port sections and then calls individual parsing routines.
+        Missing sections are reported to the console if verbose."""
         # Initialize things.
         self.if_ports = []
         self.if_generics = []
@@ -746,10 +292,12 @@ class Interface():
                     if port.success:
                         self.if_ports.append(port)
             else:
-                print('vhdl-mode: No ports found.')
+                if verbose:
+                    print('vhdl-mode: No ports found.')
                 port_str = ""
         else:
-            print('vhdl-mode: No ports found.')
+            if verbose:
+                print('vhdl-mode: No ports found.')
             port_str = ""
 
         if gen_search:
@@ -761,13 +309,15 @@ class Interface():
                     if generic.success:
                         self.if_generics.append(generic)
             else:
-                print('vhdl-mode: No generics found.')
+                if verbose:
+                    print('vhdl-mode: No generics found.')
                 gen_str = ""
         else:
-            print('vhdl-mode: No generics found.')
+            if verbose:
+                print('vhdl-mode: No generics found.')
             gen_str = ""
 
-    def parse_block(self):
+    def parse_block(self, verbose=True):
         """Top level routine for extracting information out of a
         string block believed to contain a VHDL interface."""
         # This contains the whole parsing routine in a single method
@@ -775,7 +325,37 @@ class Interface():
         # about it.
         self.strip_comments()
         self.strip_whitespace()
-        self.parse_generic_port()
+        self.parse_generic_port(verbose)
+
+    def to_dict(self):
+        """
+        Returns the parsed interface as plain data, suitable for
+        storing as JSON.
+        """
+        return {
+            'name': self.name,
+            'type': self.type,
+            'generics': [[g.name, g.type] for g in self.if_generics],
+            'ports': [[p.name, p.mode, p.type] for p in self.if_ports],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds an interface stored with to_dict."""
+        interface = cls()
+        interface.name = data['name']
+        interface.type = data['type']
+        for name, gen_type in data['generics']:
+            generic = Generic()
+            generic.name, generic.type = name, gen_type
+            generic.success = True
+            interface.if_generics.append(generic)
+        for name, mode, port_type in data['ports']:
+            port = Port()
+            port.name, port.mode, port.type = name, mode, port_type
+            port.success = True
+            interface.if_ports.append(port)
+        return interface
 
     def signals(self):
         """
@@ -802,8 +382,7 @@ class Interface():
         if self.if_generics:
             for generic in self.if_generics:
                 lines.append(generic.print_as_constant() + ';')
-            align_block_on_re(lines, r':')
-            align_block_on_re(lines, r':=')
+            align_columns(lines, [(r':', 'pre'), (r':=', 'pre')])
             indent_vhdl(lines, 1)
             return '\n'.join(lines)
         else:
@@ -892,9 +471,7 @@ class Interface():
             lines.append(");")
         lines.append("end component {};".format(self.name))
 
-        align_block_on_re(lines, ':')
-        align_block_on_re(lines, r':\s?(?:in\b|out\b|inout\b|buffer\b)?\s*', 'post')
-        align_block_on_re(lines, ':=')
+        align_columns(lines, INTERFACE_COLUMNS)
         indent_vhdl(lines, 1)
 
         return '\n'.join(lines)
@@ -932,9 +509,7 @@ class Interface():
             lines.append(");")
         lines.append("end entity {};".format(self.name))
 
-        align_block_on_re(lines, ':')
-        align_block_on_re(lines, r':\s?(?:in\b|out\b|inout\b|buffer\b)?\s*', 'post')
-        align_block_on_re(lines, ':=')
+        align_columns(lines, INTERFACE_COLUMNS)
         indent_vhdl(lines, 0)
 
         return '\n'.join(lines)
@@ -985,6 +560,242 @@ class Interface():
                     port.mode = 'in'
 
 
+# ---------------------------------------------------------------
+def scan_interfaces(text):
+    """
+    Finds and parses every entity and component declaration in the
+    text of a file.  Returns a list of (row, Interface) pairs, the row
+    being where the declaration begins.
+    """
+    lower = text.lower()
+    if 'entity' not in lower and 'component' not in lower:
+        return []
+    lines = text.split('\n')
+    found = []
+    row = 0
+    while row < len(lines):
+        interface = Interface()
+        line = strip_comments(lines[row])
+        start = interface.interface_start(line)
+        if start is None or not interface.name:
+            row += 1
+            continue
+        # Step forward to the end of the declaration, starting with
+        # the remainder of the first line.
+        block = [line[start:]]
+        end_row = row
+        while interface.interface_end(block[-1]) is None:
+            end_row += 1
+            if end_row >= len(lines):
+                break
+            block.append(strip_comments(lines[end_row]))
+        if end_row >= len(lines):
+            break
+        block[-1] = block[-1][:interface.interface_end(block[-1])]
+        interface.if_string = '\n'.join(block)
+        interface.parse_block(verbose=False)
+        found.append((row, interface))
+        row = end_row + 1
+    return found
+
+
+# ---------------------------------------------------------------
+# Instantiation heads: a label, optionally the entity, component or
+# configuration keyword, then the (library qualified) unit name and
+# an optional architecture.  Without the keyword the line could be a
+# declaration, so a generic or port map must follow.
+_instance_re = re.compile(
+    r'^\s*(?P<label>\w+)\s*:\s*(?:(?P<kind>entity|component|configuration)\s+)?'
+    r'(?:(?P<lib>\w+)\.)?(?P<unit>\w+)\s*(?:\(\s*\w+\s*\))?\s*(?P<rest>.*)$', re.I)
+_map_re = re.compile(r'^\s*(?:generic|port)\s+map\b', re.I)
+
+
+def scan_instances(text):
+    """
+    Finds the instantiations in the text of a file without the
+    help of syntax scopes.  Returns a list of (row, label, unit)
+    tuples.
+    """
+    lower = text.lower()
+    if ' map' not in lower:
+        return []
+    lines = [strip_comments(line) for line in text.split('\n')]
+    found = []
+    for row, line in enumerate(lines):
+        s = _instance_re.match(line)
+        if not s:
+            continue
+        rest = s.group('rest')
+        if not s.group('kind'):
+            # Look at the remainder of the line, or the next line with
+            # anything on it, for the map.
+            if not rest.strip():
+                rest = ''
+                for following in lines[row+1:row+4]:
+                    if following.strip():
+                        rest = following
+                        break
+            if not _map_re.match(rest):
+                continue
+        found.append((row, s.group('label'), s.group('unit')))
+    return found
+
+
+# ---------------------------------------------------------------
+def scan_subprograms(text):
+    """
+    Finds the function and procedure specifications in the text of a
+    file.  Returns a list of (row, Subprogram) pairs where only the
+    name, type and purity of each Subprogram are filled in.
+    """
+    lower = text.lower()
+    if 'function' not in lower and 'procedure' not in lower:
+        return []
+    found = []
+    for row, line in enumerate(text.split('\n')):
+        line = strip_comments(line)
+        subprogram = Subprogram()
+        start = subprogram.subprogram_start(line)
+        # 'end function foo;' closes a body rather than starting one.
+        if start is not None and subprogram.name and \
+                not re.search(r'\bend\s+$', line[:start], re.I):
+            found.append((row, subprogram))
+    return found
+
+
+# ---------------------------------------------------------------
+# Definitions found by scan_definitions.  Design unit heads set the
+# scope of what follows them.  Object declarations may name several
+# objects before the colon.
+_entity_re = re.compile(r'^\s*entity\s+(?P<name>\w+)\s+is\b', re.I)
+_architecture_re = re.compile(
+    r'^\s*architecture\s+(?P<name>\w+)\s+of\s+(?P<of>\w+)\s+is\b', re.I)
+_package_re = re.compile(r'^\s*package\s+(?P<body>body\s+)?(?P<name>\w+)\s+is\b', re.I)
+_type_re = re.compile(r'^\s*(?P<kind>type|subtype)\s+(?P<name>\w+)\b', re.I)
+_object_re = re.compile(r'^\s*(?P<kind>constant|signal)\s+(?P<names>\w+(?:\s*,\s*\w+)*)\s*:', re.I)
+_clause_re = re.compile(r'^\s*(?P<kind>generic|port)\b\s*(?P<open>\()?', re.I)
+_params_re = re.compile(r'^\s*\(')
+_element_re = re.compile(r'^\s*(?:signal\s+|constant\s+)?(?P<names>\w+(?:\s*,\s*\w+)*)\s*:(?!=)', re.I)
+
+
+def _names(match, offset=0):
+    """Yields (column, name) for each name of a declaration."""
+    start = offset + match.start('names')
+    for name in re.finditer(r'\w+', match.group('names')):
+        yield start + name.start(), name.group()
+
+
+def scan_definitions(text):
+    """
+    Finds the definitions in the text of a file: entities,
+    architectures, packages, types, constants, signals, the generics
+    and ports of entities, and subprograms.  Returns a list of
+    (row, column, kind, name, unit) tuples, unit naming the design
+    unit the definition belongs to, e.g. 'architecture rtl of top'.
+    """
+    found = []
+    unit = ''
+    # After an entity head the generic and port clauses are expected,
+    # and after a subprogram head its parameter list.  Each runs until
+    # its parentheses balance.  A clause keyword alone on its line
+    # waits for the parenthesis on the next.
+    expect = None
+    clause = None
+    waiting = False
+    depth = 0
+    for row, line in enumerate(text.split('\n')):
+        line = strip_comments(line)
+        if not line.strip():
+            continue
+
+        s = _entity_re.match(line)
+        if s:
+            unit = 'entity ' + s.group('name')
+            found.append((row, s.start('name'), 'entity', s.group('name'), unit))
+            expect, depth, waiting = 'entity', 0, False
+            # A clause may begin on the same line as the head.
+            line = ' ' * s.end() + line[s.end():]
+            if not line.strip():
+                continue
+
+        if expect:
+            offset = 0
+            if depth == 0:
+                if waiting:
+                    s = _params_re.match(line)
+                    waiting = False
+                elif expect == 'entity':
+                    s = _clause_re.match(line)
+                    if s:
+                        clause = s.group('kind').lower()
+                        if not s.group('open'):
+                            if line[s.end():].strip():
+                                s = None
+                            else:
+                                waiting = True
+                                continue
+                else:
+                    s = _params_re.match(line)
+                    clause = None
+                if s:
+                    offset = s.end()
+                else:
+                    expect = None
+            if expect:
+                # Parameters are local to the subprogram and not kept.
+                if clause:
+                    for piece in line[offset:].split(';'):
+                        s = _element_re.match(piece)
+                        if s:
+                            for col, name in _names(s, offset):
+                                found.append((row, col, clause, name, unit))
+                        offset += len(piece) + 1
+                depth += line.count('(') - line.count(')')
+                if depth <= 0:
+                    depth = 0
+                    if expect == 'subprogram':
+                        expect = None
+                continue
+
+        s = _architecture_re.match(line)
+        if s:
+            unit = 'architecture {} of {}'.format(s.group('name'), s.group('of'))
+            found.append((row, s.start('name'), 'architecture', s.group('name'), unit))
+            continue
+        s = _package_re.match(line)
+        if s:
+            if s.group('body'):
+                unit = 'package body ' + s.group('name')
+            else:
+                unit = 'package ' + s.group('name')
+                found.append((row, s.start('name'), 'package', s.group('name'), unit))
+            continue
+        s = _type_re.match(line)
+        if s:
+            found.append((row, s.start('name'), s.group('kind').lower(), s.group('name'), unit))
+            continue
+        s = _object_re.match(line)
+        if s:
+            kind = s.group('kind').lower()
+            for col, name in _names(s):
+                found.append((row, col, kind, name, unit))
+            continue
+        lower = line.lower()
+        if 'function' not in lower and 'procedure' not in lower:
+            continue
+        subprogram = Subprogram()
+        start = subprogram.subprogram_start(line)
+        if start is not None and subprogram.name and \
+                not re.search(r'\bend\s+$', line[:start], re.I):
+            col = line.find(subprogram.name, start)
+            found.append((row, col, subprogram.type.lower(), subprogram.name, unit))
+            rest = line[col + len(subprogram.name):]
+            depth = rest.count('(') - rest.count(')')
+            expect = 'subprogram' if depth > 0 or '(' not in rest else None
+            clause = None
+    return found
+
+
 # ---------------------------------------------------------------
 class Subprogram():
     """
@@ -1042,36 +853,38 @@ class Subprogram():
         parameters) we have to match and count parens and only validate
         a tail when all parens are balanced."""
         # Patterns to check.
-        proc_tail_pattern = r";|is"
-        func_tail_pattern = r"return\s+(?P<rtype>.*?)\s*(;|is)"
-
-        # Find our parenthesis state.
-        parens = Parentheses()
-        parens.scan(line)
-
-        # If we are unbalanced, then there's nothing to do and return.  Otherwise
-        # use the last paren location to trim the line and perform the search.
-        if parens.balanced:
-            if close_pos:
-                new_line = line[parens.close_pos[-1]:]
-                offset = close_pos[-1]
+        proc_tail_pattern = r";|\bis\b"
+        func_tail_pattern = r"return\s+(?P<rtype>.*?)\s*(?P<tail>;|\bis\b)"
+
+        # Blank out everything within parentheses, carrying the depth
+        # over from the lines before, so that neither the semicolons of
+        # the parameter list nor the parentheses of a return type end
+        # the search early.
+        depth = self.paren_count[0] - self.paren_count[1]
+        masked = []
+        for char in strip_comments(line):
+            if char == '(':
+                depth += 1
+            masked.append(' ' if depth > 0 else char)
+            if char == ')' and depth > 0:
+                depth -= 1
+        self.paren_count = [depth, 0]
+
+        # If we are unbalanced, then there's nothing to do and return.
+        if depth > 0:
+            return None
+        masked = ''.join(masked)
+        if self.type.lower() == 'function':
+            s = re.search(func_tail_pattern, masked, re.I)
+            if s:
+                self.if_return = line[s.start('rtype'):s.start('tail')].strip()
+                return s.end()
             else:
-                new_line = line
-                offset = 0
-
-            if self.type.lower() == 'function':
-                s = re.search(func_tail_pattern, new_line, re.I)
-                if s:
-                    self.if_return = s.group('rtype')
-                    return s.end() + offset
-                else:
-                    return None
-            elif self.type.lower() == 'procedure':
-                s = re.search(proc_tail_pattern, new_line, re.I)
-                if s:
-                    return s.end() + offset
-                else:
-                    return None
+                return None
+        elif self.type.lower() == 'procedure':
+            s = re.search(proc_tail_pattern, masked, re.I)
+            if s:
+                return s.end()
             else:
                 return None
         else:
@@ -1155,9 +968,7 @@ class Subprogram():
             else:
                 lines.append('{} {};'.format(self.type, self.name))
 
-        align_block_on_re(lines, ':')
-        align_block_on_re(lines, r':\s?(?:in\b|out\b|inout\b|buffer\b)?\s*', 'post')
-        align_block_on_re(lines, ':=')
+        align_columns(lines, INTERFACE_COLUMNS)
         indent_vhdl(lines, 1)
 
         return '\n'.join(lines)
@@ -1202,9 +1013,7 @@ class Subprogram():
         lines.append(' ')
         lines.append('end {} {};'.format(self.type, self.name))
 
-        align_block_on_re(lines, ':')
-        align_block_on_re(lines, r':\s?(?:in\b|out\b|inout\b|buffer\b)?\s*', 'post')
-        align_block_on_re(lines, ':=')
+        align_columns(lines, INTERFACE_COLUMNS)
         indent_vhdl(lines, 1)
 
         return '\n'.join(lines)
@@ -1245,3 +1054,294 @@ class Subprogram():
                     new_params.append(param)
             self.if_params = new_params
 
+
+# ---------------------------------------------------------------
+# Line patterns for the Outline.  Design unit heads and end lines
+# are anchored at the start of the line.
+_unit_re = re.compile(
+    r'^\s*(?P<kind>entity|architecture|package\s+body|package|configuration)\s+'
+    r'(?P<name>\w+)\s+(?:of\s+(?P<of>\w+)\s+)?is\b', re.I)
+_process_re = re.compile(
+    r'^\s*(?:(?P<label>\w+)\s*:\s*)?(?:postponed\s+)?process\b', re.I)
+_end_re = re.compile(r'^\s*end\b(?P<words>[^;]*);', re.I)
+_outline_words = ('entity', 'component', 'architecture', 'package', 'configuration',
+                  'function', 'procedure', 'process', 'end')
+
+# Rows above an edit whose marks may depend on it, as an
+# instantiation head looks ahead for its map.
+OUTLINE_LOOKAHEAD = 3
+
+_no_marks = ()
+
+
+def outline_marks(lines, i):
+    """
+    Returns the outline marks of lines[i] as a tuple, the lines after
+    it being used to confirm an instantiation.  A mark is one of:
+
+        ('unit', kind, name, of)
+        ('interface', column, type, name)
+        ('subprogram', column, type, name)
+        ('process', label)
+        ('instance', label, unit)
+        ('end', words)
+    """
+    line = strip_comments(lines[i])
+    lower = line.lower()
+    has_word = any(word in lower for word in _outline_words)
+    if not has_word and ':' not in line:
+        return _no_marks
+    marks = []
+    if has_word:
+        s = _end_re.match(line)
+        if s:
+            return (('end', tuple(s.group('words').lower().split())),)
+        s = _unit_re.match(line)
+        if s:
+            kind = ' '.join(s.group('kind').lower().split())
+            marks.append(('unit', kind, s.group('name'), s.group('of') or ''))
+        interface = Interface()
+        column = interface.interface_start(line)
+        if column is not None and interface.name:
+            marks.append(('interface', column, interface.type.lower(), interface.name))
+        subprogram = Subprogram()
+        column = subprogram.subprogram_start(line)
+        if column is not None and subprogram.name and \
+                not re.search(r'\bend\s+$', line[:column], re.I):
+            marks.append(('subprogram', column, subprogram.type.lower(), subprogram.name))
+        s = _process_re.match(line)
+        if s:
+            marks.append(('process', s.group('label') or ''))
+    if ':' in line and not marks:
+        s = _instance_re.match(line)
+        if s:
+            rest = s.group('rest')
+            if not s.group('kind'):
+                if not rest.strip():
+                    rest = ''
+                    for following in lines[i+1:i+1+OUTLINE_LOOKAHEAD]:
+                        following = strip_comments(following)
+                        if following.strip():
+                            rest = following
+                            break
+                if not _map_re.match(rest):
+                    rest = None
+            if rest is not None:
+                marks.append(('instance', s.group('label'), s.group('unit')))
+    return tuple(marks)
+
+
+class Outline():
+    """
+    The structure of a buffer: design units, entity and component
+    declarations, subprograms, processes and instantiations, with
+    the rows they span.
+
+    The outline is kept as the marks of each line (see
+    outline_marks), so an edit only costs rescanning the lines it
+    touched.  splice() records an edit by putting None in place of
+    the marks of the changed lines, and refresh() scans just those.
+    The derived lists are rebuilt from the marks, without reading
+    the text, the first time they are asked for after a change.
+
+    In the editor, edits are reported by a change listener that may
+    run after a command has already scanned the buffer.  report()
+    and update() keep the outline in step with change counts:
+    change_count is the version of the buffer last scanned, reported
+    the version the listener last reported edits up to, and spliced
+    is set while reported edits wait to be rescanned.
+    """
+    def __init__(self):
+        self.marks = []
+        self.change_count = None
+        self.reported = None
+        self.spliced = False
+        self._derived = None
+
+    def clear(self):
+        self.marks = []
+        self.change_count = None
+        self.spliced = False
+        self._derived = None
+
+    def splice(self, first, last, count):
+        """
+        Records that rows first to last, inclusive, were replaced by
+        count rows.
+        """
+        if first >= len(self.marks):
+            self.clear()
+            return
+        self.marks[first:last+1] = [None] * count
+        for row in range(max(0, first - OUTLINE_LOOKAHEAD), first):
+            self.marks[row] = None
+        self._derived = None
+
+    def refresh(self, read, line_count):
+        """
+        Scans the lines that changed.  read(first, end) returns the
+        text of rows first to end-1 as a list of lines.  If the marks
+        are out of step with the buffer every line is scanned.
+        Returns the number of lines scanned.
+        """
+        if len(self.marks) != line_count:
+            self.marks = [None] * line_count
+        scanned = 0
+        row = 0
+        while row < line_count:
+            try:
+                row = self.marks.index(None, row)
+            except ValueError:
+                break
+            end = row
+            while end < line_count and self.marks[end] is None:
+                end += 1
+            lines = read(row, min(end + OUTLINE_LOOKAHEAD, line_count))
+            for i in range(end - row):
+                self.marks[row + i] = outline_marks(lines, i)
+            scanned += end - row
+            self._derived = None
+            row = end
+        return scanned
+
+    def report(self, edits, change_count):
+        """
+        Records edits reported by the change listener, as (first,
+        last, count) tuples (see splice), with the buffer at
+        change_count.  Edits made before the outline was scanned are
+        already in it.  If it was scanned ahead of the reports and
+        the buffer changed again since, the edits it holds cannot be
+        told from the new ones, so it is cleared.
+        """
+        scanned = self.change_count
+        if scanned is not None and change_count > scanned:
+            if self.spliced or self.reported == scanned:
+                for first, last, count in edits:
+                    self.splice(first, last, count)
+                self.spliced = True
+            else:
+                self.clear()
+        self.reported = change_count
+
+    def update(self, read, line_count, change_count):
+        """
+        Brings the outline up to the buffer at change_count, see
+        refresh.  Only the spliced lines are scanned when every edit
+        since the last scan was reported, and every line otherwise.
+        Returns the number of lines scanned.
+        """
+        if self.change_count == change_count and not self.spliced:
+            return 0
+        if self.reported != change_count:
+            self.clear()
+        scanned = self.refresh(read, line_count)
+        self.change_count = change_count
+        self.spliced = False
+        return scanned
+
+    # -----------------------------------------------------------
+    def _derive(self):
+        if self._derived is not None:
+            return self._derived
+        heads = []
+        ends = []
+        for row, marks in enumerate(self.marks):
+            if marks:
+                for mark in marks:
+                    if mark[0] == 'end':
+                        ends.append((row, mark[1]))
+                    else:
+                        heads.append((row, mark))
+
+        def end_of(row, limit, match):
+            # The first end line after row, before limit, that match
+            # accepts.
+            index = bisect.bisect_right(ends, (row, ()))
+            while index < len(ends) and ends[index][0] < limit:
+                if match(ends[index][1]):
+                    return ends[index][0]
+                index += 1
+            return None
+
+        unit_rows = [row for row, mark in heads if mark[0] == 'unit']
+        subprogram_rows = [row for row, mark in heads if mark[0] == 'subprogram']
+
+        def next_row(rows, row):
+            index = bisect.bisect_right(rows, row)
+            return rows[index] if index < len(rows) else len(self.marks)
+
+        derived = {'heads': [row for row, mark in heads]}
+        for kind in ('unit', 'interface', 'subprogram', 'process', 'instance'):
+            derived[kind] = []
+        for row, mark in heads:
+            # Units do not nest, so nothing runs past the next one.
+            limit = next_row(unit_rows, row)
+            if mark[0] == 'unit':
+                # A unit ends at the last end line before the next one.
+                last = bisect.bisect_left(ends, (limit, ())) - 1
+                end = ends[last][0] if last >= 0 and ends[last][0] > row else None
+                entry = (row, end) + mark[1:]
+            elif mark[0] == 'subprogram':
+                # 'end function f;' or 'end f;' anywhere in the unit, a
+                # bare 'end function;' only before the next subprogram.
+                kind, name = mark[2], mark[3].lower()
+                end = end_of(row, limit, lambda words: words in ((kind, name), (name,)))
+                if end is None:
+                    end = end_of(row, min(limit, next_row(subprogram_rows, row)),
+                                 lambda words: words == (kind,))
+                entry = (row, end) + mark[1:]
+            elif mark[0] == 'process':
+                end = end_of(row, limit, lambda words: words[:1] == ('process',))
+                entry = (row, end) + mark[1:]
+            else:
+                entry = (row,) + mark[1:]
+            derived[mark[0]].append(entry)
+        for kind in ('unit', 'interface', 'subprogram', 'process', 'instance'):
+            derived[kind + '_rows'] = [entry[0] for entry in derived[kind]]
+        self._derived = derived
+        return derived
+
+    def units(self):
+        """(row, end_row, kind, name, of) for each design unit."""
+        return self._derive()['unit']
+
+    def interfaces(self):
+        """(row, column, type, name) for each entity and component."""
+        return self._derive()['interface']
+
+    def subprograms(self):
+        """
+        (row, end_row, column, type, name) for each subprogram.  The
+        end row is None for a declaration without a body.
+        """
+        return self._derive()['subprogram']
+
+    def processes(self):
+        """(row, end_row, label) for each process."""
+        return self._derive()['process']
+
+    def instances(self):
+        """(row, label, unit) for each instantiation."""
+        return self._derive()['instance']
+
+    def instance_labels(self):
+        """The instantiation labels of each unit, by unit name."""
+        labels = {}
+        for row, label, unit in self.instances():
+            labels.setdefault(unit, []).append(label)
+        return labels
+
+    def last_before(self, kind, row):
+        """
+        The last entry of a kind ('unit', 'interface', 'subprogram',
+        'process' or 'instance') at or above the row, or None.
+        """
+        derived = self._derive()
+        index = bisect.bisect_right(derived[kind + '_rows'], row)
+        return derived[kind][index-1] if index else None
+
+    def next_head(self, row):
+        """The row of the first mark other than an end below the row."""
+        heads = self._derive()['heads']
+        index = bisect.bisect_right(heads, row)
+        return heads[index] if index < len(heads) else None
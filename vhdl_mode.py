@@ -11,8 +11,19 @@ import textwrap
 import sublime
 import sublime_plugin
 
-from . import vhdl_lang as vhdl
 from . import vhdl_util as util
+from . import vhdl_beautify as beautify
+from . import vhdl_stats
+
+#----------------------------------------------------------------
+def plugin_loaded():
+    """
+    The beautify engine does not know about Sublime Text, so hand it
+    a rules loader that works from within a zipped package.  The
+    compiled rules are then cached until the rules file is saved.
+    """
+    beautify.set_rules_loader(
+        lambda: sublime.load_resource('Packages/VHDL Mode/' + beautify.RULES_RESOURCE))
 
 #----------------------------------------------------------------
 class vhdlModeVersionCommand(sublime_plugin.TextCommand):
@@ -47,17 +58,18 @@ class vhdlModeInsertHeaderCommand(sublime_plugin.TextCommand):
             filename = '<filename>'
 
         # Get the other fields out of settings.
-        linesize = util.get_vhdl_setting(self, 'vhdl-line-length')
-        project = util.get_vhdl_setting(self, 'vhdl-project-name')
-        author = util.get_vhdl_setting(self, 'vhdl-user')
-        company = util.get_vhdl_setting(self, 'vhdl-company')
-        platform = util.get_vhdl_setting(self, 'vhdl-platform')
-        standard = util.get_vhdl_setting(self, 'vhdl-standard')
-        mtime_prefix = util.get_vhdl_setting(self, 'vhdl-modified-time-string')
-        use_copyright = util.get_vhdl_setting(self, 'vhdl-use-copyright-block')
-        use_revision = util.get_vhdl_setting(self, 'vhdl-use-revision-block')
-        copyright_list = util.get_vhdl_setting(self, 'vhdl-copyright-block')
-        revision_list = util.get_vhdl_setting(self, 'vhdl-revision-block')
+        settings = util.get_settings(self)
+        linesize = settings['vhdl-line-length']
+        project = settings['vhdl-project-name']
+        author = settings['vhdl-user']
+        company = settings['vhdl-company']
+        platform = settings['vhdl-platform']
+        standard = settings['vhdl-standard']
+        mtime_prefix = settings['vhdl-modified-time-string']
+        use_copyright = settings['vhdl-use-copyright-block']
+        use_revision = settings['vhdl-use-revision-block']
+        copyright_list = settings['vhdl-copyright-block']
+        revision_list = settings['vhdl-revision-block']
 
         # Set the string to dynamically replace the line field to the chosen
         # line length.
@@ -175,131 +187,409 @@ class vhdlModeToggleCommentRegionCommand(sublime_plugin.TextCommand):
         # Replace the current region with the new region
         self.view.replace(edit, region, block)
 
+#----------------------------------------------------------------
+class BeautifyJob():
+    """
+    A beautify of the whole buffer running off the UI thread.  Holds
+    the snapshot of the lines, their scopes, the change count and
+    selection they were read with, and the result once the worker is
+    done.
+    """
+    STATUS_KEY = 'vhdl_mode_beautify'
+    _tokens = 0
+
+    def __init__(self, view, original_lines, scope_list, row_col, stats):
+        BeautifyJob._tokens += 1
+        self.token = BeautifyJob._tokens
+        self.view = view
+        self.change_count = view.change_count()
+        self.original_lines = original_lines
+        self.lines = list(original_lines)
+        self.scope_list = scope_list
+        self.row_col = row_col
+        self.selection = selection_of(view)
+        self.stats = stats
+        self.error = None
+
+    def run(self, tab_size, use_spaces):
+        """Worker thread.  Beautifies the snapshot, then hands back."""
+        try:
+            beautify.beautify_lines(self.lines, tab_size=tab_size, use_spaces=use_spaces,
+                                    scope_data=self.scope_list, stats=self.stats)
+        except Exception as e:
+            self.error = e
+        sublime.set_timeout(lambda: self.view.run_command(
+            'vhdl_mode_apply_beautify', {'token': self.token}), 0)
+
+def selection_of(view):
+    return [(region.a, region.b) for region in view.sel()]
+
+# Jobs waiting for their result to be applied, by view id.  A newer
+# job replaces an older one, whose result is then dropped.
+_beautify_jobs = {}
+
 #----------------------------------------------------------------
 class vhdlModeBeautifyBufferCommand(sublime_plugin.TextCommand):
     """
     This is a Sublime Text variation of the standalone beautify
     code program.  Sets the region to the entire buffer, obtains
-    the lines, then processes them and writes them back.
+    the lines, then processes them and writes them back.  The lines
+    are processed on a worker thread against a snapshot of the
+    buffer so that typing is not held up, and written back by
+    vhdl_mode_apply_beautify.  With background false (as on save)
+    everything happens before the command returns.
     """
-    def run(self, edit):
+    def run(self, edit, background=True):
         # Save original point, and convert to row col.  Beautify
         # will change the number of characters in the file, so
         # need coordinates to know where to go back to.
         original_region = self.view.sel()[0]
         original_point = original_region.begin()
-        orig_x, orig_y = self.view.rowcol(original_point)
+        row_col = self.view.rowcol(original_point)
+        stats = vhdl_stats.Stats('beautify_buffer')
 
         # Create points for a region that define beginning and end.
         begin = 0
         end = self.view.size()-1
 
         # Slurp up entire buffer
-        whole_region = sublime.Region(begin, end)
-        buffer_str = self.view.substr(whole_region)
-        lines = buffer_str.split('\n')
-
-        # Get the scope for column 0 of each line.
-        point = 0
-        scope_list = []
-        while not util.is_end_line(self, point):
-            scope_list.append(self.view.scope_name(point))
-            point = util.move_down(self, point)
-        scope_list.append(self.view.scope_name(point))
-
-        # Process each line
-        # Left justify
-        vhdl.left_justify(lines)
-
-        # Because there are some really terrible typists out there
-        # I end up having to MAKE SURE that symbols like : := <= and =>
-        # have spaces to either side of them.  I'm just going to wholesale
-        # replace them all with padded versions and then I remove extra space
-        # later, which seems wasteful, but easier than trying to come up with
-        # a ton of complicated patterns.
-        vhdl.pad_vhdl_symbols(lines)
-
-        # Remove extra blank space and convert tabs to spaces
-        vhdl.remove_extra_space(lines)
-
-        # Align
-        print('vhdl-mode: Aligning symbols.')
-        vhdl.align_block_on_re(lines=lines, regexp=r':(?!=)', scope_data=scope_list)
-        vhdl.align_block_on_re(
-            lines=lines,
-            regexp=r':(?!=)\s?(?:in\b|out\b|inout\b|buffer\b)?\s*',
-            padside='post',
-            scope_data=scope_list)
-        vhdl.align_block_on_re(lines=lines, regexp=r'<|:(?==)', scope_data=scope_list)
-        vhdl.align_block_on_re(lines=lines, regexp=r'=>', scope_data=scope_list)
-
-        # Indent!  Get some settings first.
-        use_spaces = util.get_vhdl_setting(self, 'translate_tabs_to_spaces')
-        tab_size = util.get_vhdl_setting(self, 'tab_size')
-        print('vhdl-mode: Indenting.')
-        vhdl.indent_vhdl(lines=lines, initial=0, tab_size=tab_size,
-                         use_spaces=use_spaces)
-
-        # Post indent alignment
-        vhdl.align_block_on_re(lines=lines, regexp=r'\bwhen\b', scope_data=scope_list)
-        # TBD -- There's a hook for more sophisticated handling of comment
-        # lines which would be required for perfect alignment of inline comment
-        # blocks, however it's not working, so leave that parameter as True for
-        # now.
-        vhdl.align_block_on_re(lines=lines, regexp=r'--', ignore_comment_lines=True, scope_data=scope_list)
-
-        # Recombine into one big blobbed string.
-        buffer_str = '\n'.join(lines)
-
-        # Annnd if all went well, write it back into the buffer
-        self.view.replace(edit, whole_region, buffer_str)
+        with stats.stage('read'):
+            whole_region = sublime.Region(begin, end)
+            buffer_str = self.view.substr(whole_region)
+            original_lines = buffer_str.split('\n')
+
+        # Get the scope for column 0 of each line.  The scopes come
+        # from the syntax, so they have to be read here.
+        with stats.stage('scopes'):
+            scope_list = util.extract_scopes(self, original_lines)
+
+        # Process the lines.  The beautify engine holds the pipeline
+        # so that the command line formatter shares the same passes.
+        settings = util.get_settings(self)
+        use_spaces = settings['translate_tabs_to_spaces']
+        tab_size = settings['tab_size']
+        job = BeautifyJob(self.view, original_lines, scope_list, row_col, stats)
+        print('vhdl-mode: Beautifying buffer.')
+        if not background:
+            beautify.beautify_lines(job.lines, tab_size=tab_size, use_spaces=use_spaces,
+                                    scope_data=scope_list, stats=stats)
+            write_back(self, edit, job)
+            return
+
+        _beautify_jobs[self.view.id()] = job
+        self.view.set_status(BeautifyJob.STATUS_KEY, 'VHDL Mode: Beautifying {} lines...'.format(
+            len(original_lines)))
+        sublime.set_timeout_async(lambda: job.run(tab_size, use_spaces), 0)
+
+#----------------------------------------------------------------
+def write_back(cmd_obj, edit, job):
+    """Writes the lines of a finished job back to the buffer."""
+    stats = job.stats
+    # The cursor is only put back if it was not moved while the job
+    # ran.
+    restore = selection_of(cmd_obj.view) == job.selection
+    # Annnd if all went well, write back only the lines that
+    # changed.
+    with stats.stage('write'):
+        hunks = util.replace_lines(cmd_obj, edit, 0, job.original_lines, job.lines)
+    stats.count('hunks', hunks)
+    if hunks:
+        print('vhdl-mode: Beautified buffer.')
+    else:
+        print('vhdl-mode: Buffer already beautified.')
+
+    # Put cursor back to original point (roughly)
+    if restore:
+        original_point = cmd_obj.view.text_point(*job.row_col)
+        util.set_cursor(cmd_obj, original_point)
+    util.record_stats(cmd_obj, stats)
+
+#----------------------------------------------------------------
+class vhdlModeApplyBeautifyCommand(sublime_plugin.TextCommand):
+    """
+    Writes back the result of a background beautify.  Only the most
+    recent job for the view is applied, and only if the buffer has
+    not changed since its snapshot was taken.  Otherwise the result
+    is dropped and the beautify has to be run again.
+    """
+    def run(self, edit, token):
+        job = _beautify_jobs.get(self.view.id())
+        if job is None or job.token != token:
+            return
+        del _beautify_jobs[self.view.id()]
+        self.view.erase_status(BeautifyJob.STATUS_KEY)
+        if job.error is not None:
+            print('vhdl-mode: Beautify failed: {}: {}'.format(type(job.error).__name__, job.error))
+            return
+        if self.view.change_count() != job.change_count:
+            print('vhdl-mode: Buffer changed while beautifying, result discarded.')
+            sublime.status_message('VHDL Mode: Buffer changed while beautifying, run it again.')
+            return
+        write_back(self, edit, job)
+
+#----------------------------------------------------------------
+# Indent state checkpoints for region beautify, one
+# IndentCheckpoints per buffer id.
+_indent_checkpoints = {}
+
+def get_indent_checkpoints(view):
+    """Returns the checkpoint cache for the view's buffer."""
+    buffer_id = view.buffer_id()
+    if buffer_id not in _indent_checkpoints:
+        _indent_checkpoints[buffer_id] = beautify.IndentCheckpoints()
+    return _indent_checkpoints[buffer_id]
+
+#----------------------------------------------------------------
+class vhdlModeBeautifyRegionCommand(sublime_plugin.TextCommand):
+    """
+    Beautifies only the lines covered by the first selection (or
+    the line of the cursor.)  The indent state for the first line
+    is resumed from the nearest checkpoint above it, advancing over
+    any lines in between, so the rest of the buffer is not
+    reprocessed.
+    """
+    def run(self, edit):
+        # Save original point, and convert to row col.
+        original_region = self.view.sel()[0]
+        orig_x, orig_y = self.view.rowcol(original_region.begin())
+        stats = vhdl_stats.Stats('beautify_region')
+
+        # Expand to whole lines.  A selection ending at the start of
+        # a line does not include that line.
+        begin = original_region.begin()
+        end = original_region.end()
+        if end > begin and self.view.rowcol(end)[1] == 0:
+            end = end - 1
+        region = self.view.line(sublime.Region(begin, end))
+        first_row = self.view.rowcol(region.begin())[0]
+        last_row = self.view.rowcol(region.end())[0]
+
+        settings = util.get_settings(self)
+        use_spaces = settings['translate_tabs_to_spaces']
+        tab_size = settings['tab_size']
+
+        # Find the indent state for the first line.
+        checkpoints = get_indent_checkpoints(self.view)
+        row, state = checkpoints.nearest(first_row)
+        if state is None:
+            state = beautify.IndentState()
+        if row < first_row:
+            with stats.stage('resume'):
+                prior = self.view.substr(sublime.Region(self.view.text_point(row, 0),
+                                                        region.begin()))
+                beautify.advance_indent(prior.split('\n')[:-1], state,
+                                        checkpoints=checkpoints, first_row=row)
+            stats.count('resumed_lines', first_row - row)
+
+        # Column zero scopes for the region only.
+        with stats.stage('read'):
+            original_lines = self.view.substr(region).split('\n')
+            lines = list(original_lines)
+        with stats.stage('scopes'):
+            scope_list = util.extract_scopes(self, lines, region.begin())
+        print('vhdl-mode: Beautifying lines {}-{}.'.format(first_row+1, last_row+1))
+        beautify.beautify_lines(lines, tab_size=tab_size, use_spaces=use_spaces,
+                                scope_data=scope_list, state=state, stats=stats)
+        with stats.stage('write'):
+            hunks = util.replace_lines(self, edit, region.begin(), original_lines, lines)
+        stats.count('hunks', hunks)
 
         # Put cursor back to original point (roughly)
-        original_point = self.view.text_point(orig_x, orig_y)
-        util.set_cursor(self, original_point)
+        util.set_cursor(self, self.view.text_point(orig_x, orig_y))
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
+class vhdlModeTraceLineCommand(sublime_plugin.TextCommand):
+    """
+    Prints the indent decisions for the line of the cursor to the
+    console.  The indent state is resumed from the nearest checkpoint
+    and traced forward to the line, so the buffer is not changed.
+    """
+    def run(self, edit):
+        row = self.view.rowcol(self.view.sel()[0].begin())[0]
+        checkpoints = get_indent_checkpoints(self.view)
+        start_row, state = checkpoints.nearest(row)
+        if state is None:
+            state = beautify.IndentState()
+        text = self.view.substr(sublime.Region(self.view.text_point(start_row, 0),
+                                               self.view.line(self.view.text_point(row, 0)).end()))
+        trace = beautify.IndentTrace()
+        beautify.advance_indent(text.split('\n'), state, checkpoints=checkpoints,
+                                first_row=start_row, trace=trace)
+        print('vhdl-mode: Indent trace for line {}:'.format(row+1))
+        for line in trace.format(trace.for_row(row)):
+            print('vhdl-mode:   {}'.format(line))
+
+#----------------------------------------------------------------
+if hasattr(sublime_plugin, 'TextChangeListener'):
+    class vhdlModeBufferChangeListener(sublime_plugin.TextChangeListener):
+        """
+        Drops the indent checkpoints from the first edited row
+        onward whenever the buffer changes, and marks the edited rows
+        of the outline for rescanning.
+        """
+        def on_text_changed(self, changes):
+            checkpoints = _indent_checkpoints.get(self.buffer.id())
+            if checkpoints is not None and changes:
+                checkpoints.invalidate(min(change.a.row for change in changes))
+            view = self.buffer.primary_view()
+            if view is not None:
+                util.outline_changed(view, changes)
+else:
+    class vhdlModeBufferChangeListener(sublime_plugin.EventListener):
+        """
+        Without change locations (Sublime Text 3) any modification
+        drops all of the buffer's indent checkpoints and its outline.
+        """
+        def on_modified(self, view):
+            checkpoints = _indent_checkpoints.get(view.buffer_id())
+            if checkpoints is not None:
+                checkpoints.clear()
+            util.outline_modified(view)
+
+#----------------------------------------------------------------
+class vhdlModeBufferCleanup(sublime_plugin.EventListener):
+    """
+    Forgets the checkpoints, outline, saved hash, pending beautify,
+    last updated field search and settings snapshot of a closed view.
+    """
+    def on_close(self, view):
+        _indent_checkpoints.pop(view.buffer_id(), None)
+        _saved_content.pop(view.id(), None)
+        _beautify_jobs.pop(view.id(), None)
+        _no_last_update.pop(view.id(), None)
+        util.forget_settings(view)
+        util.forget_outline(view.buffer_id())
+
+#----------------------------------------------------------------
+# Number of lines at the top of a file searched for the last updated
+# field.  The header snippet puts it well within this.
+HEADER_WINDOW_LINES = 100
+
+# Key of the hidden region that follows the last updated field once
+# it has been found.
+LAST_UPDATE_KEY = 'vhdl_mode_last_update'
+
+# The change count and pattern with which each view was found to have
+# no last updated field, by view id.
+_no_last_update = {}
+
 class vhdlModeUpdateLastUpdatedCommand(sublime_plugin.TextCommand):
     """
     Finds the last updated field in the header and updates the time
-    in the field.
+    in the field.  Only the first HEADER_WINDOW_LINES lines are
+    searched, the field is then tracked with a region so that later
+    saves go straight to it, and a buffer without the field is not
+    searched again until it changes.
     """
     def run(self, edit):
         """Sublime Text plugin run method."""
         # Note, if one changes the header, this might need to change too.
-        pattern = util.get_vhdl_setting(self, 'vhdl-modified-time-string')
-        region = self.view.find(pattern, 0)
-        #print('Region Diagnostics')
-        #print('------------------')
-        #print('Begin: {}'.format(region.begin()))
-        #print('End:   {}'.format(region.end()))
-        #print('Empty? {}'.format(region.empty()))
-        if not region.empty():
-            region = self.view.line(region)
+        pattern = util.get_settings(self)['vhdl-modified-time-string']
+        view_id = self.view.id()
+        if _no_last_update.get(view_id) == (self.view.change_count(), pattern):
+            return
+        region = self.find_field(pattern)
+        if region is not None:
             date = time.ctime(time.time())
             new_mtime = pattern + '{}'.format(date)
             self.view.replace(edit, region, new_mtime)
+            self.view.add_regions(LAST_UPDATE_KEY,
+                                  [self.view.line(region.begin())],
+                                  '', '', sublime.HIDDEN)
+            _no_last_update.pop(view_id, None)
             print('vhdl-mode: Updated last modified time.')
         else:
+            self.view.erase_regions(LAST_UPDATE_KEY)
+            _no_last_update[view_id] = (self.view.change_count(), pattern)
             print('vhdl-mode: No last modified time field found.')
 
+    def find_field(self, pattern):
+        """
+        Returns the line region of the last updated field, or None.
+        The tracked region is used while its line still holds the
+        field, otherwise the header window is searched.
+        """
+        tracked = self.view.get_regions(LAST_UPDATE_KEY)
+        if tracked:
+            region = self.view.line(tracked[0].begin())
+            if re.search(pattern, self.view.substr(region)):
+                return region
+        end = min(self.view.text_point(HEADER_WINDOW_LINES, 0), self.view.size())
+        match = re.search(pattern, self.view.substr(sublime.Region(0, end)))
+        if match is None:
+            return None
+        return self.view.line(match.start())
+
+#----------------------------------------------------------------
+# The change count and hash of the text of each view as it was last
+# saved with beautify on save, by view id.
+_saved_content = {}
+
+class vhdlModeBeautifyOnSaveCommand(sublime_plugin.TextCommand):
+    """
+    Beautifies the buffer ahead of a save when vhdl-beautify-on-save
+    is set.  Nothing is done while the buffer still holds what was
+    last saved, known from the change count or else the hash of the
+    text.  Run with saved set after the save to remember the text.
+    """
+    def run(self, edit, saved=False):
+        if not util.get_settings(self)['vhdl-beautify-on-save']:
+            return
+        view_id = self.view.id()
+        if saved:
+            _saved_content[view_id] = (self.view.change_count(),
+                                       hash(util.buffer_text(self)))
+            return
+        stats = vhdl_stats.Stats('beautify_on_save')
+        if view_id in _saved_content:
+            change_count, digest = _saved_content[view_id]
+            if self.view.change_count() == change_count:
+                return
+            with stats.stage('hash'):
+                unchanged = bool(hash(util.buffer_text(self)) == digest)
+            if unchanged:
+                stats.count('skipped')
+                util.record_stats(self, stats)
+                return
+        self.view.run_command('vhdl_mode_beautify_buffer', {'background': False})
+
 #----------------------------------------------------------------
 class vhdlModeUpdateModifiedTimeOnSave(sublime_plugin.EventListener):
     """
-    Watches for a save event and updates the Last update
-    field in the header.
+    Watches for a save event, beautifies the buffer if beautify on
+    save is turned on and updates the Last update field in the
+    header.
     """
     def on_pre_save(self, view):
         """
         Gets passed the view that is being saved and scans for the
-        Last updated field.
+        Last updated field.  Beautify goes first so that the time
+        stamp does not look like an edit to the next save.
         """
         # MUST CHECK FOR VHDL FILE TYPE (otherwise it
         # starts executing on this very source file which
         # is problematic!)
         if util.is_vhdl_file(view.scope_name(0)):
+            view.run_command("vhdl_mode_beautify_on_save")
             view.run_command("vhdl_mode_update_last_updated")
 
+    def on_post_save(self, view):
+        if util.is_vhdl_file(view.scope_name(0)):
+            view.run_command("vhdl_mode_beautify_on_save", {"saved": True})
+
+#----------------------------------------------------------------
+class vhdlModeInvalidateRulesOnSave(sublime_plugin.EventListener):
+    """
+    Drops the compiled beautify rules when the rules file is edited
+    and saved, so the next beautify picks up the change.
+    """
+    def on_post_save(self, view):
+        name = view.file_name()
+        if name and name.replace('\\', '/').endswith(beautify.RULES_RESOURCE):
+            beautify.invalidate_rules()
+            print('vhdl-mode: Beautify rules reloaded.')
+
 #----------------------------------------------------------------
 class vhdlModeScopeSnifferCommand(sublime_plugin.TextCommand):
     """
@@ -329,8 +619,9 @@ class vhdlModeInsertCommentLine(sublime_plugin.TextCommand):
         line = self.view.substr(self.view.line(original_point))
         numtabs = line.count('\t')
         # Get the current tab size and line length.
-        tabsize = util.get_vhdl_setting(self, 'tab_size')
-        linesize = util.get_vhdl_setting(self, 'vhdl-line-length')
+        settings = util.get_settings(self)
+        tabsize = settings['tab_size']
+        linesize = settings['vhdl-line-length']
         # Create string of correct amount of dashes.  A tab consumed
         # one character but generates tabsize-1 space.
         numdash = linesize-point_c-(tabsize-1)*numtabs
@@ -359,8 +650,9 @@ class vhdlModeInsertCommentBox(sublime_plugin.TextCommand):
         line = self.view.substr(self.view.line(original_point))
         numtabs = line.count('\t')
         # Get the current tab size
-        tabsize = util.get_vhdl_setting(self, 'tab_size')
-        linesize = util.get_vhdl_setting(self, 'vhdl-line-length')
+        settings = util.get_settings(self)
+        tabsize = settings['tab_size']
+        linesize = settings['vhdl-line-length']
         # Create string of correct amount of dashes.  A tab consumed
         # one character but generates tabsize-1 space.
         numdash = linesize-point_c-(tabsize-1)*numtabs
@@ -387,10 +679,11 @@ class vhdlModeSettingSniffer(sublime_plugin.TextCommand):
         '''
         Standard TextCommand Run Method
         '''
+        settings = util.get_settings(self)
         print('Preference Settings')
-        print('vhdl-mode: {}: {}'.format('tab_size', util.get_vhdl_setting(self, 'tab_size')))
-        print('vhdl-mode: {}: {}'.format('translate_tabs_to_spaces', util.get_vhdl_setting(self, 'translate_tabs_to_spaces')))
-        vhdl_settings = sublime.load_settings('vhdl_mode.sublime-settings')
+        print('vhdl-mode: {}: {}'.format('tab_size', settings['tab_size']))
+        print('vhdl-mode: {}: {}'.format('translate_tabs_to_spaces', settings['translate_tabs_to_spaces']))
+        vhdl_settings = util.get_settings(None)
         keys = ['vhdl-line-length',
                 'vhdl-user',
                 'vhdl-company',
@@ -408,7 +701,22 @@ class vhdlModeSettingSniffer(sublime_plugin.TextCommand):
 
         print('View Settings')
         for key in keys:
-            print('vhdl-mode: {}: {}'.format(key, util.get_vhdl_setting(self, key)))
-
-
+            print('vhdl-mode: {}: {}'.format(key, settings[key]))
 
+#----------------------------------------------------------------
+class vhdlModeStatsReportCommand(sublime_plugin.WindowCommand):
+    """
+    Opens the timing and counter records of the most recent
+    commands as a JSON report in a new scratch buffer.
+    """
+    def run(self):
+        records = vhdl_stats.history()
+        if not records:
+            print('vhdl-mode: No commands have been recorded yet.')
+            return
+        report_view = self.window.new_file()
+        report_view.set_name('VHDL Mode Stats.json')
+        report_view.set_scratch(True)
+        report_view.assign_syntax('Packages/JSON/JSON.sublime-syntax')
+        report_view.run_command('append', {'characters': vhdl_stats.json_report(records)})
+        print('vhdl-mode: Wrote report for {} command(s).'.format(len(records)))
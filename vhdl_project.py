@@ -0,0 +1,215 @@
+"""
+Project Module -- Keeps an index of the VHDL files in the folders
+of each window up to date in the background, and holds the
+commands that manage and use it.
+"""
+import os
+import time
+import sublime
+import sublime_plugin
+
+from . import vhdl_index
+from . import vhdl_util as util
+from . import vhdl_stats
+
+# Projects by cache file path, so windows with the same folders
+# share one index.
+_projects = {}
+
+#----------------------------------------------------------------
+def plugin_loaded():
+    """Starts indexing the windows that are already open."""
+    for window in sublime.windows():
+        get_project(window)
+
+def plugin_unloaded():
+    for project in _projects.values():
+        project.stop()
+    _projects.clear()
+
+def index_settings():
+    return util.get_settings(None)
+
+#----------------------------------------------------------------
+class Project():
+    """
+    The ProjectIndex of a set of folders, its definitions database
+    and the Indexer that keeps both up to date.  Progress is shown in
+    the status bar of the views of every window with these folders.
+    """
+    STATUS_KEY = 'vhdl_mode_index'
+
+    def __init__(self, folders, path):
+        settings = index_settings()
+        self.folders = folders
+        self.db = vhdl_index.open_database(os.path.splitext(path)[0] + '.sqlite')
+        self.index = vhdl_index.ProjectIndex(folders, path, db=self.db)
+        self.last_status = 0
+        self.indexer = vhdl_index.Indexer(
+            self.index,
+            workers=settings['vhdl-index-workers'],
+            queue_size=settings['vhdl-index-queue-size'],
+            on_progress=self.on_progress,
+            on_idle=self.on_idle)
+
+    def windows(self):
+        return [w for w in sublime.windows() if w.folders() == self.folders]
+
+    def set_status(self, text):
+        for window in self.windows():
+            view = window.active_view()
+            if view is None:
+                continue
+            if text:
+                view.set_status(self.STATUS_KEY, text)
+            else:
+                view.erase_status(self.STATUS_KEY)
+
+    def on_progress(self, done, total):
+        # Called from the worker threads.  Only refresh the status a
+        # few times a second, and do it from the editor's thread.
+        now = time.time()
+        if now - self.last_status < 0.25 and done < total:
+            return
+        self.last_status = now
+        text = 'VHDL Mode: Indexing {}/{}'.format(done, total)
+        sublime.set_timeout(lambda: self.set_status(text), 0)
+
+    def on_idle(self):
+        sublime.set_timeout(lambda: self.set_status(None), 0)
+
+    def stop(self):
+        self.indexer.stop()
+        self.index.save()
+        if self.db is not None:
+            self.db.close()
+
+    def relative(self, path):
+        """The path relative to the parent of its project folder."""
+        for folder in self.folders:
+            if path == folder or path.startswith(folder.rstrip(os.sep) + os.sep):
+                return os.path.relpath(path, os.path.dirname(folder))
+        return path
+
+#----------------------------------------------------------------
+def get_project(window, scan=True):
+    """
+    Returns the Project for the folders open in the window, or None
+    if there are none or indexing is turned off.  A new project
+    starts with a scan for files changed since the index was saved.
+    """
+    if window is None or not index_settings()['vhdl-index-enabled']:
+        return None
+    folders = window.folders()
+    if not folders:
+        return None
+    path = os.path.join(sublime.cache_path(), 'VHDL Mode',
+                        vhdl_index.cache_name(folders))
+    if path not in _projects:
+        _projects[path] = Project(folders, path)
+        if scan:
+            _projects[path].indexer.scan()
+    return _projects[path]
+
+#----------------------------------------------------------------
+class vhdlModeIndexListener(sublime_plugin.EventListener):
+    """
+    Queues a VHDL file for indexing when it is saved or opened.  The
+    indexer only reads it again if its stat changed.
+    """
+    def queue(self, view):
+        path = view.file_name()
+        if vhdl_index.is_vhdl_path(path):
+            project = get_project(view.window())
+            if project is not None:
+                project.indexer.submit(path)
+
+    def on_post_save(self, view):
+        self.queue(view)
+
+    def on_load(self, view):
+        self.queue(view)
+
+#----------------------------------------------------------------
+class vhdlModeRefreshIndexCommand(sublime_plugin.WindowCommand):
+    """
+    Scans the project folders in the background for VHDL files that
+    changed since they were last indexed.
+    """
+    def run(self):
+        project = get_project(self.window, scan=False)
+        if project is None:
+            print('vhdl-mode: No project folders to index.')
+            return
+        project.indexer.scan()
+        print('vhdl-mode: Refreshing the project index.')
+
+#----------------------------------------------------------------
+class vhdlModeCancelIndexingCommand(sublime_plugin.WindowCommand):
+    """
+    Stops the indexing of the project folders in progress.  Files
+    saved or opened afterwards are not indexed either until the index
+    is refreshed.
+    """
+    def run(self):
+        project = get_project(self.window, scan=False)
+        if project is None:
+            return
+        project.indexer.cancel()
+        project.set_status(None)
+        print('vhdl-mode: Indexing cancelled until the next refresh.')
+
+#----------------------------------------------------------------
+class vhdlModeGotoDefinitionCommand(sublime_plugin.TextCommand):
+    """
+    Jumps to the definition of the name at the point, looked up in
+    the definitions database of the project.  With more than one
+    definition a quick panel is shown, those in the current file
+    first.
+    """
+    def run(self, edit):
+        window = self.view.window()
+        region = self.view.sel()[0]
+        if region.empty():
+            region = self.view.word(region)
+        name = self.view.substr(region).strip()
+        if not name:
+            return
+
+        project = get_project(window)
+        if project is None:
+            print('vhdl-mode: No project folders to search for definitions.')
+            return
+        if project.db is None:
+            print('vhdl-mode: Goto Definition needs the sqlite3 module, which '
+                  'this version of Sublime Text lacks.')
+            return
+
+        stats = vhdl_stats.Stats('goto_definition')
+        with stats.stage('lookup'):
+            found = project.index.lookup(name)
+        stats.count('definitions', len(found))
+        util.record_stats(self, stats)
+        if not found:
+            message = 'VHDL Mode: No definition of {} found'.format(name)
+            if project.indexer.busy:
+                message += ', still indexing'
+            sublime.status_message(message + '.')
+            return
+
+        current = self.view.file_name()
+        found.sort(key=lambda d: (d[2] != current, d[2], d[3]))
+        if len(found) == 1:
+            self.open(found[0])
+            return
+
+        items = []
+        for name, kind, path, row, col, unit in found:
+            items.append(['{} ({})'.format(name, kind),
+                          '{} in {}:{}'.format(unit, project.relative(path), row+1)])
+        window.show_quick_panel(items, lambda index: self.open(found[index]) if index >= 0 else None)
+
+    def open(self, definition):
+        name, kind, path, row, col, unit = definition
+        self.view.window().open_file('{}:{}:{}'.format(path, row+1, col+1),
+                                     sublime.ENCODED_POSITION)
@@ -0,0 +1,109 @@
+"""
+----------------------------------------------------------------
+ VHDL Mode Settings Schema.
+
+ The settings read by the commands, with their types and
+ defaults, and a Snapshot that merges layers of settings once
+ and checks each value against the schema.  The plugin takes a
+ snapshot per view from the package and view settings, and the
+ command line formatter takes one from settings files.
+----------------------------------------------------------------
+"""
+import re
+import json
+import collections
+
+SETTINGS_FILE = 'vhdl_mode.sublime-settings'
+
+# The type and default of each setting.  The defaults match the
+# settings file, and stand in for values of the wrong type.
+SCHEMA = collections.OrderedDict([
+    ('tab_size',                  (int, 4)),
+    ('translate_tabs_to_spaces',  (bool, True)),
+    ('vhdl-line-length',          (int, 80)),
+    ('vhdl-user',                 (str, 'User Name <user.email@user.company.com>')),
+    ('vhdl-company',              (str, 'User Company Name')),
+    ('vhdl-project-name',         (str, 'Default Project Name')),
+    ('vhdl-platform',             (str, 'Default Part Number')),
+    ('vhdl-standard',             (str, '<VHDL-2008 | VHDL-2002 | VHDL-1993 | VHDL-1987>')),
+    ('vhdl-modified-time-string', (str, '-- Last update : ')),
+    ('vhdl-beautify-on-save',     (bool, False)),
+    ('vhdl-stats',                (bool, False)),
+    ('vhdl-index-enabled',        (bool, True)),
+    ('vhdl-index-workers',        (int, 2)),
+    ('vhdl-index-queue-size',     (int, 256)),
+    ('vhdl-use-copyright-block',  (bool, True)),
+    ('vhdl-copyright-block',      (list, [
+        '-- Copyright (c) ${YEAR} ${COMPANY}',
+        '-' * 79])),
+    ('vhdl-use-revision-block',   (bool, True)),
+    ('vhdl-revision-block',       (list, [
+        '-- Revisions:  Revisions and documentation are controlled by',
+        '-- the revision control system (RCS).  The RCS should be consulted',
+        '-- on revision history.',
+        '-' * 79])),
+])
+
+# Strings are matched first so that comment markers and commas
+# inside them are left alone.
+_comment_re = re.compile(r'("(?:\\.|[^"\\])*")|/\*.*?\*/|//[^\n]*|,(?=\s*[}\]])', re.S)
+
+
+# ---------------------------------------------------------------
+def check(key, value):
+    """
+    Returns True if the value has the type the schema gives the key.
+    A bool is not taken for an int, and lists must hold strings.
+    """
+    kind = SCHEMA[key][0]
+    if kind is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind is list:
+        return isinstance(value, list) and all(isinstance(v, str) for v in value)
+    return isinstance(value, kind)
+
+
+# ---------------------------------------------------------------
+class Snapshot():
+    """
+    The value of every setting in the schema, merged once from the
+    layers given, later layers overriding earlier ones.  A layer is
+    anything with a get(key, default) method, such as a dict or a
+    Sublime Text Settings object.  A value of the wrong type is
+    replaced by the default and noted in problems.
+    """
+    def __init__(self, *layers):
+        self.values = {}
+        self.problems = []
+        for key, (kind, default) in SCHEMA.items():
+            value = default
+            for layer in layers:
+                value = layer.get(key, value)
+            if not check(key, value):
+                self.problems.append('{} should be {}, not {!r}'.format(key, kind.__name__, value))
+                value = default
+            self.values[key] = value
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+# ---------------------------------------------------------------
+def parse(text):
+    """
+    Returns the settings in the text of a sublime-settings file,
+    which may hold comments and trailing commas.
+    """
+    return json.loads(_comment_re.sub(lambda m: m.group(1) or '', text))
+
+
+def load(paths):
+    """Returns a Snapshot of the settings files, later ones overriding."""
+    layers = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            layers.append(parse(f.read()))
+    return Snapshot(*layers)
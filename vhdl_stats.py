@@ -0,0 +1,139 @@
+"""
+----------------------------------------------------------------
+ VHDL Mode Instrumentation.
+
+ Records the wall time of each stage of a command along with
+ counters such as lines processed and regular expression
+ evaluations.  The most recent records are kept in memory so
+ that they can be printed to the console or written out as a
+ JSON report.
+----------------------------------------------------------------
+"""
+import time
+import json
+import collections
+
+# Number of command records kept for the report.
+HISTORY_SIZE = 50
+
+_history = collections.deque(maxlen=HISTORY_SIZE)
+
+
+# ---------------------------------------------------------------
+class _Stage():
+    """
+    Context manager timing one stage.  Time spent in a stage that is
+    entered more than once is accumulated.
+    """
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stages = self.stats.stages
+        stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+# ---------------------------------------------------------------
+class Stats():
+    """
+    Wall time per stage and named counters for a single run of a
+    command.  Stages and counters are reported in the order they
+    were first recorded.
+    """
+    def __init__(self, command):
+        self.command = command
+        self.timestamp = time.time()
+        self.stages = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+
+    def stage(self, name):
+        """Returns a context manager that times the named stage."""
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        """Adds value to the named counter."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def peak(self, name, value):
+        """Keeps the largest value seen for the named counter."""
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return collections.OrderedDict([
+            ('command', self.command),
+            ('time', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.timestamp))),
+            ('total_ms', round(self.total() * 1000, 3)),
+            ('stages_ms', collections.OrderedDict(
+                (name, round(seconds * 1000, 3)) for name, seconds in self.stages.items())),
+            ('counters', collections.OrderedDict(self.counters)),
+        ])
+
+    def report(self):
+        """Returns the record as console lines."""
+        lines = ['vhdl-mode: {}: {:.1f} ms'.format(self.command, self.total() * 1000)]
+        for name, seconds in self.stages.items():
+            lines.append('vhdl-mode:   {:<16} {:>9.1f} ms'.format(name, seconds * 1000))
+        for name, value in self.counters.items():
+            lines.append('vhdl-mode:   {:<16} {:>9}'.format(name, value))
+        return lines
+
+
+# ---------------------------------------------------------------
+class _NullStats():
+    """
+    Stand-in used when no Stats object is supplied so that callers
+    do not need to check before recording.
+    """
+    def stage(self, name):
+        return _null_stage
+
+    def count(self, name, value=1):
+        pass
+
+    def peak(self, name, value):
+        pass
+
+
+class _NullStage():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_stage = _NullStage()
+NULL_STATS = _NullStats()
+
+
+# ---------------------------------------------------------------
+def record(stats):
+    """Adds a finished record to the history."""
+    _history.append(stats)
+
+
+def history():
+    """Returns the recorded Stats, oldest first."""
+    return list(_history)
+
+
+def clear():
+    _history.clear()
+
+
+def json_report(records=None):
+    """Returns the records (the history by default) as JSON text."""
+    if records is None:
+        records = _history
+    return json.dumps([stats.as_dict() for stats in records], indent=4)
@@ -11,53 +11,47 @@ import sublime_plugin
 
 from . import vhdl_lang as vhdl
 from . import vhdl_util as util
+from . import vhdl_stats
 
 _subprogram = vhdl.Subprogram()
 
 
 class vhdlModeCopySubprogram(sublime_plugin.TextCommand):
     """
-    This command scans upwards from the point looking for a
+    This command searches upwards from the point looking for a
     subprogram beginning, then down to find the end.  It parses
     out the gooey center and saves it so it can be repasted in
-    various handy forms.
+    various handy forms.  The beginning comes from the structural
+    outline of the buffer.
     """
 
-    def find_start(self, point, subprogram):
-        """Scans the text for the subprogram beginning.  Uses class
+    def find_start(self, point, subprogram, outline):
+        """Looks up the closest subprogram beginning above the point in
+        the outline.  Uses class method to fill in the name and type."""
+        entry = outline.last_before('subprogram', self.view.rowcol(point)[0])
+        if entry is None:
+            print('vhdl-mode: Subprogram not found.')
+            return None
+        row, column = entry[0], entry[2]
+        subprogram.subprogram_start(util.line_at_point(self, self.view.text_point(row, 0)))
+        print('vhdl-mode: Subprogram beginning found.')
+        return self.view.text_point(row, column)
+
+    def find_end(self, point, subprogram, outline):
+        """Searches the text for the subprogram ending.  Uses class
         method to determine success."""
-        # Use the beginning of the line for all operations so we avoid
-        # potential oddities from where the point was originally.
-        next_point = util.move_to_bol(self, point)
-        while True:
-            # The start method returns the column of the starting of the
-            # subprogram.
-            check = subprogram.subprogram_start(util.line_at_point(self, next_point))
-            if check is None:
-                if util.is_top_line(self, next_point):
-                    print('vhdl-mode: Subprogram not found.')
-                    return None
-                else:
-                    next_point = util.move_up(self, next_point)
-            else:
-                print('vhdl-mode: Subprogram beginning found.')
-                return self.view.text_point(self.view.rowcol(next_point)[0], check)
-
-    def find_end(self, point, subprogram):
-        """Scans the text for the subprogram ending.  Uses class
-        method to determine success."""
-        next_point = util.move_to_bol(self, point)
-        while True:
-            check = subprogram.subprogram_end(util.line_at_point(self, next_point))
-            if check is None:
-                if util.is_end_line(self, next_point):
-                    print('vhdl-mode: End of subprogram not found.')
-                    return None
-                else:
-                    next_point = util.move_down(self, next_point)
-            else:
-                print('vhdl-mode: Subprogram end found.')
-                return self.view.text_point(self.view.rowcol(next_point)[0], check)
+        begin, text = util.read_declaration(self, self.view.rowcol(point)[0], outline)
+        end = util.search_lines_down(self, point - begin, subprogram.subprogram_end, text)
+        if end is None and begin + len(text) < self.view.size():
+            # The end method counts parens as it goes, so start over.
+            subprogram.paren_count = [0, 0]
+            text = self.view.substr(sublime.Region(begin, self.view.size()))
+            end = util.search_lines_down(self, point - begin, subprogram.subprogram_end, text)
+        if end is None:
+            print('vhdl-mode: End of subprogram not found.')
+            return None
+        print('vhdl-mode: Subprogram end found.')
+        return begin + end
 
 
     def run(self, edit):
@@ -70,22 +64,33 @@ class vhdlModeCopySubprogram(sublime_plugin.TextCommand):
 
         # Freshen up the variable
         _subprogram.reset()
+        stats = vhdl_stats.Stats('copy_subprogram')
+        with stats.stage('outline'):
+            outline = util.get_outline(self)
 
         # Attempt to find a subprogram beginning.
-        startpoint = self.find_start(original_point, _subprogram)
+        with stats.stage('find_start'):
+            startpoint = self.find_start(original_point, _subprogram, outline)
         if startpoint is None:
             util.set_cursor(self, original_point)
+            util.record_stats(self, stats)
             return
 
         # Attempt to find a subprogram end.
-        endpoint = self.find_end(startpoint, _subprogram)
+        with stats.stage('find_end'):
+            endpoint = self.find_end(startpoint, _subprogram, outline)
         if endpoint is None:
             util.set_cursor(self, original_point)
+            util.record_stats(self, stats)
             return
 
         block = sublime.Region(startpoint, endpoint)
-        _subprogram.if_string = self.view.substr(block)
-        _subprogram.parse_block()
+        with stats.stage('parse'):
+            _subprogram.if_string = self.view.substr(block)
+            _subprogram.parse_block()
+        stats.count('lines', _subprogram.if_string.count('\n') + 1)
+        stats.count('params', len(_subprogram.if_params))
+        util.record_stats(self, stats)
         #_subprogram.print()
 
 #----------------------------------------------------------------
@@ -100,13 +105,18 @@ class vhdlModePasteAsDeclarationCommand(sublime_plugin.TextCommand):
         # Move to the beginning of the line the point is on.
         next_point = util.move_to_bol(self, original_point)
 
-        block_str = _subprogram.declaration()
+        stats = vhdl_stats.Stats('paste_as_declaration')
+        with stats.stage('build'):
+            block_str = _subprogram.declaration()
         #print(block_str)
-        num_chars = self.view.insert(edit, next_point, block_str)
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
         print('vhdl-mode: Inserted interface as subprogram declaration.')
 
         # Set point to the end of insertion.
         util.set_cursor(self, next_point+num_chars)
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsBodyCommand(sublime_plugin.TextCommand):
@@ -120,13 +130,18 @@ class vhdlModePasteAsBodyCommand(sublime_plugin.TextCommand):
         # Move to the beginning of the line the point is on.
         next_point = util.move_to_bol(self, original_point)
 
-        block_str = _subprogram.body()
+        stats = vhdl_stats.Stats('paste_as_body')
+        with stats.stage('build'):
+            block_str = _subprogram.body()
         #print(block_str)
-        num_chars = self.view.insert(edit, next_point, block_str)
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
         print('vhdl-mode: Inserted interface as subprogram body.')
 
         # Set point to the end of insertion.
         util.set_cursor(self, next_point+num_chars)
+        util.record_stats(self, stats)
 
 #----------------------------------------------------------------
 class vhdlModePasteAsCallCommand(sublime_plugin.TextCommand):
@@ -140,13 +155,18 @@ class vhdlModePasteAsCallCommand(sublime_plugin.TextCommand):
         # Move to the beginning of the line the point is on.
         next_point = util.move_to_bol(self, original_point)
 
-        block_str = _subprogram.call()
+        stats = vhdl_stats.Stats('paste_as_call')
+        with stats.stage('build'):
+            block_str = _subprogram.call()
         #print(block_str)
-        num_chars = self.view.insert(edit, next_point, block_str)
+        with stats.stage('insert'):
+            num_chars = self.view.insert(edit, next_point, block_str)
+        stats.count('lines', block_str.count('\n') + 1)
         print('vhdl-mode: Inserted interface as subprogram call.')
 
         # Set point to the end of insertion.
         util.set_cursor(self, next_point+num_chars)
+        util.record_stats(self, stats)
 
 
 #----------------------------------------------------------------
@@ -5,9 +5,16 @@
 #----------------------------------------------------------------
 """
 import re
+import array
+import bisect
 import sublime
 import sublime_plugin
 
+from . import vhdl_beautify
+from . import vhdl_lang
+from . import vhdl_stats
+from . import vhdl_settings
+
 def move_up(self, point):
     """
     Moves up one line, attempting to maintain column position.
@@ -78,6 +85,35 @@ def line_at_point(self, point):
     """
     return self.view.substr(self.view.line(point))
 
+#----------------------------------------------------------------------------
+def buffer_text(self):
+    """
+    The whole buffer as one string.  Offsets in it are points.
+    """
+    return self.view.substr(sublime.Region(0, self.view.size()))
+
+#----------------------------------------------------------------------------
+def search_lines_down(self, point, check, text=None):
+    """
+    Calls check with the line of the point and then each line below
+    it until it returns a column, and returns the point of that
+    column, or None if the end of the text is reached.  The lines
+    are walked in memory rather than through the API.  text, if
+    given, stands in for the buffer.
+    """
+    if text is None:
+        text = buffer_text(self)
+    start = text.rfind('\n', 0, point) + 1
+    while start <= len(text):
+        end = text.find('\n', start)
+        if end < 0:
+            end = len(text)
+        column = check(text[start:end])
+        if column is not None:
+            return start + column
+        start = end + 1
+    return None
+
 #----------------------------------------------------------------------------
 def is_vhdl_file(line):
     """
@@ -90,63 +126,201 @@ def is_vhdl_file(line):
     return bool(s)
 
 #----------------------------------------------------------------------------
-def extract_scopes(self):
+def extract_scopes(self, lines=None, begin=0):
+    """
+    This method extracts the scope at column zero of each line and
+    interns it as a small integer, which is all that alignment needs
+    to spot a change of scope.  Aids in alignment.
+
+    lines is the text of consecutive lines starting at point begin,
+    if the caller already has it.  Line positions come from the text
+    so there are no per line API calls, and where the API offers it,
+    the scopes for the whole span come from a single call.
+    """
+    if lines is None:
+        lines = self.view.substr(sublime.Region(begin, self.view.size()-1)).split('\n')
+    # Column zero of each line.
+    points = []
+    point = begin
+    for line in lines:
+        points.append(point)
+        point += len(line) + 1
+
+    scope_ids = array.array('I')
+    table = {}
+    tokens = None
+    if hasattr(self.view, 'extract_tokens_with_scopes'):
+        end = min(point, self.view.size())
+        tokens = self.view.extract_tokens_with_scopes(sublime.Region(begin, end))
+    if tokens:
+        starts = [region.begin() for region, scope in tokens]
+        for point in points:
+            index = bisect.bisect_right(starts, point) - 1
+            if index >= 0 and point < tokens[index][0].end():
+                scope = tokens[index][1]
+            else:
+                scope = self.view.scope_name(point)
+            scope_ids.append(table.setdefault(scope, len(table)))
+    else:
+        for point in points:
+            scope = self.view.scope_name(point)
+            scope_ids.append(table.setdefault(scope, len(table)))
+    return scope_ids
+
+#----------------------------------------------------------------------------
+def replace_lines(self, edit, begin, old_lines, new_lines):
     """
-    This method scans column zero of each line and extracts
-    the scope at that point.  Aids in alignment.
+    Writes new_lines over old_lines, the text of consecutive lines
+    starting at point begin, replacing only the runs of lines that
+    changed.  Keeps the undo history small and leaves regions and
+    bookmarks on untouched lines alone.  Returns the number of runs
+    replaced, zero meaning the buffer was not modified.
     """
-    scope_list = []
-    point = 0
-    while not is_end_line(self, point):
-        scope_list.append(self.view.scope_name(point))
-        point = move_down(self, point)
-    # One final append for the last line.
-    scope_list.append(self.view.scope_name(point))
-    # Debug
-    for i in range(len(scope_list)):
-        print('{}: {}'.format(i, scope_list[i]))
-    return scope_list
+    if len(old_lines) != len(new_lines):
+        # Line numbers no longer correspond, so replace the span.
+        old_str = '\n'.join(old_lines)
+        region = sublime.Region(begin, begin+len(old_str))
+        self.view.replace(edit, region, '\n'.join(new_lines))
+        return 1
+    # Column zero of each line.
+    points = []
+    point = begin
+    for line in old_lines:
+        points.append(point)
+        point += len(line) + 1
+    hunks = vhdl_beautify.line_hunks(old_lines, new_lines)
+    # Working from the bottom up keeps the points above valid.
+    for start, end in reversed(hunks):
+        region = sublime.Region(points[start], points[end-1]+len(old_lines[end-1]))
+        self.view.replace(edit, region, '\n'.join(new_lines[start:end]))
+    return len(hunks)
 
 #----------------------------------------------------------------------------
-def get_vhdl_setting(cmd_obj, key):
+# Settings snapshots by view id, and the snapshot of the package
+# settings alone under None.  A snapshot is dropped when the settings
+# it was taken from change, and taken again on the next lookup.
+_snapshots = {}
+_SNAPSHOT_KEY = 'vhdl-mode-snapshot'
+
+def package_settings():
     '''
-    Borrowing an idea from OdatNurd from ST forum, creating a method
-    that will return the value of a key and also check to see if
-    it's been overridden in project files.  Defaults are handled by
-    the supplied sublime-settings file.
+    The package settings, with the user's overrides.  The listener
+    that drops the snapshots when they change is added the first
+    time they are loaded.
+    '''
+    settings = sublime.load_settings(vhdl_settings.SETTINGS_FILE)
+    if None not in _snapshots:
+        settings.clear_on_change(_SNAPSHOT_KEY)
+        settings.add_on_change(_SNAPSHOT_KEY, _snapshots.clear)
+        _snapshots[None] = vhdl_settings.Snapshot(settings)
+        report_problems(_snapshots[None])
+    return settings
+
+def report_problems(snapshot):
+    for problem in snapshot.problems:
+        print('vhdl-mode: Setting {}, using the default.'.format(problem))
 
-    This will actually work on the regular Preferences as well I think
-    though might do bad things if the key doesn't exist.
+def get_settings(cmd_obj):
+    '''
+    Returns the settings Snapshot of the view of the command, which
+    merges the package settings and those of the view, where project
+    settings land, checked against the schema.  Window commands and
+    None get the snapshot of the package settings.
     '''
-    # Load the defaults, or user overridden defaults.
-    vhdl_settings = sublime.load_settings('vhdl_mode.sublime-settings')
-    default = vhdl_settings.get(key, None)
-    # Load the view's settings
-    view_settings = cmd_obj.view.settings()
-    return view_settings.get(key, default)
+    view = getattr(cmd_obj, 'view', None)
+    defaults = package_settings()
+    if view is None:
+        return _snapshots[None]
+    view_id = view.id()
+    if view_id not in _snapshots:
+        view_settings = view.settings()
+        view_settings.clear_on_change(_SNAPSHOT_KEY)
+        view_settings.add_on_change(_SNAPSHOT_KEY, lambda: _snapshots.pop(view_id, None))
+        _snapshots[view_id] = vhdl_settings.Snapshot(defaults, view_settings)
+        report_problems(_snapshots[view_id])
+    return _snapshots[view_id]
+
+def forget_settings(view):
+    '''Drops the settings snapshot of a closed view.'''
+    if _snapshots.pop(view.id(), None) is not None:
+        view.settings().clear_on_change(_SNAPSHOT_KEY)
 
 #----------------------------------------------------------------------------
-def scan_instantiations(cmd_obj):
+def record_stats(cmd_obj, stats):
     '''
-    Obtaining a list of all regions that contain instantiation labels
-    and then creating a dictionary of instantiated components and their
-    associated labels.
-    '''
-    instances = {}
-    selector = 'meta.block.instantiation entity.name.label'
-    regions = cmd_obj.view.find_by_selector(selector)
-    for region in regions:
-        line = cmd_obj.view.substr(cmd_obj.view.full_line(region))
-        line = re.sub(r'\n', '', line)
-        row, col = cmd_obj.view.rowcol(region.begin())
-        pattern = r'^\s*(?P<label>\w+)\s*:\s*(?:entity)?\s*((?P<lib>\w+)\.)?(?P<entity>[\w\.]+)'
-        s = re.search(pattern, line, re.I)
-        if s:
-            if s.group('entity') in instances:
-                instances[s.group('entity')].append(s.group('label'))
-            else:
-                instances[s.group('entity')] = [s.group('label')]
-        else:
-            print('vhdl-mode: Could not match instantiation on line {}'.format(row+1))
-    return instances
+    Stores a finished Stats record for the timing report and prints
+    it to the console when the vhdl-stats setting is on.  Works for
+    window commands as well, which have no view of their own.
+    '''
+    vhdl_stats.record(stats)
+    if get_settings(cmd_obj)['vhdl-stats']:
+        for line in stats.report():
+            print(line)
+
+#----------------------------------------------------------------------------
+# Structural outlines, one vhdl_lang.Outline per buffer id.
+_outlines = {}
+
+def get_outline(self):
+    '''
+    Returns the Outline of the view's buffer, brought up to date.
+    Nothing is scanned if the buffer did not change since the last
+    call, and only the edited lines if the change listener reported
+    the edits.  Otherwise the whole buffer is scanned.
+    '''
+    view = self.view
+    outline = _outlines.get(view.buffer_id())
+    if outline is None:
+        outline = _outlines[view.buffer_id()] = vhdl_lang.Outline()
 
+    def read(first, end):
+        begin = view.text_point(first, 0)
+        stop = view.line(view.text_point(end-1, 0)).end()
+        return view.substr(sublime.Region(begin, stop)).split('\n')
+
+    outline.update(read, view.rowcol(view.size())[0] + 1, view.change_count())
+    return outline
+
+def outline_changed(view, changes):
+    '''
+    Records the rows replaced by each of a list of TextChange in the
+    outline of the view's buffer, if it has one.
+    '''
+    outline = _outlines.get(view.buffer_id())
+    if outline is not None:
+        edits = [(change.a.row, change.b.row, change.str.count('\n') + 1)
+                 for change in changes]
+        outline.report(edits, view.change_count())
+
+def outline_modified(view):
+    '''
+    Without change locations (Sublime Text 3) any modification
+    means rescanning the whole buffer.
+    '''
+    outline = _outlines.get(view.buffer_id())
+    if outline is not None:
+        outline.clear()
+
+def forget_outline(buffer_id):
+    _outlines.pop(buffer_id, None)
+
+#----------------------------------------------------------------------------
+def read_declaration(self, row, outline):
+    '''
+    Returns (begin, text) where text is the buffer from the beginning
+    of the row to the next structure in the outline, which is where a
+    declaration starting on the row normally ends, and begin is the
+    point of its first character.
+    '''
+    begin = self.view.text_point(row, 0)
+    limit = outline.next_head(row)
+    stop = self.view.text_point(limit, 0) if limit is not None else self.view.size()
+    return begin, self.view.substr(sublime.Region(begin, stop))
+
+#----------------------------------------------------------------------------
+def scan_instantiations(cmd_obj):
+    '''
+    Returns a dictionary of the instantiated units of the buffer and
+    their labels, taken from the structural outline.
+    '''
+    return get_outline(cmd_obj).instance_labels()